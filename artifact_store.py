@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from typing import Optional, Dict, Any
+
+from local_store import FileLock, atomic_write_json, read_json, cwmcp_home
+
+
+class ArtifactStore:
+    """
+    A local content-addressed store for exported artifacts (.cw code, SVG,
+    PPTX, export responses).
+
+    Blobs are stored once under `blobs/<sha256>` however many sessions refer
+    to them. `index.json` maps (session_id, revision, kind) to a blob. The
+    revision of a session is recorded every time this client sees it change
+    (run, edit, import), so artifacts of an older revision are dropped.
+    An entry is immutable for its revision and is served as is, unless the
+    backend sent an ETag for it (`etag` meta), which callers revalidate.
+
+    When the blobs exceed `max_bytes`, the least recently used entries are
+    evicted. Reads do not write the index: access times are kept in memory
+    and saved with the next write.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: int = 256 * 1024 * 1024):
+        self.root = root or os.path.join(cwmcp_home(), "artifacts")
+        self.blobs_dir = os.path.join(self.root, "blobs")
+        self.index_path = os.path.join(self.root, "index.json")
+        self.lock_path = os.path.join(self.root, ".lock")
+        self.max_bytes = max_bytes
+        self._touched: Dict[str, float] = {}
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+    # ---- Revisions ----
+
+    def set_revision(self, session_id: str, revision: str) -> None:
+        with FileLock(self.lock_path):
+            index = self._load_index()
+            index["revisions"][session_id] = revision
+            self._apply_touches(index)
+            self._save_index(index)
+
+    def get_revision(self, session_id: str) -> Optional[str]:
+        return self._load_index()["revisions"].get(session_id)
+
+    # ---- Artifacts ----
+
+    def put(self, session_id: str, kind: str, data: bytes, meta: Optional[Dict[str, Any]] = None,
+            revision: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Stores an artifact for the session's current revision (or the given
+        one). Returns the entry, or None when the revision is unknown.
+        """
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        return self._put(session_id, kind, hashlib.sha256(data).hexdigest(), len(data), write, meta, revision)
+
+    def put_file(self, session_id: str, kind: str, source_path: str, meta: Optional[Dict[str, Any]] = None,
+                 revision: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Like `put`, for content already on disk; the file is hashed and copied in chunks."""
+        digest = hashlib.sha256()
+        with open(source_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return self._put(session_id, kind, digest.hexdigest(), os.path.getsize(source_path),
+                         lambda tmp_path: shutil.copyfile(source_path, tmp_path), meta, revision)
+
+    def _put(self, session_id: str, kind: str, digest: str, size: int, write, meta, revision):
+        blob_path = self._blob_path(digest)
+        with FileLock(self.lock_path):
+            index = self._load_index()
+            revision = revision or index["revisions"].get(session_id)
+            if not revision:
+                return None
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp_path = f"{blob_path}.{os.getpid()}.tmp"
+                write(tmp_path)
+                os.replace(tmp_path, blob_path)
+            entry = {
+                "blob": digest,
+                "size": size,
+                "meta": meta or {},
+                "created_at": time.time(),
+                "last_access": time.time(),
+            }
+            index["entries"][self._key(session_id, revision, kind)] = entry
+            self._apply_touches(index)
+            self._evict(index)
+            self._save_index(index)
+        return dict(entry, path=blob_path)
+
+    def get(self, session_id: str, kind: str) -> Optional[Dict[str, Any]]:
+        """Returns the entry (with its blob `path`) for the session's current revision, if cached."""
+        # The index is replaced atomically, so it can be read without the lock
+        index = self._load_index()
+        revision = index["revisions"].get(session_id)
+        key = self._key(session_id, revision, kind) if revision else None
+        entry = index["entries"].get(key) if key else None
+        if not entry:
+            return None
+        blob_path = self._blob_path(entry["blob"])
+        if not os.path.exists(blob_path):
+            return None
+        self._touched[key] = time.time()
+        return dict(entry, path=blob_path)
+
+    def read_bytes(self, entry: Dict[str, Any]) -> bytes:
+        with open(entry["path"], "rb") as f:
+            return f.read()
+
+    def put_json(self, session_id: str, kind: str, data: Dict[str, Any],
+                 meta: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        return self.put(session_id, kind, json.dumps(data, sort_keys=True).encode("utf-8"), meta=meta)
+
+    def get_json(self, session_id: str, kind: str) -> Optional[Dict[str, Any]]:
+        entry = self.get(session_id, kind)
+        if not entry:
+            return None
+        try:
+            return json.loads(self.read_bytes(entry).decode("utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def copy_to(self, entry: Dict[str, Any], target_file: str) -> None:
+        """Copies a blob to `target_file` through a temp file, so the target is never half-written."""
+        os.makedirs(os.path.dirname(os.path.abspath(target_file)), exist_ok=True)
+        tmp_path = f"{target_file}.{os.getpid()}.tmp"
+        shutil.copyfile(entry["path"], tmp_path)
+        os.replace(tmp_path, target_file)
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._load_index()
+        blobs = {e["blob"]: e["size"] for e in index["entries"].values()}
+        return {
+            "entries": len(index["entries"]),
+            "blobs": len(blobs),
+            "bytes": sum(blobs.values()),
+            "max_bytes": self.max_bytes,
+        }
+
+    # ---- Internals ----
+
+    @staticmethod
+    def _key(session_id: str, revision: str, kind: str) -> str:
+        return f"{session_id}|{revision}|{kind}"
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def _load_index(self) -> Dict[str, Any]:
+        index = read_json(self.index_path) or {}
+        index.setdefault("revisions", {})
+        index.setdefault("entries", {})
+        return index
+
+    def _save_index(self, index: Dict[str, Any]) -> None:
+        atomic_write_json(self.index_path, index)
+
+    def _apply_touches(self, index: Dict[str, Any]) -> None:
+        touched, self._touched = self._touched, {}
+        for key, accessed_at in touched.items():
+            entry = index["entries"].get(key)
+            if entry is not None and accessed_at > entry["last_access"]:
+                entry["last_access"] = accessed_at
+
+    def _evict(self, index: Dict[str, Any]) -> None:
+        entries = index["entries"]
+        # Entries left behind by an older revision can never be served again
+        for key in [k for k in entries if index["revisions"].get(k.split("|", 1)[0]) != k.split("|")[1]]:
+            del entries[key]
+
+        blob_sizes = {e["blob"]: e["size"] for e in entries.values()}
+        total = sum(blob_sizes.values())
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            del entries[key]
+            if all(e["blob"] != entry["blob"] for e in entries.values()):
+                total -= entry["size"]
+
+        referenced = {e["blob"] for e in entries.values()}
+        for prefix in os.listdir(self.blobs_dir):
+            prefix_dir = os.path.join(self.blobs_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if name not in referenced and not name.endswith(".tmp"):
+                    try:
+                        os.remove(os.path.join(prefix_dir, name))
+                    except OSError:
+                        pass
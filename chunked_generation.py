@@ -0,0 +1,190 @@
+import os
+import re
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from local_store import atomic_write_json, read_json, cwmcp_home
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+
+
+def split_into_chunks(text: str, max_chunk_chars: int) -> List[Dict[str, str]]:
+    """
+    Splits a request into chunks at markdown headings. Sections are cut at
+    the shallowest heading level used, so subsections stay with their parent.
+    Neighbouring small sections are merged up to `max_chunk_chars`. A
+    section that is still too large is split at blank lines. Text before
+    the first heading becomes its own chunk. Each chunk is
+    {"title": ..., "text": ...}.
+    """
+    lines = text.splitlines()
+    in_fence = False
+    heading_levels = []
+    for line in lines:
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else HEADING_RE.match(line)
+        if match:
+            heading_levels.append(len(match.group(1)))
+    if not heading_levels:
+        return _split_paragraphs("Request", text, max_chunk_chars)
+    split_level = min(heading_levels)
+
+    sections = []
+    title, current = "Overview", []
+    in_fence = False
+    for line in lines:
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line)
+        if match and len(match.group(1)) == split_level:
+            if "\n".join(current).strip():
+                sections.append((title, "\n".join(current).strip()))
+            title, current = match.group(2), [line]
+        else:
+            current.append(line)
+    if "\n".join(current).strip():
+        sections.append((title, "\n".join(current).strip()))
+
+    chunks = []
+    for title, body in sections:
+        if len(body) > max_chunk_chars:
+            chunks.extend(_split_paragraphs(title, body, max_chunk_chars))
+        elif chunks and len(chunks[-1]["text"]) + len(body) + 2 <= max_chunk_chars:
+            chunks[-1]["text"] += "\n\n" + body
+            chunks[-1]["title"] += " / " + title
+        else:
+            chunks.append({"title": title, "text": body})
+    return chunks
+
+
+def _split_paragraphs(title: str, text: str, max_chunk_chars: int) -> List[Dict[str, str]]:
+    chunks, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        if current and len(current) + len(paragraph) + 2 > max_chunk_chars:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current.strip():
+        chunks.append(current)
+    if len(chunks) == 1:
+        return [{"title": title, "text": chunks[0]}]
+    return [{"title": f"{title} ({i + 1})", "text": chunk} for i, chunk in enumerate(chunks)]
+
+
+def merge_d2(chunk_codes: List[Dict[str, str]], base_d2: str = "") -> str:
+    """Wraps each chunk's D2 code in its own labelled container and concatenates them."""
+    parts = [base_d2.strip()] if base_d2.strip() else []
+    for index, chunk in enumerate(chunk_codes, start=1):
+        label = chunk["title"].replace("\\", "\\\\").replace('"', '\\"')
+        body = "\n".join(f"  {line}" if line.strip() else "" for line in chunk["d2_code"].strip().splitlines())
+        parts.append(f'section_{index}: "{label}" {{\n{body}\n}}')
+    return "\n\n".join(parts) + "\n"
+
+
+class ChunkedGenerator:
+    """
+    Generates a diagram for a very large request by splitting it into chunks,
+    generating a sub-diagram per chunk concurrently, and importing the merged
+    D2 code as one new session.
+
+    The D2 code of each chunk is cached on disk, keyed by a hash of the
+    backend URL, editor protocol, mode and chunk text, so after editing one
+    section only that chunk is regenerated. Chunks go through the backend's
+    raw `generate_chunk` call, so the per-chunk sessions leave no entries in
+    the shared cache, revision history or prefetcher.
+    """
+
+    def __init__(self, backend, threshold_chars: int = 20000, max_chunk_chars: int = 8000,
+                 max_workers: int = 4, cache_dir: Optional[str] = None):
+        self.backend = backend
+        self.threshold_chars = threshold_chars
+        self.max_chunk_chars = max_chunk_chars
+        self.max_workers = max_workers
+        self.cache_dir = cache_dir or os.path.join(cwmcp_home(), "chunks")
+
+    def should_chunk(self, request_text: str) -> bool:
+        return len(request_text) > self.threshold_chars
+
+    def generate(self, request_text: str, base_d2: str = "", source_name: str = "input",
+                 mode: str = "3", export_formats: Optional[List[str]] = None) -> Dict[str, Any]:
+        chunks = split_into_chunks(request_text, self.max_chunk_chars)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # Each chunk runs in a copy of the caller's context (request ID, priority)
+            futures = [pool.submit(contextvars.copy_context().run, self._generate_chunk, c, mode) for c in chunks]
+            outcomes = [f.result() for f in futures]
+
+        failed = [o for o in outcomes if o.get("status") == "error"]
+        if failed:
+            return {
+                "status": "error",
+                "error": {
+                    "code": "CHUNK_FAILED",
+                    "message": f"{len(failed)} of {len(chunks)} chunks failed: {failed[0]['error'].get('message', '')}",
+                },
+                "chunks": [self._chunk_summary(o) for o in outcomes],
+            }
+
+        merged = merge_d2(outcomes, base_d2)
+        result = self.backend.import_d2_code(merged, source_name=source_name)
+        if result.get("status") == "error" or "session_id" not in result:
+            return result
+
+        formats = export_formats if export_formats is not None else ["svg"]
+        for name in formats:
+            export = self.backend.export_session(session_id=result["session_id"], format=name)
+            if export.get("status") == "error":
+                result.setdefault("warnings", []).append(f"Failed to export {name}: {export['error'].get('message')}")
+            else:
+                for key, value in export.items():
+                    if key not in ("status", "session_id"):
+                        result.setdefault(key, value)
+
+        result["chunked"] = True
+        result["chunks"] = [self._chunk_summary(o) for o in outcomes]
+        result["cache_hits"] = sum(1 for o in outcomes if o["cached"])
+        return result
+
+    def _generate_chunk(self, chunk: Dict[str, str], mode: str) -> Dict[str, Any]:
+        key = hashlib.sha256("\n".join([
+            self.backend.base_url, self.backend.editor_protocol or "", mode, chunk["text"],
+        ]).encode("utf-8")).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"{key}.json")
+        cached = read_json(cache_path)
+        if cached and cached.get("d2_code"):
+            return {"status": "ok", "title": chunk["title"], "d2_code": cached["d2_code"],
+                    "session_id": cached.get("session_id"), "cached": True}
+
+        prompt = f"Diagram only this section of a larger document: {chunk['title']}\n\n{chunk['text']}"
+        result = self.backend.generate_chunk(prompt, mode=mode)
+        if result.get("status") == "error":
+            return {"status": "error", "title": chunk["title"], "error": result.get("error", {}), "cached": False}
+
+        d2_code = result.get("d2_code")
+        if not d2_code and result.get("session_id"):
+            code = self.backend.get_session_code(result["session_id"])
+            if code.get("status") == "error":
+                return {"status": "error", "title": chunk["title"], "error": code.get("error", {}), "cached": False}
+            d2_code = code.get("d2_code")
+        if not d2_code:
+            return {"status": "error", "title": chunk["title"], "cached": False,
+                    "error": {"code": "MISSING_D2_CODE", "message": "Chunk generation returned no D2 code"}}
+
+        atomic_write_json(cache_path, {"title": chunk["title"], "d2_code": d2_code,
+                                       "session_id": result.get("session_id")})
+        return {"status": "ok", "title": chunk["title"], "d2_code": d2_code,
+                "session_id": result.get("session_id"), "cached": False}
+
+    @staticmethod
+    def _chunk_summary(outcome: Dict[str, Any]) -> Dict[str, Any]:
+        summary = {"title": outcome["title"], "cached": outcome["cached"]}
+        if outcome.get("session_id"):
+            summary["session_id"] = outcome["session_id"]
+        if outcome.get("status") == "error":
+            summary["error"] = outcome.get("error")
+        return summary
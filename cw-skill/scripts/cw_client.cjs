@@ -5,6 +5,30 @@ const crypto = require("crypto");
 const http = require("http");
 const https = require("https");
 const { URL } = require("url");
+const { SharedCache, requestKey } = require("./shared_cache.cjs");
+
+const EXPORT_FORMATS = ["svg", "pptx"];
+
+function parseExportFormats(value) {
+  if (value === null || value === undefined) {
+    return ["svg"];
+  }
+  const items = Array.isArray(value) ? value : String(value).split(",");
+  const formats = [];
+  for (const item of items) {
+    const name = String(item).trim().toLowerCase();
+    if (!name || name === "none") {
+      continue;
+    }
+    if (!EXPORT_FORMATS.includes(name)) {
+      throw new Error(`不支持的导出格式: ${name}（仅支持 svg、pptx 或 none）`);
+    }
+    if (!formats.includes(name)) {
+      formats.push(name);
+    }
+  }
+  return formats;
+}
 
 class CWClient {
   constructor() {
@@ -14,6 +38,32 @@ class CWClient {
     this.timeoutMs = Number.isFinite(timeoutVal) ? timeoutVal * 1000 : 3000000;
     this.apiKey = this.loadApiKey();
     this.editorProtocol = process.env.EDITOR_PROTOCOL || this.loadEditorProtocol();
+    const maxSockets = Number.parseInt(process.env.CW_MAX_SOCKETS || "8", 10);
+    const agentOptions = {
+      keepAlive: true,
+      keepAliveMsecs: 30000,
+      maxSockets: Number.isFinite(maxSockets) && maxSockets > 0 ? maxSockets : 8,
+    };
+    this.httpAgent = new http.Agent(agentOptions);
+    this.httpsAgent = new https.Agent(agentOptions);
+    this.sharedCache = this.loadSharedCache();
+  }
+
+  loadSharedCache() {
+    const flag = String(process.env.CWMCP_SHARED_CACHE || "").toLowerCase();
+    if (!["1", "true", "yes", "on"].includes(flag)) {
+      return null;
+    }
+    try {
+      return new SharedCache();
+    } catch (error) {
+      return null;
+    }
+  }
+
+  close() {
+    this.httpAgent.destroy();
+    this.httpsAgent.destroy();
   }
 
   loadApiKey() {
@@ -113,17 +163,19 @@ class CWClient {
   postJson(urlString, body) {
     const parsed = new URL(urlString);
     const payload = JSON.stringify(body);
+    const isHttps = parsed.protocol === "https:";
     const options = {
       method: "POST",
+      agent: isHttps ? this.httpsAgent : this.httpAgent,
       hostname: parsed.hostname,
-      port: parsed.port || (parsed.protocol === "https:" ? 443 : 80),
+      port: parsed.port || (isHttps ? 443 : 80),
       path: `${parsed.pathname}${parsed.search}`,
       headers: {
         ...this.headers(),
         "Content-Length": Buffer.byteLength(payload),
       },
     };
-    const transport = parsed.protocol === "https:" ? https : http;
+    const transport = isHttps ? https : http;
     return new Promise((resolve, reject) => {
       const req = transport.request(options, (res) => {
         const chunks = [];
@@ -145,21 +197,29 @@ class CWClient {
     });
   }
 
-  async runGeneration({ userRequest, inputFile = null, sessionId = null, mode = "3", inputSequence = null }) {
+  async runGeneration({ userRequest, inputFile = null, sessionId = null, mode = "3", inputSequence = null, exportFormats = null }) {
+    let formats;
+    try {
+      formats = parseExportFormats(exportFormats);
+    } catch (error) {
+      return this.error("INVALID_FORMAT", String(error.message || error), true, "修改 export_formats 参数后重试");
+    }
     const payload = {
       mode,
       input_sequence: inputSequence,
-      export_svg: true,
-      export_pptx: false,
+      export_svg: formats.includes("svg"),
+      export_pptx: formats.includes("pptx"),
       session_id: sessionId,
       test_file: null,
     };
+    let sourceContent = null;
     if (inputFile) {
       if (!fs.existsSync(inputFile)) {
         return this.error("FILE_NOT_FOUND", `File not found: ${inputFile}`);
       }
       try {
         const content = fs.readFileSync(inputFile, "utf8");
+        sourceContent = content;
         let reqText = content.trim();
         let d2Text = "";
         if (content.includes("# D2")) {
@@ -186,11 +246,75 @@ class CWClient {
     } else {
       payload.user_request = userRequest;
     }
-    return this.request("/run", payload);
+
+    // 新生成（非编辑）可复用 Python 或 Node 客户端此前写入共享缓存的结果
+    const sourceKind = inputFile ? "input_file" : "user_request";
+    const sourceText = inputFile ? sourceContent : userRequest;
+    const cacheKey = this.sharedCache && !sessionId && !inputSequence && sourceText
+      ? requestKey(mode, payload.export_svg, payload.export_pptx, sourceKind, sourceText)
+      : null;
+    if (cacheKey) {
+      const entry = this.sharedCache.getResult(cacheKey);
+      if (entry) {
+        return { ...entry.result, cached: true, cached_by: entry.client };
+      }
+    }
+
+    const result = await this.request("/run", payload);
+    if (this.sharedCache && result.status === "ok" && result.session_id) {
+      try {
+        if (cacheKey) {
+          this.sharedCache.putResult(cacheKey, result);
+        }
+        this.sharedCache.recordSession(result.session_id, {
+          workingDir: process.cwd(),
+          inputFile,
+          requestKey: cacheKey,
+          edited: Boolean(sessionId),
+        });
+      } catch (error) {
+        // 共享缓存写入失败不影响本次结果
+      }
+    }
+    return result;
+  }
+
+  latestSession(workingDir = process.cwd()) {
+    return this.sharedCache ? this.sharedCache.latestSession({ workingDir }) : null;
   }
 
   async exportSessionAsset(sessionId, formatName) {
-    return this.request("/export-session", { session_id: sessionId, format: formatName });
+    let formats;
+    try {
+      formats = parseExportFormats(formatName);
+    } catch (error) {
+      return this.error("INVALID_FORMAT", String(error.message || error), true, "修改 format 参数后重试");
+    }
+    if (!formats.length) {
+      return this.error("INVALID_FORMAT", "至少需要一种导出格式", true, "修改 format 参数后重试");
+    }
+    if (formats.length === 1) {
+      return this.request("/export-session", { session_id: sessionId, format: formats[0] });
+    }
+    // Several formats: request them in parallel over the pooled connections
+    const results = await Promise.all(
+      formats.map((name) => this.request("/export-session", { session_id: sessionId, format: name }))
+    );
+    const exports = {};
+    formats.forEach((name, index) => {
+      exports[name] = results[index];
+    });
+    const failed = formats.filter((name) => exports[name].status === "error");
+    if (failed.length) {
+      const firstError = exports[failed[0]].error || {};
+      return {
+        status: "error",
+        session_id: sessionId,
+        exports,
+        error: { ...firstError, message: `导出失败: ${failed.join(", ")}; ${firstError.message || ""}`, failed_formats: failed },
+      };
+    }
+    return { status: "ok", session_id: sessionId, exports };
   }
 
   async importCode(target = "ContextWeave") {
@@ -242,11 +366,48 @@ class CWClient {
   }
 }
 
+function normalizeGenerationResult(result) {
+  if (result.status === "ok" && !result.session_id) {
+    return {
+      status: "error",
+      error: {
+        code: "MISSING_SESSION_ID",
+        message: "生成成功响应缺少 session_id，无法用于后续编辑",
+        recoverable: true,
+        recovery_hint: "请重新执行生成；若仍失败请检查后端服务",
+      },
+      raw_result: result,
+    };
+  }
+  return result;
+}
+
+function normalizeSessionError(result, recoveryHint) {
+  if (result.status === "error") {
+    const message = String((result.error || {}).message || "");
+    if (message.toLowerCase().includes("session")) {
+      return {
+        status: "error",
+        error: {
+          code: "SESSION_INVALID_OR_EXPIRED",
+          message: message || "session_id 缺失、无效或已过期",
+          recoverable: true,
+          recovery_hint: recoveryHint,
+        },
+      };
+    }
+  }
+  return result;
+}
+
 function printJson(data) {
   process.stdout.write(`${JSON.stringify(data, null, 2)}\n`);
 }
 
 module.exports = {
   CWClient,
+  parseExportFormats,
+  normalizeGenerationResult,
+  normalizeSessionError,
   printJson,
 };
@@ -0,0 +1,157 @@
+#!/usr/bin/env node
+const readline = require("readline");
+const { CWClient, normalizeGenerationResult, normalizeSessionError } = require("./cw_client.cjs");
+
+function missingArgs(message) {
+  return {
+    status: "error",
+    error: {
+      code: "MISSING_REQUIRED_ARGS",
+      message,
+      recoverable: true,
+      recovery_hint: "补充参数后重试",
+    },
+  };
+}
+
+const commands = new Map(Object.entries({
+  async ping() {
+    return { status: "ok" };
+  },
+
+  async generate(client, args) {
+    if (!args.user_request && !args.input_file) {
+      return missingArgs("必须至少提供 user_request 或 input_file");
+    }
+    return normalizeGenerationResult(
+      await client.runGeneration({
+        userRequest: args.user_request,
+        inputFile: args.input_file,
+        sessionId: args.session_id,
+        mode: args.mode || "3",
+        inputSequence: args.input_sequence || null,
+        exportFormats: args.export_formats || null,
+      })
+    );
+  },
+
+  async edit(client, args) {
+    const sessionId = args.session_id || client.latestSession(args.working_dir || process.cwd());
+    if (!sessionId || !args.user_request) {
+      return missingArgs("必须提供 session_id 和 user_request");
+    }
+    return normalizeSessionError(
+      await client.runGeneration({
+        userRequest: args.user_request,
+        sessionId,
+        mode: args.mode || "3",
+        exportFormats: args.export_formats || null,
+      }),
+      "请先重新执行生成脚本获取新的 session_id，再重试编辑"
+    );
+  },
+
+  async export_session_asset(client, args) {
+    if (!args.session_id || !args.format) {
+      return missingArgs("必须提供 session_id 和 format");
+    }
+    return normalizeSessionError(
+      await client.exportSessionAsset(args.session_id, args.format),
+      "请先重新生成以获取新的 session_id"
+    );
+  },
+
+  async export_code(client, args) {
+    if (!args.session_id) {
+      return missingArgs("必须提供 session_id");
+    }
+    return client.exportCode(args.session_id, args.path || "ContextWeave");
+  },
+
+  async import_code(client, args) {
+    return client.importCode(args.path || "ContextWeave");
+  },
+}));
+
+function writeLine(data) {
+  process.stdout.write(`${JSON.stringify(data)}\n`);
+}
+
+function isPlainObject(value) {
+  return value !== null && typeof value === "object" && !Array.isArray(value);
+}
+
+function invalidCommand(id, message) {
+  writeLine({
+    id,
+    result: {
+      status: "error",
+      error: { code: "INVALID_JSON", message, recoverable: true },
+    },
+  });
+}
+
+async function handleLine(client, line) {
+  let message;
+  try {
+    message = JSON.parse(line);
+  } catch (error) {
+    invalidCommand(null, "每行必须是一个合法的 JSON 命令");
+    return;
+  }
+  if (!isPlainObject(message)) {
+    invalidCommand(null, "每行必须是一个 JSON 对象");
+    return;
+  }
+  const id = message.id === undefined ? null : message.id;
+  if (message.args !== undefined && message.args !== null && !isPlainObject(message.args)) {
+    invalidCommand(id, "args 必须是一个 JSON 对象");
+    return;
+  }
+  // A Map lookup does not reach inherited names such as toString
+  const handler = typeof message.command === "string" ? commands.get(message.command) : undefined;
+  if (!handler) {
+    writeLine({
+      id,
+      result: {
+        status: "error",
+        error: {
+          code: "UNKNOWN_COMMAND",
+          message: `未知命令: ${message.command}`,
+          recoverable: true,
+          recovery_hint: `可用命令: ${[...commands.keys()].join(", ")}`,
+        },
+      },
+    });
+    return;
+  }
+  let result;
+  try {
+    result = await handler(client, message.args || {});
+  } catch (error) {
+    result = client.error("WORKER_ERROR", String(error.message || error), true);
+  }
+  writeLine({ id, result });
+}
+
+async function main() {
+  const client = new CWClient();
+  const pending = new Set();
+  const rl = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+
+  rl.on("line", (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    // Commands run concurrently; callers match responses by id.
+    const task = handleLine(client, line).finally(() => pending.delete(task));
+    pending.add(task);
+  });
+
+  rl.on("close", async () => {
+    await Promise.all(pending);
+    client.close();
+  });
+}
+
+main();
@@ -1,5 +1,5 @@
 #!/usr/bin/env node
-const { CWClient, printJson } = require("./cw_client.cjs");
+const { CWClient, normalizeSessionError, printJson } = require("./cw_client.cjs");
 
 function parseArgs(argv) {
   const args = {};
@@ -18,29 +18,14 @@ function parseArgs(argv) {
   return args;
 }
 
-function normalizeEditResult(result) {
-  if (result.status === "error") {
-    const message = String((result.error || {}).message || "");
-    if (message.toLowerCase().includes("session")) {
-      return {
-        status: "error",
-        error: {
-          code: "SESSION_INVALID_OR_EXPIRED",
-          message: message || "session_id 缺失、无效或已过期",
-          recoverable: true,
-          recovery_hint: "请先重新执行生成脚本获取新的 session_id，再重试编辑",
-        },
-      };
-    }
-  }
-  return result;
-}
-
 async function main() {
   const args = parseArgs(process.argv.slice(2));
-  const sessionId = args["--session_id"] || args["-s"];
+  const client = new CWClient();
+  // 未指定 session_id 时，使用共享会话登记表中当前目录最近的会话（由任一客户端写入）
+  const sessionId = args["--session_id"] || args["-s"] || client.latestSession();
   const userRequest = args["--user_request"] || args["-u"];
   const mode = args["--mode"] || args["-m"] || "3";
+  const exportFormats = args["--export_formats"] || args["-e"] || null;
 
   if (!sessionId || !userRequest) {
     printJson({
@@ -55,13 +40,14 @@ async function main() {
     process.exit(1);
   }
 
-  const client = new CWClient();
-  const result = normalizeEditResult(
+  const result = normalizeSessionError(
     await client.runGeneration({
       userRequest,
       sessionId,
       mode,
-    })
+      exportFormats,
+    }),
+    "请先重新执行生成脚本获取新的 session_id，再重试编辑"
   );
   printJson(result);
   if (result.status === "error") {
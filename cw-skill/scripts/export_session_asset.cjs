@@ -1,5 +1,5 @@
 #!/usr/bin/env node
-const { CWClient, printJson } = require("./cw_client.cjs");
+const { CWClient, normalizeSessionError, parseExportFormats, printJson } = require("./cw_client.cjs");
 
 function parseArgs(argv) {
   const args = {};
@@ -36,12 +36,17 @@ async function main() {
     process.exit(1);
   }
 
-  if (!["svg", "pptx"].includes(formatName)) {
+  let formats = [];
+  try {
+    formats = parseExportFormats(formatName);
+  } catch (error) {
+  }
+  if (!formats.length) {
     printJson({
       status: "error",
       error: {
         code: "INVALID_FORMAT",
-        message: "format 仅支持 svg 或 pptx",
+        message: "format 仅支持 svg、pptx 或逗号分隔的组合（如 svg,pptx）",
         recoverable: true,
         recovery_hint: "修改 format 参数后重试",
       },
@@ -50,21 +55,10 @@ async function main() {
   }
 
   const client = new CWClient();
-  let result = await client.exportSessionAsset(sessionId, formatName);
-  if (result.status === "error") {
-    const message = String((result.error || {}).message || "");
-    if (message.toLowerCase().includes("session")) {
-      result = {
-        status: "error",
-        error: {
-          code: "SESSION_INVALID_OR_EXPIRED",
-          message: message || "session_id 无效或已过期",
-          recoverable: true,
-          recovery_hint: "请先重新生成以获取新的 session_id",
-        },
-      };
-    }
-  }
+  const result = normalizeSessionError(
+    await client.exportSessionAsset(sessionId, formatName),
+    "请先重新生成以获取新的 session_id"
+  );
   printJson(result);
   if (result.status === "error") {
     process.exit(1);
@@ -1,5 +1,5 @@
 #!/usr/bin/env node
-const { CWClient, printJson } = require("./cw_client.cjs");
+const { CWClient, normalizeGenerationResult, printJson } = require("./cw_client.cjs");
 
 function parseArgs(argv) {
   const args = {};
@@ -19,22 +19,6 @@ function parseArgs(argv) {
   return args;
 }
 
-function normalizeGenerationResult(result) {
-  if (result.status === "ok" && !result.session_id) {
-    return {
-      status: "error",
-      error: {
-        code: "MISSING_SESSION_ID",
-        message: "生成成功响应缺少 session_id，无法用于后续编辑",
-        recoverable: true,
-        recovery_hint: "请重新执行生成；若仍失败请检查后端服务",
-      },
-      raw_result: result,
-    };
-  }
-  return result;
-}
-
 async function main() {
   const args = parseArgs(process.argv.slice(2));
   const userRequest = args["--user_request"] || args["-u"];
@@ -42,6 +26,7 @@ async function main() {
   const sessionId = args["--session_id"] || args["-s"];
   const mode = args["--mode"] || args["-m"] || "3";
   const inputSequenceRaw = args["--input_sequence"];
+  const exportFormats = args["--export_formats"] || args["-e"] || null;
 
   if (!userRequest && !inputFile) {
     printJson({
@@ -82,6 +67,7 @@ async function main() {
       sessionId,
       mode,
       inputSequence,
+      exportFormats,
     })
   );
   printJson(result);
@@ -0,0 +1,218 @@
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+const crypto = require("crypto");
+
+// 与 Python 客户端 (shared_cache.py) 共用的磁盘缓存，格式见 SHARED_CACHE_FORMAT.md
+const SHARED_FORMAT = "cwmcp-shared";
+const SHARED_VERSION = 1;
+const MAX_SESSIONS = 500;
+
+function cwmcpHome() {
+  return process.env.CWMCP_HOME || path.join(os.homedir(), ".cwmcp");
+}
+
+function requestKey(mode, exportSvg, exportPptx, sourceKind, text) {
+  const canonical = JSON.stringify([
+    "run",
+    String(mode),
+    Boolean(exportSvg),
+    Boolean(exportPptx),
+    sourceKind,
+    String(text).replace(/\r\n/g, "\n"),
+  ]);
+  return crypto.createHash("sha256").update(canonical, "utf8").digest("hex");
+}
+
+function readJson(filePath) {
+  try {
+    return JSON.parse(fs.readFileSync(filePath, "utf8"));
+  } catch (error) {
+    return null;
+  }
+}
+
+function atomicWriteJson(filePath, data) {
+  fs.mkdirSync(path.dirname(filePath), { recursive: true });
+  const tmpPath = `${filePath}.${process.pid}.${crypto.randomBytes(4).toString("hex")}.tmp`;
+  fs.writeFileSync(tmpPath, JSON.stringify(data, null, 2), "utf8");
+  fs.renameSync(tmpPath, filePath);
+}
+
+function sleepSync(ms) {
+  Atomics.wait(new Int32Array(new SharedArrayBuffer(4)), 0, 0, ms);
+}
+
+// 与 Python FileLock 相同的协议：独占创建锁文件，超过 staleAfter 秒的锁视为残留并删除
+function withLock(lockPath, fn, timeoutMs = 10000, staleAfterMs = 30000) {
+  fs.mkdirSync(path.dirname(lockPath), { recursive: true });
+  const deadline = Date.now() + timeoutMs;
+  let fd = null;
+  while (fd === null) {
+    try {
+      fd = fs.openSync(lockPath, "wx");
+      fs.writeSync(fd, String(process.pid));
+    } catch (error) {
+      if (error.code !== "EEXIST") {
+        throw error;
+      }
+      try {
+        if (Date.now() - fs.statSync(lockPath).mtimeMs > staleAfterMs) {
+          fs.unlinkSync(lockPath);
+          continue;
+        }
+      } catch (statError) {
+        continue;
+      }
+      if (Date.now() >= deadline) {
+        throw new Error(`Timed out waiting for lock: ${lockPath}`);
+      }
+      sleepSync(10);
+    }
+  }
+  try {
+    return fn();
+  } finally {
+    fs.closeSync(fd);
+    try {
+      fs.unlinkSync(lockPath);
+    } catch (error) {
+      // 已被其他进程当作残留锁清理
+    }
+  }
+}
+
+class SharedCache {
+  constructor({ root = null, ttlSeconds = 24 * 3600, client = "node" } = {}) {
+    this.root = root || path.join(cwmcpHome(), "shared");
+    this.resultsDir = path.join(this.root, "results");
+    this.sessionsPath = path.join(this.root, "sessions.json");
+    this.lockPath = path.join(this.root, ".lock");
+    this.ttlSeconds = ttlSeconds;
+    this.client = client;
+    this.compatible = this.checkFormat();
+  }
+
+  checkFormat() {
+    const formatPath = path.join(this.root, "format.json");
+    const info = readJson(formatPath);
+    if (info === null) {
+      withLock(this.lockPath, () => {
+        if (readJson(formatPath) === null) {
+          atomicWriteJson(formatPath, { format: SHARED_FORMAT, version: SHARED_VERSION });
+        }
+      });
+      return true;
+    }
+    return info.format === SHARED_FORMAT && Number(info.version || 0) <= SHARED_VERSION;
+  }
+
+  getResult(key) {
+    if (!this.compatible) {
+      return null;
+    }
+    const entry = readJson(path.join(this.resultsDir, `${key}.json`));
+    if (!entry || entry.version !== SHARED_VERSION || Date.now() / 1000 - (entry.created_at || 0) > this.ttlSeconds) {
+      return null;
+    }
+    const session = this.getSession((entry.result || {}).session_id);
+    if (session && (session.edited_at || 0) > entry.created_at) {
+      return null;
+    }
+    return entry;
+  }
+
+  putResult(key, result) {
+    if (!this.compatible) {
+      return;
+    }
+    atomicWriteJson(path.join(this.resultsDir, `${key}.json`), {
+      version: SHARED_VERSION,
+      key,
+      client: this.client,
+      created_at: Date.now() / 1000,
+      result,
+    });
+  }
+
+  recordSession(sessionId, { workingDir = null, inputFile = null, requestKey: key = null, edited = false } = {}) {
+    if (!this.compatible) {
+      return;
+    }
+    const now = Date.now() / 1000;
+    withLock(this.lockPath, () => {
+      const registry = this.loadSessions();
+      const session = registry.sessions[sessionId] || { session_id: sessionId, created_at: now };
+      registry.sessions[sessionId] = session;
+      session.updated_at = now;
+      session.client = this.client;
+      if (edited) {
+        session.edited_at = now;
+      }
+      if (key) {
+        session.request_key = key;
+      }
+      if (workingDir) {
+        session.working_dir = path.resolve(workingDir);
+        registry.latest[`dir:${session.working_dir}`] = sessionId;
+      }
+      if (inputFile) {
+        session.input_file = path.resolve(inputFile);
+        registry.latest[`file:${session.input_file}`] = sessionId;
+      }
+      this.prune(registry);
+      atomicWriteJson(this.sessionsPath, registry);
+    });
+  }
+
+  getSession(sessionId) {
+    if (!this.compatible || !sessionId) {
+      return null;
+    }
+    return this.loadSessions().sessions[sessionId] || null;
+  }
+
+  latestSession({ workingDir = null, inputFile = null } = {}) {
+    if (!this.compatible) {
+      return null;
+    }
+    const latest = this.loadSessions().latest;
+    if (inputFile && latest[`file:${path.resolve(inputFile)}`]) {
+      return latest[`file:${path.resolve(inputFile)}`];
+    }
+    if (workingDir) {
+      return latest[`dir:${path.resolve(workingDir)}`] || null;
+    }
+    return null;
+  }
+
+  loadSessions() {
+    const registry = readJson(this.sessionsPath) || {};
+    registry.version = SHARED_VERSION;
+    registry.sessions = registry.sessions || {};
+    registry.latest = registry.latest || {};
+    return registry;
+  }
+
+  prune(registry) {
+    const sessions = Object.values(registry.sessions);
+    if (sessions.length <= MAX_SESSIONS) {
+      return;
+    }
+    sessions.sort((a, b) => (a.updated_at || 0) - (b.updated_at || 0));
+    for (const session of sessions.slice(0, sessions.length - MAX_SESSIONS)) {
+      delete registry.sessions[session.session_id];
+    }
+    for (const [key, value] of Object.entries(registry.latest)) {
+      if (!registry.sessions[value]) {
+        delete registry.latest[key];
+      }
+    }
+  }
+}
+
+module.exports = {
+  SHARED_VERSION,
+  SharedCache,
+  requestKey,
+};
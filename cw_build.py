@@ -0,0 +1,283 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, Any, List, Callable
+
+from local_store import atomic_write_json, read_json
+from remote_mcp_server import parse_input_content, parse_export_formats
+
+MANIFEST_NAME = "cwmcp_build.json"
+LOCKFILE_VERSION = 1
+
+
+def load_manifest(manifest_path: str) -> Dict[str, Any]:
+    """
+    Reads a build manifest and expands its entries into a list of diagrams.
+
+    {
+      "mode": "3",
+      "export_formats": "svg",
+      "jobs": 4,
+      "diagrams": [
+        {"source": "docs/auth.md", "output": "docs/diagrams/auth"},
+        {"source": "docs/flows/*.md", "output": "docs/diagrams/{stem}"}
+      ]
+    }
+
+    Paths are relative to the manifest. A glob source builds every match,
+    with `{stem}` in its output replaced by the file name without extension.
+    Raises ValueError for an invalid manifest.
+    """
+    manifest = read_json(manifest_path)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("diagrams"), list):
+        raise ValueError(f"{manifest_path} must be a JSON object with a 'diagrams' list")
+    root = os.path.dirname(os.path.abspath(manifest_path))
+    mode = str(manifest.get("mode", "3"))
+    formats = parse_export_formats(manifest.get("export_formats"))
+
+    diagrams, seen = [], set()
+    for item in manifest["diagrams"]:
+        if not isinstance(item, dict) or not item.get("source") or not item.get("output"):
+            raise ValueError(f"Each diagram needs a 'source' and an 'output': {item!r}")
+        pattern = item["source"]
+        if glob.has_magic(pattern):
+            sources = sorted(os.path.relpath(p, root) for p in glob.glob(os.path.join(root, pattern)))
+        else:
+            sources = [os.path.normpath(pattern)]
+        for source in sources:
+            source = source.replace(os.sep, "/")
+            if source in seen:
+                continue
+            seen.add(source)
+            stem = os.path.splitext(os.path.basename(source))[0]
+            diagrams.append({
+                "source": source,
+                "output": os.path.normpath(item["output"].replace("{stem}", stem)).replace(os.sep, "/"),
+                "mode": str(item.get("mode", mode)),
+                "formats": parse_export_formats(item["export_formats"]) if "export_formats" in item else formats,
+            })
+    return {"root": root, "jobs": int(manifest.get("jobs", 4)), "diagrams": diagrams}
+
+
+def input_hash(content: str, mode: str, formats: List[str]) -> str:
+    """
+    Hashes what a generation depends on: the parsed Request and D2 sections
+    (not the raw file, so edits elsewhere in it do not trigger a rebuild),
+    the mode and the export formats.
+    """
+    req_text, d2_text = parse_input_content(content.replace("\r\n", "\n"))
+    payload = json.dumps([req_text, d2_text, mode, formats], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ProjectBuilder:
+    """
+    Regenerates the diagrams of a manifest whose inputs changed since the
+    last build, like `make`.
+
+    The lockfile next to the manifest (`cwmcp_build.lock.json` for
+    `cwmcp_build.json`) records, per source, the input hash, output
+    directory and session ID of the last successful build. A diagram is
+    rebuilt when its hash or output changed, or when its output files are
+    missing. Rebuilds run in parallel through
+    RemoteMCPServer, at batch priority, and write `diagram.cw` (and
+    `diagram.svg` when SVG is exported) into the output directory.
+
+    The backend is only created when something needs rebuilding, so a no-op
+    build reads and hashes the sources and nothing else.
+    """
+
+    def __init__(self, manifest_path: str, backend_factory: Optional[Callable[[], Any]] = None,
+                 jobs: Optional[int] = None, force: bool = False, log=None):
+        self.manifest_path = os.path.abspath(manifest_path)
+        self.lock_path = os.path.splitext(self.manifest_path)[0] + ".lock.json"
+        self.backend_factory = backend_factory or _default_backend
+        self.jobs = jobs
+        self.force = force
+        self.log = log or (lambda message: print(message, file=sys.stderr))
+        self._backend = None
+        self._backend_lock = threading.Lock()
+        self._lockfile_lock = threading.Lock()
+
+    # ---- Planning ----
+
+    def plan(self) -> Dict[str, Any]:
+        """Returns the manifest, the loaded lockfile and the diagrams to rebuild (each with its hash)."""
+        manifest = load_manifest(self.manifest_path)
+        lock = read_json(self.lock_path) or {}
+        if lock.get("version") != LOCKFILE_VERSION:
+            lock = {"version": LOCKFILE_VERSION, "diagrams": {}}
+        stale, errors = [], []
+        for diagram in manifest["diagrams"]:
+            source_path = os.path.join(manifest["root"], diagram["source"])
+            try:
+                with open(source_path, "r", encoding="utf-8") as f:
+                    diagram["hash"] = input_hash(f.read(), diagram["mode"], diagram["formats"])
+            except OSError as e:
+                errors.append({"source": diagram["source"], "error": {"code": "READ_ERROR", "message": str(e)}})
+                continue
+            if self.force or not self._up_to_date(manifest["root"], diagram, lock["diagrams"].get(diagram["source"])):
+                stale.append(diagram)
+        return {"manifest": manifest, "lock": lock, "stale": stale, "errors": errors}
+
+    @staticmethod
+    def _up_to_date(root: str, diagram: Dict[str, Any], entry: Optional[Dict[str, Any]]) -> bool:
+        if not entry or entry.get("hash") != diagram["hash"] or entry.get("output") != diagram["output"]:
+            return False
+        output_dir = os.path.join(root, diagram["output"])
+        outputs = ["diagram.cw"] + (["diagram.svg"] if "svg" in diagram["formats"] else [])
+        return all(os.path.exists(os.path.join(output_dir, name)) for name in outputs)
+
+    # ---- Building ----
+
+    def build(self, dry_run: bool = False) -> Dict[str, Any]:
+        started = time.monotonic()
+        plan = self.plan()
+        manifest, lock = plan["manifest"], plan["lock"]
+        # Sources dropped from the manifest leave the lockfile (their outputs stay on disk)
+        sources = {d["source"] for d in manifest["diagrams"]}
+        results = {
+            "built": [],
+            "up_to_date": len(manifest["diagrams"]) - len(plan["stale"]) - len(plan["errors"]),
+            "failed": list(plan["errors"]),
+            "removed": sorted(s for s in lock["diagrams"] if s not in sources),
+        }
+
+        if dry_run:
+            results["stale"] = [d["source"] for d in plan["stale"]]
+        elif plan["stale"]:
+            jobs = max(1, self.jobs or manifest["jobs"])
+            with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="cwmcp-build") as executor:
+                futures = {executor.submit(self._build_one, manifest["root"], d): d for d in plan["stale"]}
+                for future in as_completed(futures):
+                    diagram = futures[future]
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        entry = {"status": "error", "error": {"code": "BUILD_ERROR", "message": str(e)}}
+                    if entry.get("status") == "error":
+                        self.log(f"FAILED  {diagram['source']}: {entry['error'].get('message')}")
+                        results["failed"].append({"source": diagram["source"], "error": entry["error"]})
+                        continue
+                    self.log(f"built   {diagram['source']} -> {diagram['output']}")
+                    results["built"].append(diagram["source"])
+                    with self._lockfile_lock:
+                        lock["diagrams"][diagram["source"]] = entry
+                        # Saved after every diagram, so an interrupted build keeps its progress
+                        atomic_write_json(self.lock_path, lock)
+
+        if results["removed"] and not dry_run:
+            for source in results["removed"]:
+                del lock["diagrams"][source]
+            atomic_write_json(self.lock_path, lock)
+
+        for failure in plan["errors"]:
+            self.log(f"FAILED  {failure['source']}: {failure['error']['message']}")
+        results["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        return results
+
+    def _build_one(self, root: str, diagram: Dict[str, Any]) -> Dict[str, Any]:
+        from request_scheduler import request_priority, BATCH
+        backend = self._get_backend()
+        output_dir = os.path.join(root, diagram["output"])
+        with request_priority(BATCH):
+            result = backend.run_contextweave_generation(
+                input_file=os.path.join(root, diagram["source"]),
+                mode=diagram["mode"],
+                export_formats=diagram["formats"],
+            )
+            if result.get("status") == "error":
+                return result
+            session_id = result.get("session_id")
+            if not session_id:
+                return {"status": "error", "error": {"code": "API_ERROR", "message": "No session_id returned"}}
+            exported = backend.export_contextweave_code(session_id, path=output_dir)
+            if exported.get("status") == "error":
+                return exported
+            if "svg" in diagram["formats"]:
+                error = self._write_svg(backend, session_id, result.get("svg_url"), output_dir)
+                if error is not None:
+                    return error
+        return {
+            "hash": diagram["hash"],
+            "output": diagram["output"],
+            "session_id": session_id,
+            "built_at": time.time(),
+        }
+
+    @staticmethod
+    def _write_svg(backend, session_id: str, svg_url: Optional[str], output_dir: str) -> Optional[Dict[str, Any]]:
+        target = os.path.join(output_dir, "diagram.svg")
+        local_path = None
+        if not svg_url:
+            exported = backend.export_session(session_id, "svg")
+            if exported.get("status") == "error":
+                return exported
+            svg_url, local_path = exported.get("svg_url"), exported.get("local_path")
+        try:
+            if local_path:
+                with open(local_path, "rb") as f:
+                    content = f.read()
+            elif svg_url:
+                resp = backend._get(svg_url)
+                resp.raise_for_status()
+                content = resp.content
+            else:
+                return {"status": "error", "error": {"code": "MISSING_SVG", "message": "The backend returned no SVG"}}
+            tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, target)
+        except Exception as e:
+            return {"status": "error", "error": {"code": "WRITE_ERROR", "message": str(e)}}
+        return None
+
+    def _get_backend(self):
+        with self._backend_lock:
+            if self._backend is None:
+                self._backend = self.backend_factory()
+            return self._backend
+
+
+def _default_backend():
+    # The MCP client's backend, configured from cwmcp_config.json (rate limits, caches, endpoints)
+    import main
+    return main.backend
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    """Console entry point (`cwmcp-build`)."""
+    parser = argparse.ArgumentParser(
+        prog="cwmcp-build", description="Regenerate the ContextWeave diagrams whose inputs changed.")
+    parser.add_argument("manifest", nargs="?", default=MANIFEST_NAME,
+                        help=f"Build manifest (default: {MANIFEST_NAME})")
+    parser.add_argument("-j", "--jobs", type=int, help="Diagrams generated in parallel (default: manifest 'jobs' or 4)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every diagram")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the diagrams that would be rebuilt")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.manifest):
+        print(f"Error: Manifest not found: {args.manifest}", file=sys.stderr)
+        return 2
+    try:
+        results = ProjectBuilder(args.manifest, jobs=args.jobs, force=args.force).build(dry_run=args.dry_run)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.dry_run:
+        for source in results["stale"]:
+            print(source)
+    print(f"{len(results['built'])} built, {results['up_to_date']} up to date, "
+          f"{len(results['failed'])} failed in {results['elapsed_seconds']}s", file=sys.stderr)
+    return 1 if results["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,171 @@
+import sys
+import time
+import threading
+from typing import Optional, Dict, Any, List, Callable
+
+from local_store import FileLock, atomic_write_json, read_json
+
+
+class Endpoint:
+    def __init__(self, url: str, client):
+        self.url = url
+        self.client = client
+        self.healthy = True
+        self.ewma_ms: Optional[float] = None
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_probe_at: Optional[float] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class EndpointRouter:
+    """
+    Routes backend requests across several regional endpoints.
+
+    - Health probe latency feeds an EWMA per endpoint, and new work goes to
+      the fastest healthy endpoint. Regular requests only report success or
+      failure: their duration depends on the work (a generation can take
+      minutes), not on the endpoint.
+    - Sessions stick to the endpoint that created them. If that endpoint is
+      down, the request fails over to the next best one, and the session is
+      rebound only if that endpoint answers with a 2xx.
+    - Bindings are saved to `affinity_path` (by URL), so sessions resumed
+      after a restart, or by another client process, go to their owner.
+    - After `start()`, a background thread probes `probe_path` on every
+      endpoint; any HTTP response below 500 counts as healthy.
+    """
+
+    def __init__(self, urls: List[str], client_factory: Callable[[str], Any],
+                 probe_path: str = "/health", probe_interval: float = 30.0,
+                 alpha: float = 0.3, failure_threshold: int = 2,
+                 affinity_path: Optional[str] = None, max_bindings: int = 1000):
+        self.endpoints = [Endpoint(url, client_factory(url)) for url in urls]
+        self.probe_path = probe_path
+        self.probe_interval = probe_interval
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.affinity_path = affinity_path
+        self.max_bindings = max_bindings
+        self._affinity: Dict[str, Endpoint] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def candidates(self, session_id: Optional[str] = None) -> List[Endpoint]:
+        """Endpoints in the order they should be tried for this request."""
+        owner = self.owner(session_id) if session_id else None
+        with self._lock:
+            ranked = sorted(self.endpoints, key=self._rank)
+        if owner is not None:
+            ranked.remove(owner)
+            ranked.insert(0, owner)
+        return ranked
+
+    def _rank(self, endpoint: Endpoint):
+        # Healthy first, then fastest; endpoints never measured are tried early
+        return (not endpoint.healthy, endpoint.ewma_ms if endpoint.ewma_ms is not None else 0.0)
+
+    def record(self, endpoint: Endpoint, latency_seconds: Optional[float], ok: bool) -> None:
+        with self._lock:
+            endpoint.requests += 1
+            if ok:
+                endpoint.consecutive_failures = 0
+                endpoint.healthy = True
+                if latency_seconds is not None:
+                    latency_ms = latency_seconds * 1000.0
+                    endpoint.ewma_ms = latency_ms if endpoint.ewma_ms is None else \
+                        self.alpha * latency_ms + (1 - self.alpha) * endpoint.ewma_ms
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.failure_threshold:
+                    endpoint.healthy = False
+
+    def bind(self, session_id: str, endpoint: Endpoint) -> None:
+        with self._lock:
+            if self._affinity.get(session_id) is endpoint:
+                return
+            self._affinity[session_id] = endpoint
+        if not self.affinity_path:
+            return
+        try:
+            with FileLock(self.affinity_path + ".lock"):
+                sessions = self._load_bindings()
+                sessions.pop(session_id, None)
+                sessions[session_id] = {"url": endpoint.url, "bound_at": time.time()}
+                # Oldest bindings first, so the cap drops the least recent ones
+                kept = list(sessions.items())[-self.max_bindings:]
+                atomic_write_json(self.affinity_path, {"sessions": dict(kept)})
+        except Exception as e:
+            print(f"Warning: Failed to save endpoint binding: {e}", file=sys.stderr)
+
+    def owner(self, session_id: str) -> Optional[Endpoint]:
+        with self._lock:
+            endpoint = self._affinity.get(session_id)
+        if endpoint is not None or not self.affinity_path:
+            return endpoint
+        url = (self._load_bindings().get(session_id) or {}).get("url")
+        endpoint = next((e for e in self.endpoints if e.url == url), None)
+        if endpoint is not None:
+            with self._lock:
+                self._affinity.setdefault(session_id, endpoint)
+        return endpoint
+
+    def _load_bindings(self) -> Dict[str, Any]:
+        data = read_json(self.affinity_path) or {}
+        sessions = data.get("sessions")
+        return sessions if isinstance(sessions, dict) else {}
+
+    # ---- Health probes ----
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._probe_loop, name="cwmcp-endpoint-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def probe_all(self) -> None:
+        for endpoint in self.endpoints:
+            started = time.monotonic()
+            try:
+                resp = endpoint.client.get(self.probe_path, timeout=10.0)
+                ok = resp.status_code < 500
+            except Exception:
+                ok = False
+            endpoint.last_probe_at = time.time()
+            if ok:
+                self.record(endpoint, time.monotonic() - started, True)
+            else:
+                # A failed probe takes the endpoint out of rotation at once
+                with self._lock:
+                    endpoint.failures += 1
+                    endpoint.consecutive_failures = max(endpoint.consecutive_failures + 1, self.failure_threshold)
+                    endpoint.healthy = False
+
+    def _probe_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.probe_all()
+            except Exception as e:
+                print(f"Warning: Endpoint probe failed: {e}", file=sys.stderr)
+            self._stop.wait(self.probe_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "endpoints": [e.snapshot() for e in sorted(self.endpoints, key=self._rank)],
+                "sessions_bound": len(self._affinity),
+            }
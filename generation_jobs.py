@@ -0,0 +1,99 @@
+import time
+import uuid
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from typing import Optional, Dict, Any, Callable, List
+
+FINISHED_STATES = ("done", "failed")
+
+
+class GenerationJobManager:
+    """
+    Runs generation calls on a background thread pool so a tool call can
+    return a job id immediately. Jobs live in memory for the lifetime of
+    the client process; finished jobs older than `retention` seconds are
+    dropped. Each job runs in a copy of the submitting caller's context.
+    """
+
+    def __init__(self, max_workers: int = 4, retention: float = 3600.0):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cwmcp-job")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, run: Callable[[], Dict[str, Any]], description: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "state": "pending",
+            "submitted_at": time.time(),
+            "description": description or {},
+            "result": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            # The job runs in a copy of the caller's context, keeping its request priority and request ID
+            self._futures[job_id] = self._executor.submit(contextvars.copy_context().run, self._run, job_id, run)
+        return self._snapshot(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is None:
+            return self.get(job_id)
+        wait_futures([future], timeout=max(0.0, timeout))
+        return self.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        self._prune()
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j["submitted_at"])
+            return [self._summary(j) for j in jobs]
+
+    def _run(self, job_id: str, run: Callable[[], Dict[str, Any]]) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job["state"] = "running"
+            job["started_at"] = time.time()
+        try:
+            result = run()
+        except Exception as e:
+            result = {"status": "error", "error": {"code": "JOB_ERROR", "message": str(e)}}
+        with self._lock:
+            job["result"] = result
+            job["state"] = "failed" if result.get("status") == "error" else "done"
+            job["finished_at"] = time.time()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["state"] in FINISHED_STATES and job.get("finished_at", 0) < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+                self._futures.pop(job_id, None)
+
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = dict(job)
+        start = job.get("started_at")
+        end = job.get("finished_at") or time.time()
+        snapshot["elapsed_seconds"] = round(end - start, 1) if start else 0.0
+        return snapshot
+
+    @classmethod
+    def _summary(cls, job: Dict[str, Any]) -> Dict[str, Any]:
+        summary = cls._snapshot(job)
+        result = summary.pop("result") or {}
+        for key in ("session_id", "svg_url", "error"):
+            if key in result:
+                summary[key] = result[key]
+        return summary
@@ -0,0 +1,185 @@
+import re
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+IMAGE_DATA_URI_RE = re.compile(r"!\[([^\]]*)\]\(\s*data:[^)]*\)")
+DATA_URI_RE = re.compile(r"data:[\w.+/-]+;base64,[A-Za-z0-9+/=\s]{64,}")
+LOG_LINE_RE = re.compile(
+    r"^\s*(\[?\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}|\[?\d{2}:\d{2}:\d{2}[.,\]\s]"
+    r"|\[?(TRACE|DEBUG|INFO|WARN|WARNING|ERROR|FATAL|CRITICAL)\]?[\s:])"
+)
+# Fenced blocks in these languages are diagram content and are sent unchanged
+DIAGRAM_FENCES = ("d2", "mermaid", "plantuml", "dot", "graphviz")
+# Lines kept at each end of a collapsed log run
+LOG_RUN_KEEP = 3
+
+
+def _split_blocks(text: str) -> List[Tuple[str, str]]:
+    """
+    Splits text into blank-line separated blocks, keeping each fenced code
+    block whole. Returns (separator, block) pairs: the separator is "\n\n"
+    after a run of blank lines, and "\n" where a fence directly follows or
+    precedes other text, so fences are not moved onto lines of their own.
+    """
+    blocks, current, in_fence, separator = [], [], False, ""
+    for line in text.split("\n"):
+        if line.lstrip().startswith("```"):
+            if not in_fence and current:
+                blocks.append((separator, "\n".join(current)))
+                current, separator = [], "\n"
+            current.append(line)
+            in_fence = not in_fence
+            if not in_fence:
+                blocks.append((separator, "\n".join(current)))
+                current, separator = [], "\n"
+            continue
+        if not in_fence and not line.strip():
+            if current:
+                blocks.append((separator, "\n".join(current)))
+                current = []
+            if blocks:
+                separator = "\n\n"
+            continue
+        current.append(line)
+    if current:
+        blocks.append((separator, "\n".join(current)))
+    return blocks
+
+
+def _fence_language(block: str) -> Optional[str]:
+    if not block.lstrip().startswith("```"):
+        return None
+    return block.lstrip().split("\n", 1)[0][3:].strip().lower()
+
+
+def _shorten_code_block(block: str, max_lines: int) -> Tuple[str, bool]:
+    lines = block.split("\n")
+    language = lines[0].strip()[3:].strip().lower()
+    body = lines[1:-1] if len(lines) > 1 and lines[-1].strip().startswith("```") else lines[1:]
+    if language in DIAGRAM_FENCES or len(body) <= max_lines:
+        return block, False
+    head, tail = body[:max_lines - max_lines // 4], body[-(max_lines // 4):] if max_lines >= 4 else []
+    omitted = len(body) - len(head) - len(tail)
+    return "\n".join([lines[0], *head, f"... ({omitted} lines omitted)", *tail, "```"]), True
+
+
+def _collapse_log_runs(lines: List[str], min_run: int, keep: int) -> Tuple[List[str], int]:
+    # A run must be longer than the lines kept at both ends, or nothing is left to omit
+    min_run = max(min_run, 2 * keep + 1)
+    out, removed, i = [], 0, 0
+    while i < len(lines):
+        j = i
+        while j < len(lines) and LOG_LINE_RE.match(lines[j]):
+            j += 1
+        if j - i >= min_run:
+            out.extend(lines[i:i + keep])
+            out.append(f"... ({j - i - 2 * keep} log lines omitted)")
+            out.extend(lines[j - keep:j])
+            removed += j - i - 2 * keep
+            i = j
+        elif j > i:
+            out.extend(lines[i:j])
+            i = j
+        else:
+            out.append(lines[i])
+            i += 1
+    return out, removed
+
+
+class InputMinimizer:
+    """
+    Shrinks a request before it is uploaded to `/run`:
+
+    - embedded base64 images / data URIs are replaced by a short placeholder,
+    - code blocks longer than `max_code_block_lines` keep their head and tail,
+    - long runs of log lines are collapsed to their first and last lines,
+    - repeated paragraphs are sent once,
+    - the result is cut at a block boundary to fit `budget_bytes`.
+
+    Diagram fences such as ```d2 are sent exactly as written, including
+    their blank lines and any data URIs, and are never dropped as duplicates.
+
+    `minimize` returns the new text and per-request stats, and totals are
+    kept for `get_client_stats`.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, max_code_block_lines: int = 80,
+                 log_run_lines: int = 20, dedupe_min_chars: int = 40):
+        self.budget_bytes = budget_bytes
+        self.max_code_block_lines = max_code_block_lines
+        self.log_run_lines = log_run_lines
+        self.dedupe_min_chars = dedupe_min_chars
+        self._lock = threading.Lock()
+        self._totals = {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def minimize(self, text: str) -> Tuple[str, Dict[str, Any]]:
+        original_bytes = len(text.encode("utf-8"))
+        actions = {"data_uris_removed": 0, "code_blocks_shortened": 0,
+                   "log_lines_removed": 0, "duplicates_removed": 0, "truncated": False}
+
+        blocks, seen = [], set()
+        for separator, block in _split_blocks(text):
+            language = _fence_language(block)
+            if language in DIAGRAM_FENCES:
+                blocks.append((separator, block))
+                continue
+            block, count = IMAGE_DATA_URI_RE.subn(lambda m: f"[image: {m.group(1) or 'embedded'}]", block)
+            actions["data_uris_removed"] += count
+            block, count = DATA_URI_RE.subn("[embedded data removed]", block)
+            actions["data_uris_removed"] += count
+            if language is not None:
+                block, shortened = _shorten_code_block(block, self.max_code_block_lines)
+                actions["code_blocks_shortened"] += int(shortened)
+            else:
+                lines, removed = _collapse_log_runs(block.split("\n"), self.log_run_lines, LOG_RUN_KEEP)
+                block = "\n".join(lines)
+                actions["log_lines_removed"] += removed
+            key = " ".join(block.split())
+            if len(key) >= self.dedupe_min_chars:
+                if key in seen:
+                    actions["duplicates_removed"] += 1
+                    continue
+                seen.add(key)
+            blocks.append((separator, block))
+
+        text = self._fit_budget(blocks, actions)
+        final_bytes = len(text.encode("utf-8"))
+        with self._lock:
+            self._totals["requests"] += 1
+            self._totals["bytes_in"] += original_bytes
+            self._totals["bytes_out"] += final_bytes
+        return text, {
+            "original_bytes": original_bytes,
+            "final_bytes": final_bytes,
+            "bytes_saved": original_bytes - final_bytes,
+            **{k: v for k, v in actions.items() if v},
+        }
+
+    def _fit_budget(self, blocks: List[Tuple[str, str]], actions: Dict[str, Any]) -> str:
+        text = "".join(separator + block for separator, block in blocks)
+        if not self.budget_bytes or len(text.encode("utf-8")) <= self.budget_bytes:
+            return text
+        actions["truncated"] = True
+        marker = "\n\n[... input truncated to fit the size budget]"
+        if len(marker.encode("utf-8")) >= self.budget_bytes:
+            # The marker alone would exceed a tiny budget: cut the text without it
+            return text.encode("utf-8")[:self.budget_bytes].decode("utf-8", errors="ignore")
+        budget = self.budget_bytes - len(marker.encode("utf-8"))
+        kept, size = [], 0
+        for separator, block in blocks:
+            piece = separator + block if kept else block
+            if size + len(piece.encode("utf-8")) > budget:
+                break
+            kept.append(piece)
+            size += len(piece.encode("utf-8"))
+        if not kept:
+            # Even the first block is too large: cut it at a character boundary
+            kept = [blocks[0][1].encode("utf-8")[:budget].decode("utf-8", errors="ignore")]
+        return "".join(kept) + marker
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._totals)
+        stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        stats["budget_bytes"] = self.budget_bytes
+        return stats
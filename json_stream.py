@@ -0,0 +1,208 @@
+import re
+import json
+import codecs
+from typing import Callable, Dict, Any, Optional
+
+_STRING_SPECIAL_RE = re.compile(r'[\\"]')
+# The longest run of complete string content (plain characters and whole escapes)
+_STRING_BODY_RE = re.compile(r'(?:[^"\\]+|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*')
+_PARTIAL_ESCAPE_RE = re.compile(r'\\(?:u[0-9a-fA-F]{0,3})?$')
+_TRAILING_HIGH_SURROGATE_RE = re.compile(r'\\u[dD][89abAB][0-9a-fA-F]{2}$')
+_WHITESPACE = " \t\r\n"
+
+
+class StreamingFieldDecoder:
+    """
+    Incrementally decodes one top-level string field of a JSON object from
+    a byte stream, without ever holding the whole document or string.
+
+    Each decoded piece of `field` is passed to `on_text` as soon as it is
+    available. Other top-level fields are parsed normally, if their raw JSON
+    is at most `max_other_chars`, and returned by `close()`; larger ones are
+    skipped. `close()` raises ValueError for truncated or malformed input.
+    """
+
+    def __init__(self, field: str, on_text: Callable[[str], None], max_other_chars: int = 64 * 1024):
+        self.field = field
+        self.on_text = on_text
+        self.max_other_chars = max_other_chars
+        self.found = False
+        self.fields: Dict[str, Any] = {}
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._state = "start"
+        self._key: Optional[str] = None
+        # Skipping a non-target value
+        self._raw: Optional[list] = None
+        self._raw_len = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, data: bytes) -> None:
+        self._buf += self._utf8.decode(data)
+        self._run()
+
+    def close(self) -> Dict[str, Any]:
+        self._buf += self._utf8.decode(b"", final=True)
+        self._run()
+        if self._state == "skip" and self._depth == 0 and not self._in_string:
+            # A number, true, false or null ends the document
+            self._finish_value()
+        if self._state != "done":
+            raise ValueError("Truncated JSON response")
+        return self.fields
+
+    # ---- State machine ----
+
+    def _run(self) -> None:
+        buf, pos, out = self._buf, 0, []
+        while pos < len(buf):
+            state = self._state
+            if state == "stream":
+                pos = self._stream(buf, pos, out)
+                if self._state == "stream":
+                    break
+                continue
+            if state == "skip":
+                pos = self._skip(buf, pos)
+                continue
+            char = buf[pos]
+            if char in _WHITESPACE:
+                pos += 1
+            elif state == "start":
+                if char != "{":
+                    raise ValueError("Expected a JSON object")
+                self._state, pos = "key_or_end", pos + 1
+            elif state in ("key_or_end", "key"):
+                if char == "}" and state == "key_or_end":
+                    self._state, pos = "done", pos + 1
+                    continue
+                if char != '"':
+                    raise ValueError(f"Expected an object key at {char!r}")
+                end = self._string_end(buf, pos + 1)
+                if end < 0:
+                    break
+                self._key = json.loads(buf[pos:end + 1])
+                self._state, pos = "colon", end + 1
+            elif state == "colon":
+                if char != ":":
+                    raise ValueError("Expected ':'")
+                self._state, pos = "value", pos + 1
+            elif state == "value":
+                if self._key == self.field and char == '"':
+                    self.found = True
+                    self._state, pos = "stream", pos + 1
+                else:
+                    self._raw, self._raw_len = [], 0
+                    self._depth, self._in_string, self._escaped = 0, False, False
+                    self._state = "skip"
+            elif state == "after_value":
+                if char == ",":
+                    self._state = "key"
+                elif char == "}":
+                    self._state = "done"
+                else:
+                    raise ValueError(f"Expected ',' or '}}' at {char!r}")
+                pos += 1
+            elif state == "done":
+                raise ValueError("Unexpected data after the JSON object")
+        self._buf = buf[pos:]
+        if out:
+            self.on_text("".join(out))
+
+    def _stream(self, buf: str, pos: int, out: list) -> int:
+        end = _STRING_BODY_RE.match(buf, pos).end()
+        closed = end < len(buf) and buf[end] == '"'
+        if not closed and end < len(buf) and not _PARTIAL_ESCAPE_RE.match(buf, end):
+            raise ValueError(f"Invalid string content at {buf[end:end + 6]!r}")
+        if not closed:
+            # Keep a high surrogate back until its low half arrives with the next chunk
+            match = _TRAILING_HIGH_SURROGATE_RE.search(buf, pos, end)
+            if match:
+                # Only a real escape, not an escaped backslash followed by "uD8..", is held back
+                index = match.start()
+                while index > pos and buf[index - 1] == "\\":
+                    index -= 1
+                if (match.start() - index) % 2 == 0:
+                    end = match.start()
+        if end > pos:
+            # Whole segments are decoded by the C string scanner of the json module
+            out.append(json.decoder.scanstring(f'"{buf[pos:end]}"', 1)[0])
+        if closed:
+            self._state = "after_value"
+            return end + 1
+        return end
+
+    def _skip(self, buf: str, pos: int) -> int:
+        start = pos
+        while pos < len(buf):
+            char = buf[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 0:
+                        pos += 1
+                        self._capture(buf[start:pos])
+                        self._finish_value()
+                        return pos
+                else:
+                    match = _STRING_SPECIAL_RE.search(buf, pos)
+                    pos = match.start() if match else len(buf)
+                    continue
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # End of a primitive value closing the object
+                    self._capture(buf[start:pos])
+                    self._finish_value()
+                    return pos
+                self._depth -= 1
+                if self._depth == 0:
+                    pos += 1
+                    self._capture(buf[start:pos])
+                    self._finish_value()
+                    return pos
+            elif self._depth == 0 and (char == "," or char in _WHITESPACE):
+                self._capture(buf[start:pos])
+                self._finish_value()
+                return pos
+            pos += 1
+        self._capture(buf[start:pos])
+        return pos
+
+    def _capture(self, text: str) -> None:
+        if self._raw is None:
+            return
+        self._raw_len += len(text)
+        if self._raw_len > self.max_other_chars:
+            self._raw = None
+        else:
+            self._raw.append(text)
+
+    def _finish_value(self) -> None:
+        if self._raw is not None:
+            self.fields[self._key] = json.loads("".join(self._raw))
+        self._raw = None
+        self._state = "after_value"
+
+    @staticmethod
+    def _string_end(buf: str, pos: int) -> int:
+        """Index of the quote closing the string that starts at `pos`, or -1 if not buffered yet."""
+        escaped = False
+        for index in range(pos, len(buf)):
+            char = buf[index]
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                return index
+        return -1
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import tempfile
+from typing import Optional, Any
+
+SESSION_FILE_NAME = ".last_session_id"
+
+
+def cwmcp_home() -> str:
+    """Returns the per-user state directory (CWMCP_HOME or ~/.cwmcp)."""
+    return os.environ.get("CWMCP_HOME") or os.path.expanduser("~/.cwmcp")
+
+
+def atomic_write_text(path: str, text: str) -> None:
+    """Writes text to a temp file next to `path` and renames it into place."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    atomic_write_text(path, json.dumps(data, indent=2, ensure_ascii=False))
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+class FileLock:
+    """
+    A cross-process lock based on exclusive creation of a lock file.
+    Works the same on Windows and POSIX, and lock files older than
+    `stale_after` seconds (left by a crashed process) are broken.
+    """
+
+    def __init__(self, path: str, timeout: float = 10.0, stale_after: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self._fd = None
+
+    def acquire(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(self._fd, str(os.getpid()).encode("ascii"))
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for lock: {self.path}")
+                time.sleep(0.01)
+
+    def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def load_last_session_id(directory: str) -> Optional[str]:
+    session_file = os.path.join(directory, SESSION_FILE_NAME)
+    if os.path.exists(session_file):
+        try:
+            with open(session_file, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except Exception:
+            pass
+    return None
+
+
+def save_last_session_id(directory: str, session_id: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    session_file_path = os.path.join(directory, SESSION_FILE_NAME)
+    with open(session_file_path, "w", encoding="utf-8") as f:
+        f.write(session_id)
+    return session_file_path
@@ -11,6 +11,19 @@ except ImportError:
     sys.exit(1)
 
 from remote_mcp_server import RemoteMCPServer
+from local_store import load_last_session_id, save_last_session_id
+from offline_queue import OfflineQueue, is_queueable
+from request_scheduler import RequestScheduler
+from generation_jobs import GenerationJobManager
+from output_shaping import dump_result
+from chunked_generation import ChunkedGenerator
+from artifact_store import ArtifactStore
+from prefetch import AssetPrefetcher
+from input_minimizer import InputMinimizer
+from shared_cache import SharedCache
+from profiling import ToolProfiler
+from prewarm import Prewarmer
+from revision_history import RevisionHistory
 import os
 
 # Initialize the Facade
@@ -24,6 +37,13 @@ mcp = FastMCP("Interleaved Thinking ContextWeave Generator")
 
 import json
 
+def _env_flag(name, default):
+    """Reads a boolean environment variable ("1", "true", "yes", "on"); `default` when it is unset or empty."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
 def load_config():
     try:
         if getattr(sys, 'frozen', False):
@@ -51,6 +71,34 @@ def load_config():
     if env_protocol:
         final_config["editor_protocol"] = env_protocol
 
+    # Feature switches; a set environment variable overrides the config file
+    for env_name, key in (
+        ("CWMCP_OFFLINE_QUEUE", "enable_offline_queue"),
+        ("CWMCP_COMPACT_OUTPUT", "compact_output"),
+        ("CWMCP_ARTIFACT_CACHE", "enable_artifact_cache"),
+        ("CWMCP_PREFETCH", "enable_prefetch"),
+        ("CWMCP_MINIMIZE_INPUT", "minimize_input"),
+        ("CWMCP_SHARED_CACHE", "enable_shared_cache"),
+        ("CWMCP_PROFILE", "enable_profiling"),
+        ("CWMCP_PREWARM", "enable_prewarm"),
+        ("CWMCP_REVISION_HISTORY", "enable_revision_history"),
+    ):
+        final_config[key] = _env_flag(env_name, final_config.get(key, False))
+
+    env_sample = os.environ.get("CWMCP_PROFILE_EVERY")
+    if env_sample:
+        try:
+            final_config["profile_sample_every"] = int(env_sample)
+        except ValueError:
+            print(f"Warning: Ignoring invalid CWMCP_PROFILE_EVERY: {env_sample}", file=sys.stderr)
+
+    env_rate = os.environ.get("CWMCP_RATE_LIMIT_RPS")
+    if env_rate:
+        try:
+            final_config["rate_limit_rps"] = float(env_rate)
+        except ValueError:
+            print(f"Warning: Ignoring invalid CWMCP_RATE_LIMIT_RPS: {env_rate}", file=sys.stderr)
+
     # Pass editor_protocol to backend if present
     if "editor_protocol" in final_config:
         backend.editor_protocol = final_config["editor_protocol"]
@@ -59,21 +107,211 @@ def load_config():
 
 config = load_config()
 
+# Health probe interval when several endpoints are configured in INTERLEAVED_THINKING_API_URL
+if getattr(backend, "router", None) is not None and config.get("endpoint_probe_interval"):
+    backend.router.probe_interval = float(config["endpoint_probe_interval"])
+
+# Opt-in host-wide rate limiting shared by every client process
+if config.get("rate_limit_rps"):
+    backend.scheduler = RequestScheduler(
+        api_url,
+        rate=float(config["rate_limit_rps"]),
+        burst=float(config.get("rate_limit_burst", 5)),
+        low_credit_threshold=config.get("low_credit_threshold"),
+    )
+
+# Opt-in durable queue for jobs the backend could not take (down, 402, 429)
+offline_queue = None
+if config.get("enable_offline_queue", False):
+    offline_queue = OfflineQueue(
+        backend,
+        queue_dir=config.get("offline_queue_dir"),
+        min_interval=float(config.get("offline_queue_min_interval", 5.0)),
+        credit_backoff=float(config.get("offline_queue_credit_backoff", 300.0)),
+    )
+    offline_queue.start()
+
+# Fields the backend is asked to leave out of its responses
+backend.exclude_fields = list(config.get("exclude_response_fields", []))
+
+# Opt-in input minimization (data URIs, huge code blocks, logs, duplicates, size budget)
+if config.get("minimize_input", False) or config.get("input_budget_bytes"):
+    backend.input_minimizer = InputMinimizer(
+        budget_bytes=int(config["input_budget_bytes"]) if config.get("input_budget_bytes") else None,
+        max_code_block_lines=int(config.get("input_max_code_block_lines", 80)),
+    )
+
+# Opt-in cache and session registry shared with the Node skill client
+shared_cache = None
+if config.get("enable_shared_cache", False):
+    shared_cache = SharedCache(
+        root=config.get("shared_cache_dir"),
+        ttl_seconds=float(config.get("shared_cache_ttl_hours", 24)) * 3600,
+    )
+    backend.shared_cache = shared_cache
+    # Session-to-endpoint bindings live next to the shared session registry
+    if getattr(backend, "router", None) is not None:
+        backend.router.affinity_path = os.path.join(shared_cache.root, "session_endpoints.json")
+
+# Opt-in chunked generation for very large input files
+if config.get("large_input_threshold_chars"):
+    backend.chunked_generator = ChunkedGenerator(
+        backend,
+        threshold_chars=int(config["large_input_threshold_chars"]),
+        max_chunk_chars=int(config.get("large_input_chunk_chars", 8000)),
+    )
+
+# Opt-in local cache of exported artifacts, keyed by session revision (prefetching fills it)
+if config.get("enable_artifact_cache", False) or config.get("enable_prefetch", False):
+    backend.artifact_store = ArtifactStore(
+        root=config.get("artifact_cache_dir"),
+        max_bytes=int(float(config.get("artifact_cache_max_mb", 256)) * 1024 * 1024),
+    )
+
+# Opt-in background download of the SVG and D2 code right after a generation
+if config.get("enable_prefetch", False):
+    backend.prefetcher = AssetPrefetcher(backend, backend.artifact_store)
+
+# Opt-in local log of each session's D2 code (rollback and diff without generation cost)
+revision_history = None
+if config.get("enable_revision_history", False):
+    revision_history = RevisionHistory(
+        backend,
+        root=config.get("revision_history_dir"),
+        max_revisions=int(config.get("revision_history_max", 50)),
+    )
+    backend.revision_history = revision_history
+
+# Background executor for submit_contextweave_generation
+generation_jobs = GenerationJobManager(max_workers=int(config.get("max_concurrent_jobs", 4)))
+
+# Opt-in background prewarm (connection, API key check, outline prompt), started by run()
+prewarmer = None
+if config.get("enable_prewarm", False):
+    prewarmer = Prewarmer(
+        backend,
+        probe_path=config.get("prewarm_probe_path", "/health"),
+        key_check_path=config.get("prewarm_key_check_path", "/session/export"),
+        fetch_outline_prompt=config.get("enable_plan_mode", True),
+    )
+
+# Opt-in profiling of tool calls (cProfile + tracemalloc on every Nth call)
+profiler = None
+if config.get("enable_profiling", False):
+    profiler = ToolProfiler(
+        profile_dir=config.get("profile_dir"),
+        sample_every=int(config.get("profile_sample_every", 1)),
+    )
+
+def mcp_tool():
+    """Registers a tool with FastMCP, timed and sampled by the profiler when profiling is enabled."""
+    def decorator(func):
+        return mcp.tool()(profiler.wrap(func) if profiler is not None else func)
+    return decorator
+
 def conditional_tool(condition):
     def decorator(func):
         if condition:
-            return mcp.tool()(func)
+            return mcp_tool()(func)
         return func
     return decorator
 
+def _dump(result) -> str:
+    """Serializes a tool result; compact mode drops indentation and spills large fields to files."""
+    return dump_result(
+        result,
+        compact=config.get("compact_output", False),
+        spill_threshold_bytes=int(config.get("spill_threshold_bytes", 4096)),
+        spill_dir=config.get("spill_dir"),
+    )
+
+def _save_session(working_dir: Optional[str], result: dict) -> None:
+    """Persists the result's session_id to '.last_session_id' in working_dir (and the shared registry)."""
+    if working_dir and result.get("status") == "ok" and "session_id" in result:
+        try:
+            result["session_file_path"] = save_last_session_id(working_dir, result["session_id"])
+        except Exception as e:
+            print(f"Warning: Failed to save session ID: {e}", file=sys.stderr)
+        if shared_cache is not None:
+            try:
+                shared_cache.record_session(result["session_id"], working_dir=working_dir)
+            except Exception as e:
+                print(f"Warning: Failed to update shared session registry: {e}", file=sys.stderr)
+
+def _load_session(working_dir: str) -> Optional[str]:
+    """Reads '.last_session_id' in working_dir, falling back to the session registry shared with the Node client."""
+    session_id = load_last_session_id(working_dir)
+    if not session_id and shared_cache is not None:
+        session_id = shared_cache.latest_session(working_dir=working_dir)
+    return session_id
+
+def _queue_on_failure(kind: str, params: dict, result: dict, working_dir: Optional[str] = None) -> dict:
+    """Hands the job to the offline queue when the backend could not take it."""
+    if offline_queue is None or result.get("status") != "error":
+        return result
+    error = result.get("error") or {}
+    if not is_queueable(error):
+        return result
+    job = offline_queue.enqueue(kind, params, working_dir=working_dir, last_error=error)
+    return {
+        "status": "queued",
+        "job_id": job["job_id"],
+        "kind": kind,
+        "reason": error,
+        "message": "The backend is unavailable; the job was queued and will run in the background. "
+                   "Use get_offline_queue_status to track it."
+    }
+
+def _prepare_generation(input_file: Optional[str], user_request: Optional[str], session_id: Optional[str],
+                        mode: str, input_sequence: Optional[str], working_dir: Optional[str],
+                        export_formats: Optional[str] = None):
+    """Validates generation arguments. Returns (params, None) or (None, error_output)."""
+    if not input_file and not user_request:
+        return None, _dump({
+            "status": "error", 
+            "error": {
+                "code": "MISSING_INPUT", 
+                "message": "Both 'input_file' and 'user_request' cannot be empty. Please provide at least one."
+            }
+        })
+
+    inputs = None
+    if input_sequence:
+        try:
+            inputs = json.loads(input_sequence)
+        except:
+            return None, f"Error: input_sequence must be valid JSON string. Got: {input_sequence}"
+    
+    # Resolve session_id
+    current_session_id = session_id
+    if not current_session_id and working_dir:
+        current_session_id = _load_session(working_dir)
+
+    params = dict(
+        input_file=input_file, 
+        user_request=user_request,
+        session_id=current_session_id,
+        mode=mode, 
+        input_sequence=inputs
+    )
+    if export_formats is not None:
+        params["export_formats"] = export_formats
+    return params, None
+
+def _finish_generation(params: dict, result: dict, working_dir: Optional[str]) -> dict:
+    # Save new session_id
+    _save_session(working_dir, result)
+    return _queue_on_failure("generate", params, result, working_dir)
+
 # Redefine as sync functions for FastMCP auto-threading
-@mcp.tool()
+@mcp_tool()
 def run_contextweave_generation(input_file: Optional[str] = None, 
                       user_request: Optional[str] = None,
                       session_id: Optional[str] = None,
                       mode: str = "3", 
                       input_sequence: str = None,
-                      working_dir: Optional[str] = None) -> str:
+                      working_dir: Optional[str] = None,
+                      export_formats: Optional[str] = None) -> str:
     """
     Create a NEW ContextWeave diagram directly (or run a general generation task).
     This is the PREFERRED and DEFAULT mode for generating diagrams.
@@ -91,61 +329,91 @@ def run_contextweave_generation(input_file: Optional[str] = None,
         mode: The running mode (default "3" for ContextWeave).
         input_sequence: Optional JSON string of input list (e.g. '["yes", "1"]').
         working_dir: Optional. If provided, attempts to load session_id from '.last_session_id' (if session_id not explicit) and saves new session_id after run.
+        export_formats: Optional. Comma-separated formats to render with this run: 'svg' (default), 'pptx', 'svg,pptx',
+                        or 'none' to skip rendering for fast draft iterations (export later with `export_session_contextweave`).
     """
-    import json
     
-    if not input_file and not user_request:
-        return json.dumps({
-            "status": "error", 
-            "error": {
-                "code": "MISSING_INPUT", 
-                "message": "Both 'input_file' and 'user_request' cannot be empty. Please provide at least one."
-            }
-        }, indent=2)
+    params, error = _prepare_generation(input_file, user_request, session_id, mode, input_sequence, working_dir, export_formats)
+    if error:
+        return error
 
-    inputs = None
-    if input_sequence:
-        try:
-            inputs = json.loads(input_sequence)
-        except:
-            return f"Error: input_sequence must be valid JSON string. Got: {input_sequence}"
-    
-    # Resolve session_id
-    current_session_id = session_id
-    if not current_session_id and working_dir:
-        session_file = os.path.join(working_dir, ".last_session_id")
-        if os.path.exists(session_file):
-            try:
-                with open(session_file, "r", encoding="utf-8") as f:
-                    current_session_id = f.read().strip()
-            except:
-                pass
+    result = backend.run_contextweave_generation(**params)
+    result = _finish_generation(params, result, working_dir)
 
-    result = backend.run_contextweave_generation(
-        input_file=input_file, 
-        user_request=user_request,
-        session_id=current_session_id,
-        mode=mode, 
-        input_sequence=inputs
-    )
+    return _dump(result)
+
+@mcp_tool()
+def submit_contextweave_generation(input_file: Optional[str] = None, 
+                                   user_request: Optional[str] = None,
+                                   session_id: Optional[str] = None,
+                                   mode: str = "3", 
+                                   input_sequence: str = None,
+                                   working_dir: Optional[str] = None,
+                                   export_formats: Optional[str] = None) -> str:
+    """
+    Start a ContextWeave generation in the background and return a job_id immediately.
+    Takes the same arguments as `run_contextweave_generation`. Use it when the generation may
+    outlast the tool timeout, or to fan out several diagrams at once (use a different
+    working_dir per diagram so their session files do not overwrite each other).
+    Collect results with `await_generation` (or poll with `get_generation_status`).
+
+    Args:
+        input_file: Optional path to the input file (e.g. .md or .txt) containing the request or context.
+        user_request: Natural language description of the ContextWeave.
+        session_id: Optional. The session ID to continue editing. If not provided, checks working_dir.
+        mode: The running mode (default "3" for ContextWeave).
+        input_sequence: Optional JSON string of input list (e.g. '["yes", "1"]').
+        working_dir: Optional. Loads session_id from '.last_session_id' and saves the new one when the job finishes.
+        export_formats: Optional. 'svg' (default), 'pptx', 'svg,pptx' or 'none'.
+    """
+
+    params, error = _prepare_generation(input_file, user_request, session_id, mode, input_sequence, working_dir, export_formats)
+    if error:
+        return error
+
+    def run():
+        return _finish_generation(params, backend.run_contextweave_generation(**params), working_dir)
+
+    job = generation_jobs.submit(run, {"input_file": input_file, "working_dir": working_dir})
+    return _dump({"status": "submitted", "job_id": job["job_id"]})
+
+@mcp_tool()
+def get_generation_status(job_id: Optional[str] = None) -> str:
+    """
+    Check a background generation started with `submit_contextweave_generation`.
+    Returns the job state ('pending', 'running', 'done', 'failed') and, once finished, its result.
     
-    # Save new session_id
-    if working_dir and result.get("status") == "ok" and "session_id" in result:
-        try:
-            os.makedirs(working_dir, exist_ok=True)
-            session_file_path = os.path.join(working_dir, ".last_session_id")
-            with open(session_file_path, "w", encoding="utf-8") as f:
-                f.write(result["session_id"])
-            result["session_file_path"] = session_file_path
-        except Exception as e:
-            print(f"Warning: Failed to save session ID: {e}", file=sys.stderr)
+    Args:
+        job_id: Optional. If omitted, lists all jobs of this client process.
+    """
+    if not job_id:
+        return _dump({"status": "ok", "jobs": generation_jobs.list()})
+    job = generation_jobs.get(job_id)
+    if not job:
+        return _dump({"status": "error", "error": {"code": "JOB_NOT_FOUND", "message": f"Unknown job: {job_id}"}})
+    return _dump(job)
 
-    return json.dumps(result, indent=2)
+@mcp_tool()
+def await_generation(job_id: str, timeout_seconds: float = 50.0) -> str:
+    """
+    Wait for a background generation to finish and return its result.
+    If the job is still running when the timeout expires, the current state is returned;
+    call this tool again to keep waiting.
+    
+    Args:
+        job_id: The job ID returned by `submit_contextweave_generation`.
+        timeout_seconds: Maximum seconds to wait in this call (default 50, kept below typical tool timeouts).
+    """
+    job = generation_jobs.wait(job_id, timeout_seconds)
+    if not job:
+        return _dump({"status": "error", "error": {"code": "JOB_NOT_FOUND", "message": f"Unknown job: {job_id}"}})
+    return _dump(job)
 
-@mcp.tool()
+@mcp_tool()
 def edit_contextweave(user_request: str, 
                       working_dir: Optional[str] = None, 
-                      session_id: Optional[str] = None) -> str:
+                      session_id: Optional[str] = None,
+                      export_formats: Optional[str] = None) -> str:
     """
     Edit/Modify an EXISTING ContextWeave diagram in the current session.
     Use this tool when the user wants to change, update, or refine an existing diagram.
@@ -154,8 +422,8 @@ def edit_contextweave(user_request: str,
         user_request: The modification instructions (e.g. "Add a node X", "Change style of Y").
         working_dir: Directory containing the .last_session_id file. Defaults to current if not provided.
         session_id: Explicit session ID (optional). If provided, overrides working_dir lookup.
+        export_formats: Optional. 'svg' (default), 'pptx', 'svg,pptx' or 'none' to skip rendering while iterating.
     """
-    import json
     
     # Resolve session_id (Mandatory for edit)
     current_session_id = session_id
@@ -164,55 +432,47 @@ def edit_contextweave(user_request: str,
     search_dir = working_dir if working_dir else os.getcwd()
     
     if not current_session_id:
-        session_file = os.path.join(search_dir, ".last_session_id")
-        if os.path.exists(session_file):
-            try:
-                with open(session_file, "r", encoding="utf-8") as f:
-                    current_session_id = f.read().strip()
-            except:
-                pass
+        current_session_id = _load_session(search_dir)
     
     if not current_session_id:
-        return json.dumps({
+        return _dump({
             "status": "error", 
             "error": {
                 "code": "NO_SESSION", 
                 "message": "No active session found. Please provide session_id or ensure .last_session_id exists in working_dir."
             }
-        }, indent=2)
+        })
 
     # Call backend
-    result = backend.run_contextweave_generation(
+    params = dict(
         user_request=user_request,
         session_id=current_session_id,
         mode="3"
     )
+    if export_formats is not None:
+        params["export_formats"] = export_formats
+    result = backend.run_contextweave_generation(**params)
     
     # Update session file if needed (usually ID stays same, but good practice to sync)
-    if working_dir and result.get("status") == "ok" and "session_id" in result:
-        try:
-            os.makedirs(working_dir, exist_ok=True)
-            session_file_path = os.path.join(working_dir, ".last_session_id")
-            with open(session_file_path, "w", encoding="utf-8") as f:
-                f.write(result["session_id"])
-            result["session_file_path"] = session_file_path
-        except Exception as e:
-            print(f"Warning: Failed to save session ID: {e}", file=sys.stderr)
+    _save_session(working_dir, result)
+    result = _queue_on_failure("generate", params, result, working_dir)
 
-    return json.dumps(result, indent=2)
+    return _dump(result)
 
-@mcp.tool()
+@mcp_tool()
 def export_session_contextweave(session_id: str, format: str) -> str:
     """
     Export a generated ContextWeave visual from a session to a specific format.
     
     Args:
         session_id: The session ID returned by run_contextweave_generation.
-        format: The target format ('svg' or 'pptx').
+        format: The target format ('svg' or 'pptx'), or several comma-separated (e.g. 'svg,pptx')
+                to produce them in parallel in one call.
     """
-    import json
-    result = backend.export_session(session_id=session_id, format=format)
-    return json.dumps(result, indent=2)
+    params = dict(session_id=session_id, format=format)
+    result = backend.export_session(**params)
+    result = _queue_on_failure("export_session", params, result)
+    return _dump(result)
 
 @conditional_tool(config.get("enable_plan_mode", True))
 def get_outline_prompt() -> str:
@@ -247,25 +507,22 @@ def generate_contextweave_from_outline(outline_file_path: str, user_request: str
         user_request: The original user request to guide refinement (optional but recommended).
         working_dir: Optional. If provided, saves the returned session_id to '.last_session_id' in this directory. Defaults to the outline file's directory.
     """
-    import json
     resolved_working_dir = working_dir or (os.path.dirname(outline_file_path) if outline_file_path else None)
     
     result = backend.generate_contextweave_from_outline(outline_file_path, user_request)
     
     # Save new session_id
-    if resolved_working_dir and result.get("status") == "ok" and "session_id" in result:
-         try:
-             os.makedirs(resolved_working_dir, exist_ok=True)
-             session_file_path = os.path.join(resolved_working_dir, ".last_session_id")
-             with open(session_file_path, "w", encoding="utf-8") as f:
-                 f.write(result["session_id"])
-             result["session_file_path"] = session_file_path
-         except Exception as e:
-             print(f"Warning: Failed to save session ID: {e}", file=sys.stderr)
-
-    return json.dumps(result, indent=2)
-
-@mcp.tool()
+    _save_session(resolved_working_dir, result)
+    result = _queue_on_failure(
+        "outline",
+        dict(outline_file_path=outline_file_path, user_request=user_request),
+        result,
+        resolved_working_dir
+    )
+
+    return _dump(result)
+
+@mcp_tool()
 def import_contextweave_code(path: str = "ContextWeave", working_dir: Optional[str] = None) -> str:
     """
     Import ContextWeave code from a directory (default: ContextWeave) into a new session.
@@ -275,27 +532,17 @@ def import_contextweave_code(path: str = "ContextWeave", working_dir: Optional[s
         path: Directory path to import from. Defaults to "ContextWeave".
         working_dir: Optional. If provided, saves the imported session_id to '.last_session_id' in this directory.
     """
-    import json
     result = backend.import_contextweave_code(path=path)
     
-    if working_dir and result.get("status") == "ok" and "session_id" in result:
-        try:
-             os.makedirs(working_dir, exist_ok=True)
-             session_file_path = os.path.join(working_dir, ".last_session_id")
-             with open(session_file_path, "w", encoding="utf-8") as f:
-                 f.write(result["session_id"])
-             result["session_file_path"] = session_file_path
-        except Exception as e:
-             # Just warn, don't fail
-             print(f"Warning: Failed to save session ID: {e}", file=sys.stderr)
+    _save_session(working_dir, result)
 
     # Remove d2_code from result to keep output clean
     if "d2_code" in result:
         del result["d2_code"]
 
-    return json.dumps(result, indent=2)
+    return _dump(result)
 
-@mcp.tool()
+@mcp_tool()
 def export_contextweave_code(session_id: str, path: str = "ContextWeave") -> str:
     """
     Export ContextWeave code from a session to a directory (default: ContextWeave).
@@ -305,11 +552,147 @@ def export_contextweave_code(session_id: str, path: str = "ContextWeave") -> str
         session_id: The session ID containing the ContextWeave code.
         path: Directory path to export to. Defaults to "ContextWeave".
     """
-    import json
-    result = backend.export_contextweave_code(session_id=session_id, path=path)
-    return json.dumps(result, indent=2)
+    params = dict(session_id=session_id, path=path)
+    result = backend.export_contextweave_code(**params)
+    result = _queue_on_failure("export_code", params, result)
+    return _dump(result)
 
-if __name__ == "__main__":
-    # Run the server
+def _history_session(session_id: Optional[str], working_dir: Optional[str]):
+    """Resolves the session for the revision history tools. Returns (session_id, None) or (None, error_output)."""
+    if revision_history is None:
+        return None, _dump({"status": "error", "error": {"code": "HISTORY_DISABLED", "message": "Revision history is not enabled."}})
+    current_session_id = session_id or _load_session(working_dir if working_dir else os.getcwd())
+    if not current_session_id:
+        return None, _dump({"status": "error", "error": {"code": "NO_SESSION", "message": "No active session found. Please provide session_id or working_dir."}})
+    revision_history.wait_for(current_session_id)
+    return current_session_id, None
+
+@conditional_tool(revision_history is not None)
+def list_contextweave_revisions(session_id: Optional[str] = None, working_dir: Optional[str] = None) -> str:
+    """
+    List the locally recorded revisions of a session's ContextWeave code (newest last).
+    Every successful generation, edit and import is recorded; identical consecutive revisions are stored once.
+
+    Args:
+        session_id: Optional. Defaults to the session in working_dir's .last_session_id.
+        working_dir: Optional. Directory containing the .last_session_id file. Defaults to current.
+    """
+    current_session_id, error = _history_session(session_id, working_dir)
+    if error:
+        return error
+    return _dump({"status": "ok", "session_id": current_session_id, "revisions": revision_history.list(current_session_id)})
+
+@conditional_tool(revision_history is not None)
+def rollback_contextweave(revision: int, session_id: Optional[str] = None, working_dir: Optional[str] = None) -> str:
+    """
+    Roll a diagram back to an earlier local revision, without any generation cost.
+    The revision's code is re-imported as a new session, whose session_id is returned (and saved to working_dir).
+
+    Args:
+        revision: Revision number from list_contextweave_revisions; negative values count back from the latest (-2 = previous).
+        session_id: Optional. Defaults to the session in working_dir's .last_session_id.
+        working_dir: Optional. Directory containing the .last_session_id file. Defaults to current.
+    """
+    current_session_id, error = _history_session(session_id, working_dir)
+    if error:
+        return error
+    entry = revision_history.get(current_session_id, revision)
+    if entry is None:
+        return _dump({"status": "error", "error": {"code": "REVISION_NOT_FOUND", "message": f"Session {current_session_id} has no local revision {revision}."}})
+    result = backend.import_d2_code(entry["d2_code"], source_name=f"{current_session_id}@{entry['revision']}")
+    if result.get("status") == "ok" and result.get("session_id"):
+        revision_history.fork(current_session_id, entry["revision"], result["session_id"])
+        result["rolled_back_to"] = entry["revision"]
+        result["previous_session_id"] = current_session_id
+        _save_session(working_dir, result)
+    return _dump(result)
+
+@conditional_tool(revision_history is not None)
+def diff_contextweave_revisions(from_revision: int, to_revision: Optional[int] = None,
+                                session_id: Optional[str] = None, working_dir: Optional[str] = None) -> str:
+    """
+    Show a unified diff of a session's ContextWeave code between two local revisions.
+
+    Args:
+        from_revision: Older revision number (negative values count back from the latest).
+        to_revision: Optional. Newer revision number. Defaults to the latest.
+        session_id: Optional. Defaults to the session in working_dir's .last_session_id.
+        working_dir: Optional. Directory containing the .last_session_id file. Defaults to current.
+    """
+    current_session_id, error = _history_session(session_id, working_dir)
+    if error:
+        return error
+    diff = revision_history.diff(current_session_id, from_revision, to_revision)
+    if diff is None:
+        return _dump({"status": "error", "error": {"code": "REVISION_NOT_FOUND", "message": f"Unknown revision for session {current_session_id}."}})
+    return _dump(dict(diff, status="ok", session_id=current_session_id))
+
+@mcp_tool()
+def get_client_stats() -> str:
+    """
+    Show local client statistics: prefetch hit rate, artifact cache usage, rate limiter state,
+    bytes saved by input minimization, startup prewarm timings and per-endpoint latency and health when several endpoints are configured.
+    Sections are only present for features enabled in the client configuration.
+    """
+    stats = {"status": "ok"}
+    if getattr(backend, "prefetcher", None) is not None:
+        stats["prefetch"] = backend.prefetcher.stats()
+    if getattr(backend, "artifact_store", None) is not None:
+        stats["artifact_cache"] = backend.artifact_store.stats()
+    if getattr(backend, "scheduler", None) is not None:
+        stats["rate_limit"] = backend.scheduler.stats()
+    if prewarmer is not None:
+        stats["prewarm"] = prewarmer.stats()
+    if shared_cache is not None:
+        stats["shared_cache"] = shared_cache.stats()
+    if getattr(backend, "input_minimizer", None) is not None:
+        stats["input_minimization"] = backend.input_minimizer.stats()
+    if getattr(backend, "router", None) is not None:
+        stats["routing"] = backend.router.stats()
+    return _dump(stats)
+
+@conditional_tool(profiler is not None)
+def get_slow_tool_calls(limit: int = 10, tool: Optional[str] = None) -> str:
+    """
+    List the slowest recent tool calls with their duration, X-Request-ID and, for profiled calls,
+    the paths of the cProfile (.prof) and tracemalloc (.mem.txt) files.
+
+    Args:
+        limit: Optional. Maximum number of calls to return (default 10).
+        tool: Optional. Only list calls of this tool.
+    """
+    if profiler is None:
+        return _dump({"status": "error", "error": {"code": "PROFILING_DISABLED", "message": "Profiling is not enabled."}})
+    return _dump({"status": "ok", "profile_dir": profiler.profile_dir, "calls": profiler.slowest(limit, tool)})
+
+@conditional_tool(offline_queue is not None)
+def get_offline_queue_status(job_id: Optional[str] = None) -> str:
+    """
+    Show the offline job queue: depth, per-state counts, estimated time to drain and recent jobs.
+    Jobs are queued automatically when the backend is unreachable, rate limited or out of credits.
+    
+    Args:
+        job_id: Optional. If provided, returns the full record of that job (including its result once done).
+    """
+    if offline_queue is None:
+        return _dump({"status": "error", "error": {"code": "QUEUE_DISABLED", "message": "Offline queue is not enabled."}})
+    if job_id:
+        job = offline_queue.get_job(job_id)
+        if not job:
+            return _dump({"status": "error", "error": {"code": "JOB_NOT_FOUND", "message": f"Unknown job: {job_id}"}})
+        return _dump(job)
+    return _dump(offline_queue.status())
+
+def run():
+    """Console entry point: starts endpoint probes and the optional prewarm in the background, then serves MCP over stdio."""
     print("Starting Interleaved Thinking MCP Server...", file=sys.stderr)
+    if backend.router is not None:
+        backend.router.start()
+    # The prewarm runs on a daemon thread and never delays the MCP handshake
+    if prewarmer is not None:
+        prewarmer.start()
     mcp.run()
+
+if __name__ == "__main__":
+    # Run the server
+    run()
@@ -0,0 +1,331 @@
+import os
+import re
+import sys
+import time
+import uuid
+import socket
+import threading
+from typing import Optional, Dict, Any, List
+
+from local_store import FileLock, atomic_write_json, read_json, save_last_session_id, cwmcp_home
+from request_scheduler import request_priority, BATCH
+
+# Error codes that mean "the backend could not take the work right now".
+QUEUEABLE_ERROR_CODES = {"PAYMENT_REQUIRED", "RATE_LIMITED"}
+
+
+def is_queueable(error: Optional[Dict[str, Any]]) -> bool:
+    """An API_ERROR is only queued when the call failed transiently (connection, timeout, 5xx, 429)."""
+    error = error or {}
+    code = error.get("code")
+    return code in QUEUEABLE_ERROR_CODES or (code == "API_ERROR" and bool(error.get("retryable")))
+
+
+JOB_KINDS = ("generate", "outline", "export_session", "export_code")
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class OfflineQueue:
+    """
+    A durable on-disk queue for generation and export jobs that failed
+    because the backend was unreachable, rate limited or out of credits.
+
+    Each job is one JSON file under `<queue_dir>/jobs`, rewritten atomically
+    on every state change, so a crash never loses or corrupts a job. A
+    background thread drains pending jobs at most one per `min_interval`
+    seconds and pauses the whole queue for `credit_backoff` seconds when
+    the backend reports insufficient credits.
+
+    The queue directory is shared by every client process. A running job
+    records its owner (host and pid) and holds a lease that the owner
+    renews every `lease_seconds / 3` while the call is in flight. Another
+    process only takes a running job back when its lease has expired, or
+    when its owner on the same host has exited.
+    """
+
+    def __init__(self, backend, queue_dir: Optional[str] = None,
+                 min_interval: float = 5.0, credit_backoff: float = 300.0,
+                 max_attempts: int = 20, lease_seconds: float = 120.0):
+        self.backend = backend
+        self.queue_dir = queue_dir or os.path.join(cwmcp_home(), "queue")
+        self.jobs_dir = os.path.join(self.queue_dir, "jobs")
+        self.state_path = os.path.join(self.queue_dir, "state.json")
+        self.lock_path = os.path.join(self.queue_dir, ".lock")
+        self.min_interval = min_interval
+        self.credit_backoff = credit_backoff
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._avg_job_seconds = 60.0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._recover_running_jobs()
+
+    # ---- Public API ----
+
+    def enqueue(self, kind: str, params: Dict[str, Any],
+                working_dir: Optional[str] = None,
+                last_error: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "params": params,
+            "working_dir": working_dir,
+            "state": "pending",
+            "attempts": 0,
+            "created_at": now,
+            "not_before": now,
+            "last_error": last_error,
+            "result": None,
+        }
+        with FileLock(self.lock_path):
+            self._write_job(job)
+        self._wakeup.set()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not isinstance(job_id, str) or not JOB_ID_RE.match(job_id):
+            return None
+        return read_json(self._job_path(job_id))
+
+    def status(self) -> Dict[str, Any]:
+        with FileLock(self.lock_path):
+            jobs = self._list_jobs()
+            paused_until = read_json(self.state_path, {}).get("paused_until", 0)
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        for job in jobs:
+            counts[job["state"]] = counts.get(job["state"], 0) + 1
+
+        now = time.time()
+        pause_left = max(0.0, paused_until - now)
+        depth = counts["pending"] + counts["running"]
+        per_job = self._avg_job_seconds + self.min_interval
+        eta = pause_left + depth * per_job if depth else 0.0
+
+        active = sorted((j for j in jobs if j["state"] in ("pending", "running")),
+                        key=lambda j: j["created_at"])
+        recent = sorted((j for j in jobs if j["state"] in ("done", "failed")),
+                        key=lambda j: j.get("finished_at", 0), reverse=True)[:10]
+        return {
+            "status": "ok",
+            "queue_dir": self.queue_dir,
+            "depth": depth,
+            "counts": counts,
+            "paused_for_seconds": round(pause_left, 1),
+            "eta_seconds": round(eta, 1),
+            "jobs": [self._summary(j) for j in active + recent],
+        }
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._drain_loop, name="cwmcp-offline-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def drain_once(self) -> bool:
+        """Runs the next due job, if any. Returns True when a job ran."""
+        job = self._claim_next_job()
+        if not job:
+            return False
+        started = time.monotonic()
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), name="cwmcp-queue-lease", daemon=True)
+        heartbeat.start()
+        try:
+            with request_priority(BATCH):
+                result = self._run_job(job)
+        except Exception as e:
+            result = {"status": "error", "error": {"code": "API_ERROR", "message": str(e)}}
+        finally:
+            done.set()
+            heartbeat.join()
+        elapsed = time.monotonic() - started
+        self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+        self._finish_job(job, result)
+        return True
+
+    # ---- Drain loop ----
+
+    def _drain_loop(self) -> None:
+        while not self._stop.is_set():
+            ran = False
+            try:
+                ran = self.drain_once()
+            except Exception as e:
+                print(f"Warning: Offline queue drain failed: {e}", file=sys.stderr)
+            self._wakeup.clear()
+            self._wakeup.wait(self.min_interval if ran else self._idle_wait())
+
+    def _idle_wait(self) -> float:
+        now = time.time()
+        with FileLock(self.lock_path):
+            due = [j["not_before"] for j in self._list_jobs() if j["state"] == "pending"]
+            paused_until = read_json(self.state_path, {}).get("paused_until", 0)
+        if not due:
+            return 60.0
+        wait = max(min(due), paused_until) - now
+        return min(max(wait, self.min_interval), 60.0)
+
+    def _claim_next_job(self) -> Optional[Dict[str, Any]]:
+        with FileLock(self.lock_path):
+            now = time.time()
+            state = read_json(self.state_path, {})
+            if state.get("paused_until", 0) > now:
+                return None
+            if now - state.get("last_run_at", 0) < self.min_interval:
+                return None
+            self._recover_abandoned_jobs(now)
+            due = [j for j in self._list_jobs() if j["state"] == "pending" and j["not_before"] <= now]
+            if not due:
+                return None
+            job = min(due, key=lambda j: j["created_at"])
+            job["state"] = "running"
+            job["attempts"] += 1
+            job["started_at"] = now
+            job["owner"] = self._owner()
+            job["lease_until"] = now + self.lease_seconds
+            self._write_job(job)
+            state["last_run_at"] = now
+            atomic_write_json(self.state_path, state)
+            return job
+
+    def _run_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        params = job["params"]
+        kind = job["kind"]
+        if kind == "generate":
+            return self.backend.run_contextweave_generation(**params)
+        if kind == "outline":
+            return self.backend.generate_contextweave_from_outline(**params)
+        if kind == "export_session":
+            return self.backend.export_session(**params)
+        return self.backend.export_contextweave_code(**params)
+
+    def _finish_job(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        now = time.time()
+        code = (result.get("error") or {}).get("code") if result.get("status") == "error" else None
+        with FileLock(self.lock_path):
+            job.pop("owner", None)
+            job.pop("lease_until", None)
+            if code is None:
+                job["state"] = "done"
+                job["result"] = result
+                job["finished_at"] = now
+                job["last_error"] = None
+                self._apply_result(job, result)
+            elif is_queueable(result.get("error")) and job["attempts"] < self.max_attempts:
+                job["state"] = "pending"
+                job["last_error"] = result.get("error")
+                if code == "PAYMENT_REQUIRED":
+                    state = read_json(self.state_path, {})
+                    state["paused_until"] = now + self.credit_backoff
+                    atomic_write_json(self.state_path, state)
+                    job["not_before"] = now + self.credit_backoff
+                else:
+                    retry_after = (result.get("error") or {}).get("retry_after")
+                    backoff = retry_after or min(self.min_interval * (2 ** job["attempts"]), 900.0)
+                    job["not_before"] = now + backoff
+            else:
+                job["state"] = "failed"
+                job["last_error"] = result.get("error")
+                job["finished_at"] = now
+            self._write_job(job)
+
+    def _apply_result(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Updates the working directory's session file once a generation job completes."""
+        working_dir = job.get("working_dir")
+        if working_dir and job["kind"] in ("generate", "outline") and "session_id" in result:
+            try:
+                result["session_file_path"] = save_last_session_id(working_dir, result["session_id"])
+            except Exception as e:
+                print(f"Warning: Failed to save session ID: {e}", file=sys.stderr)
+
+    # ---- Storage ----
+
+    def _recover_running_jobs(self) -> None:
+        with FileLock(self.lock_path):
+            self._recover_abandoned_jobs(time.time())
+
+    def _recover_abandoned_jobs(self, now: float) -> None:
+        """Puts running jobs whose owner died back to pending. Must hold the queue lock."""
+        for job in self._list_jobs():
+            if job["state"] == "running" and self._is_abandoned(job, now):
+                job["state"] = "pending"
+                job.pop("owner", None)
+                job.pop("lease_until", None)
+                self._write_job(job)
+
+    @staticmethod
+    def _owner() -> Dict[str, Any]:
+        return {"host": socket.gethostname(), "pid": os.getpid()}
+
+    def _is_abandoned(self, job: Dict[str, Any], now: float) -> bool:
+        if job.get("lease_until", 0) < now:
+            return True
+        owner = job.get("owner") or {}
+        if owner.get("host") != socket.gethostname() or os.name != "posix":
+            # Liveness of other hosts' (and, on Windows, other) processes is only known through the lease
+            return False
+        try:
+            os.kill(owner["pid"], 0)
+        except ProcessLookupError:
+            return True
+        except (OSError, KeyError, TypeError):
+            return False
+        return False
+
+    def _heartbeat(self, job: Dict[str, Any], done: threading.Event) -> None:
+        """Renews the lease of a running job until `done` is set."""
+        while not done.wait(self.lease_seconds / 3):
+            try:
+                with FileLock(self.lock_path):
+                    current = read_json(self._job_path(job["job_id"]))
+                    if not current or current.get("state") != "running" or current.get("owner") != job.get("owner"):
+                        return
+                    current["lease_until"] = time.time() + self.lease_seconds
+                    self._write_job(current)
+            except Exception as e:
+                print(f"Warning: Failed to renew lease of queued job {job['job_id']}: {e}", file=sys.stderr)
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _write_job(self, job: Dict[str, Any]) -> None:
+        atomic_write_json(self._job_path(job["job_id"]), job)
+
+    def _list_jobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            # Skip the temp files atomic_write_json leaves behind while writing (or after a crash)
+            if name.endswith(".json") and not name.startswith(".tmp-"):
+                job = read_json(os.path.join(self.jobs_dir, name))
+                if job:
+                    jobs.append(job)
+        return jobs
+
+    @staticmethod
+    def _summary(job: Dict[str, Any]) -> Dict[str, Any]:
+        summary = {
+            "job_id": job["job_id"],
+            "kind": job["kind"],
+            "state": job["state"],
+            "attempts": job["attempts"],
+            "created_at": job["created_at"],
+        }
+        if job["state"] == "pending":
+            summary["not_before"] = job["not_before"]
+        if job.get("last_error"):
+            summary["last_error"] = job["last_error"]
+        if job["state"] == "done":
+            result = job.get("result") or {}
+            for key in ("session_id", "svg_url", "file_path", "session_file_path"):
+                if key in result:
+                    summary[key] = result[key]
+        return summary
@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, Optional
+
+from local_store import atomic_write_text, cwmcp_home
+
+# File extensions for fields whose content type is known.
+SPILL_EXTENSIONS = {
+    "d2_code": ".cw",
+    "svg": ".svg",
+    "svg_content": ".svg",
+    "prompt": ".md",
+}
+
+# Spill files kept; older ones are deleted, like the profiles of profiling.ToolProfiler
+MAX_SPILL_FILES = 200
+
+
+def spill_large_fields(result: Any, threshold_bytes: int, spill_dir: Optional[str] = None,
+                       max_files: int = MAX_SPILL_FILES) -> Any:
+    """
+    Replaces every string field larger than `threshold_bytes` (at any depth)
+    with a reference to a file holding its content:
+    {"spilled_to": <path>, "bytes": <size>}. Files are content-addressed, so
+    spilling the same value twice reuses the same file. Only the `max_files`
+    most recently used files are kept. Error payloads (`status: "error"`)
+    and `error` fields are never spilled, so the message stays readable.
+    """
+    spill_dir = spill_dir or os.path.join(cwmcp_home(), "spill")
+    spilled = False
+
+    def visit(key: Optional[str], value: Any) -> Any:
+        nonlocal spilled
+        if key == "error":
+            return value
+        if isinstance(value, dict):
+            if value.get("status") == "error":
+                return value
+            return {k: visit(k, v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [visit(key, v) for v in value]
+        if isinstance(value, str):
+            data = value.encode("utf-8")
+            if len(data) > threshold_bytes:
+                spilled = True
+                return _spill(key or "field", value, data, spill_dir)
+        return value
+
+    shaped = visit(None, result)
+    if spilled:
+        _prune(spill_dir, max_files)
+    return shaped
+
+
+def _spill(key: str, value: str, data: bytes, spill_dir: str) -> Dict[str, Any]:
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    path = os.path.join(spill_dir, f"{_safe(key)}-{digest}{SPILL_EXTENSIONS.get(key, '.txt')}")
+    if os.path.exists(path):
+        # Reuse counts as use, so pruning keeps the file
+        os.utime(path)
+    else:
+        atomic_write_text(path, value)
+    return {"spilled_to": path, "bytes": len(data)}
+
+
+def _safe(key: str) -> str:
+    # Keys come from backend responses; they must not name a path outside the spill directory
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in key)[:64] or "field"
+
+
+def _prune(spill_dir: str, max_files: int) -> None:
+    try:
+        files = sorted((os.path.join(spill_dir, f) for f in os.listdir(spill_dir) if not f.startswith(".tmp-")),
+                       key=os.path.getmtime)
+    except OSError:
+        return
+    for path in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def dump_result(result: Any, compact: bool = False, spill_threshold_bytes: Optional[int] = None,
+                spill_dir: Optional[str] = None) -> str:
+    """Serializes a tool result, either pretty-printed or compact with large fields spilled to disk."""
+    if not compact:
+        return json.dumps(result, indent=2)
+    if spill_threshold_bytes:
+        result = spill_large_fields(result, spill_threshold_bytes, spill_dir)
+    return json.dumps(result, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,99 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from typing import Optional, Dict, Any
+
+from request_scheduler import request_priority, BATCH
+
+
+class AssetPrefetcher:
+    """
+    Downloads the SVG and the D2 code of a freshly generated session in the
+    background, into the ArtifactStore, so the export call that usually
+    follows completes from the local copy.
+
+    The SVG is served only while the backend still exports the same
+    `svg_url`. The code is served for the revision it was fetched at, after
+    revalidating it when the backend sent an ETag.
+
+    Consumers call `wait_for` before looking in the store, so an export that
+    arrives while a prefetch is still running waits for it instead of
+    fetching twice, and `record` their hits and misses for `stats`.
+    """
+
+    def __init__(self, backend, store, max_workers: int = 2, wait_timeout: float = 30.0):
+        self.backend = backend
+        self.store = store
+        self.wait_timeout = wait_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cwmcp-prefetch")
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "completed": 0, "failed": 0, "bytes": 0, "hits": 0, "misses": 0}
+
+    def schedule(self, result: Dict[str, Any], revision: str) -> None:
+        session_id = result.get("session_id")
+        if result.get("status") != "ok" or not session_id:
+            return
+        future = self._executor.submit(self._run, session_id, revision, result.get("svg_url"))
+        with self._lock:
+            self._inflight[session_id] = future
+            self._stats["scheduled"] += 1
+        future.add_done_callback(lambda f: self._done(session_id, f))
+
+    def wait_for(self, session_id: str) -> None:
+        with self._lock:
+            future = self._inflight.get(session_id)
+        if future is not None:
+            wait_futures([future], timeout=self.wait_timeout)
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            self._stats["hits" if hit else "misses"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._inflight)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
+
+    def _run(self, session_id: str, revision: str, svg_url: Optional[str]) -> None:
+        try:
+            self._prefetch(session_id, revision, svg_url)
+        except Exception as e:
+            with self._lock:
+                self._stats["failed"] += 1
+            print(f"Warning: Prefetch for session {session_id} failed: {e}", file=sys.stderr)
+            return
+        with self._lock:
+            self._stats["completed"] += 1
+
+    def _prefetch(self, session_id: str, revision: str, svg_url: Optional[str]) -> None:
+        with request_priority(BATCH):
+            if svg_url:
+                resp = self.backend._get(svg_url)
+                resp.raise_for_status()
+                self.store.put(session_id, "svg", resp.content, meta={"svg_url": svg_url}, revision=revision)
+                self._add_bytes(len(resp.content))
+            resp = self.backend._post("/session/export", json={"session_id": session_id})
+            resp.raise_for_status()
+            data = resp.json()
+            if data.get("status") == "error":
+                raise RuntimeError((data.get("error") or {}).get("message", "Failed to fetch session code"))
+            if data.get("d2_code") is not None:
+                # An ETag, when the backend sends one, lets the export revalidate this copy
+                etag = (resp.headers or {}).get("ETag")
+                meta = {"prefetched": True, "etag": etag} if etag else {"prefetched": True}
+                code = data["d2_code"].encode("utf-8")
+                self.store.put(session_id, "cw", code, meta=meta, revision=revision)
+                self._add_bytes(len(code))
+
+    def _add_bytes(self, count: int) -> None:
+        with self._lock:
+            self._stats["bytes"] += count
+
+    def _done(self, session_id: str, future) -> None:
+        with self._lock:
+            if self._inflight.get(session_id) is future:
+                del self._inflight[session_id]
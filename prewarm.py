@@ -0,0 +1,124 @@
+import sys
+import time
+import threading
+from typing import Dict, Any
+
+from request_scheduler import request_priority, BATCH
+
+
+class Prewarmer:
+    """
+    Runs once in the background at startup, so the first tool call does not
+    pay for connection setup or static data:
+
+    1. Two BATCH-priority requests to `probe_path` over the pooled client.
+       The first pays DNS, TCP and TLS; the second shows what a warm request
+       costs. The difference is the connection time saved. With several
+       endpoints, every endpoint is probed. A failed probe is recorded as
+       `probe_error` and does not stop the next step.
+    2. The API key is checked with an authenticated request to
+       `key_check_path` (a session lookup that never bills). A 401/403
+       marks the key invalid.
+    3. With Plan Mode enabled, `/outline/prompt` is fetched into the
+       client-side prompt cache, so the first `get_outline_prompt` returns
+       at once.
+    """
+
+    def __init__(self, backend, probe_path: str = "/health", key_check_path: str = "/session/export",
+                 fetch_outline_prompt: bool = True):
+        self.backend = backend
+        self.probe_path = probe_path
+        self.key_check_path = key_check_path
+        self.fetch_outline_prompt = fetch_outline_prompt
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats: Dict[str, Any] = {"state": "idle"}
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="cwmcp-prewarm", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: float = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        started = time.monotonic()
+        self._update(state="running")
+        try:
+            self._warm_connection()
+        except Exception as e:
+            self._update(probe_error=str(e))
+            print(f"Warning: Prewarm probe of {self.probe_path} failed: {e}", file=sys.stderr)
+        try:
+            self._check_key()
+            if self.fetch_outline_prompt:
+                self._fetch_outline_prompt()
+            self._update(state="done")
+        except Exception as e:
+            self._update(state="failed", error=str(e))
+            print(f"Warning: Prewarm failed: {e}", file=sys.stderr)
+        finally:
+            self._update(total_ms=self._ms(started))
+
+    def _warm_connection(self) -> None:
+        with request_priority(BATCH):
+            started = time.monotonic()
+            self.backend._get(self.probe_path, timeout=10.0)
+            cold_ms = self._ms(started)
+            started = time.monotonic()
+            resp = self.backend._get(self.probe_path, timeout=10.0)
+            warm_ms = self._ms(started)
+        self._update(cold_request_ms=cold_ms, warm_request_ms=warm_ms,
+                     connection_savings_ms=round(max(cold_ms - warm_ms, 0.0), 1))
+        if resp.status_code >= 400:
+            # The connection is warm either way; the path just does not exist on this backend
+            self._update(probe_error=f"{self.probe_path} returned {resp.status_code}")
+        if getattr(self.backend, "router", None) is not None:
+            self.backend.router.probe_all()
+
+    def _check_key(self) -> None:
+        if not self.backend.api_key:
+            self._update(api_key="missing")
+            return
+        with request_priority(BATCH):
+            # An unknown session id: a valid key gets 404/422, a rejected one 401/403
+            resp = self.backend._post(self.key_check_path, json={"session_id": "cwmcp-prewarm-key-check"},
+                                      headers=self.backend._get_headers())
+        if resp.status_code in (401, 403):
+            self._update(api_key="invalid")
+            print("Warning: The backend rejected the configured API key", file=sys.stderr)
+        elif resp.status_code < 500:
+            self._update(api_key="valid")
+        else:
+            self._update(api_key="unknown", key_check_status=resp.status_code)
+
+    def _fetch_outline_prompt(self) -> None:
+        started = time.monotonic()
+        with request_priority(BATCH):
+            resp = self.backend._get("/outline/prompt", headers=self.backend._get_headers())
+        if resp.status_code < 300:
+            self.backend.outline_prompt_cache = (time.monotonic(), resp.json())
+            self._update(outline_prompt_ms=self._ms(started))
+        else:
+            self._update(outline_prompt_status=resp.status_code)
+
+    def _update(self, **values) -> None:
+        with self._lock:
+            self._stats.update(values)
+
+    @staticmethod
+    def _ms(started: float) -> float:
+        return round((time.monotonic() - started) * 1000.0, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        hits = getattr(self.backend, "outline_prompt_cache_hits", 0)
+        stats["outline_prompt_cache_hits"] = hits
+        # What the first call would have paid without prewarming
+        stats["estimated_first_call_savings_ms"] = round(
+            stats.get("connection_savings_ms", 0.0) + (stats.get("outline_prompt_ms", 0.0) if hits else 0.0), 1)
+        return stats
@@ -0,0 +1,123 @@
+import os
+import re
+import sys
+import time
+import uuid
+import cProfile
+import functools
+import itertools
+import threading
+import tracemalloc
+import contextvars
+from collections import deque
+from typing import Optional, Dict, Any, List
+
+from local_store import atomic_write_text, cwmcp_home
+
+# X-Request-ID of the tool call running in this context, sent with every backend request it makes
+_request_id = contextvars.ContextVar("cwmcp_request_id", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+class ToolProfiler:
+    """
+    Times every tool call and profiles every `sample_every`-th one with
+    cProfile and tracemalloc. Profiles go to `profile_dir`:
+
+    - `<tool>-<request_id>.prof` holds the cProfile stats (`python -m pstats`,
+      snakeviz);
+    - `<tool>-<request_id>.mem.txt` lists the top allocations made during
+      the call.
+
+    Only one call is profiled at a time. A sampled call that overlaps
+    another profiled call is only timed. The most recent `history` calls
+    are kept for `slowest`.
+    """
+
+    def __init__(self, profile_dir: Optional[str] = None, sample_every: int = 1, history: int = 500,
+                 max_profiles: int = 200, memory_top: int = 25):
+        self.profile_dir = profile_dir or os.path.join(cwmcp_home(), "profiles")
+        self.sample_every = max(1, int(sample_every))
+        self.max_profiles = max_profiles
+        self.memory_top = memory_top
+        self._counter = itertools.count(1)
+        self._calls = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+
+    def wrap(self, func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            request_id = uuid.uuid4().hex
+            token = _request_id.set(request_id)
+            sampled = next(self._counter) % self.sample_every == 0
+            profiling = sampled and self._profiling.acquire(blocking=False)
+            record = {"tool": name, "request_id": request_id, "started_at": time.time(), "profiled": profiling}
+            profile, snapshot, started_tracing = None, None, False
+            if profiling:
+                started_tracing = not tracemalloc.is_tracing()
+                if started_tracing:
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+                snapshot = tracemalloc.take_snapshot()
+                profile = cProfile.Profile()
+                profile.enable()
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                record["duration_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+                if profiling:
+                    profile.disable()
+                    try:
+                        record.update(self._write_profile(name, request_id, profile, snapshot))
+                    except Exception as e:
+                        print(f"Warning: Failed to write profile for {name}: {e}", file=sys.stderr)
+                    finally:
+                        if started_tracing:
+                            tracemalloc.stop()
+                        self._profiling.release()
+                with self._lock:
+                    self._calls.append(record)
+                _request_id.reset(token)
+
+        return wrapper
+
+    def _write_profile(self, name: str, request_id: str, profile, before) -> Dict[str, Any]:
+        peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}-{request_id}")
+        profile.dump_stats(f"{base}.prof")
+        lines = [f"# {name} {request_id}: peak traced memory {peak / 1024:.1f} KiB", ""]
+        for stat in after.compare_to(before, "lineno")[:self.memory_top]:
+            lines.append(str(stat))
+        atomic_write_text(f"{base}.mem.txt", "\n".join(lines) + "\n")
+        self._prune()
+        return {"profile_path": f"{base}.prof", "memory_path": f"{base}.mem.txt",
+                "memory_peak_kb": round(peak / 1024, 1)}
+
+    def _prune(self) -> None:
+        profiles = sorted(
+            (os.path.join(self.profile_dir, f) for f in os.listdir(self.profile_dir) if f.endswith(".prof")),
+            key=os.path.getmtime,
+        )
+        for path in profiles[:max(0, len(profiles) - self.max_profiles)]:
+            for stale in (path, path[:-len(".prof")] + ".mem.txt"):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    def slowest(self, limit: int = 10, tool: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            calls = [dict(c) for c in self._calls if tool is None or c["tool"] == tool]
+        return sorted(calls, key=lambda c: c["duration_ms"], reverse=True)[:limit]
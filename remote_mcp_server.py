@@ -2,16 +2,97 @@ import os
 import json
 import httpx
 import sys
+import time
+import threading
 from typing import Optional, Dict, Any, List
 
+from request_scheduler import parse_retry_after
+from endpoint_router import EndpointRouter
+from shared_cache import request_key
+from profiling import current_request_id
+from local_store import cwmcp_home
+from json_stream import StreamingFieldDecoder
+
+EXPORT_FORMATS = ("svg", "pptx")
+OUTLINE_PROMPT_TTL = 3600.0 # The outline prompt template only changes with backend deployments
+DEFAULT_EXPORT_FORMATS = ["svg"]
+
+def parse_export_formats(value) -> List[str]:
+    """
+    Normalizes an export format selection: a list, or a comma-separated string
+    such as "svg", "svg,pptx" or "none" (no rendering, for fast draft iterations).
+    Raises ValueError for unknown formats.
+    """
+    if value is None:
+        return list(DEFAULT_EXPORT_FORMATS)
+    items = value.split(",") if isinstance(value, str) else list(value)
+    formats = []
+    for item in items:
+        name = str(item).strip().lower()
+        if not name or name == "none":
+            continue
+        if name not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format '{name}'. Use {', '.join(EXPORT_FORMATS)} or 'none'.")
+        if name not in formats:
+            formats.append(name)
+    return formats
+
+def api_error(e: Exception) -> Dict[str, Any]:
+    """
+    Wraps a failed backend call as an API_ERROR. Transient failures
+    (connection errors, timeouts, 5xx and 429 responses) are marked
+    `retryable`; other 4xx responses and malformed bodies are not, so they
+    are never queued for another attempt.
+    """
+    error = {"code": "API_ERROR", "message": str(e)}
+    if isinstance(e, httpx.TransportError) or (
+            isinstance(e, httpx.HTTPStatusError) and (e.response.status_code >= 500 or e.response.status_code == 429)):
+        error["retryable"] = True
+    return {"status": "error", "error": error}
+
+def parse_input_content(content: str):
+    """
+    Splits an input file into its '# Request' text and the optional '# D2'
+    code block. Returns (request_text, d2_text).
+    """
+    req_text = ""
+    d2_text = ""
+    
+    if "# D2" in content:
+        parts = content.split("# D2")
+        req_part = parts[0]
+        d2_part = parts[1]
+        if "```d2" in d2_part:
+            try:
+                d2_text = d2_part.split("```d2")[1].split("```")[0].strip()
+            except IndexError:
+                 d2_text = d2_part.strip()
+        else:
+            d2_text = d2_part.strip()
+    else:
+        req_part = content
+    
+    if "# Request" in req_part:
+        try:
+            req_text = req_part.split("# Request")[1].strip()
+        except IndexError:
+            req_text = req_part.strip()
+    else:
+        req_text = req_part.strip()
+    
+    return req_text, d2_text
+
 class RemoteMCPServer:
     """
     A client-side proxy that communicates with the remote Interleaved Thinking server.
     Handles local file I/O and forwards requests to the backend API.
     """
     
-    def __init__(self, base_url: str = "http://localhost:8000"):
-        self.base_url = base_url.rstrip("/")
+    def __init__(self, base_url: str = "http://localhost:8000", probe_interval: float = 30.0):
+        # Several regional endpoints may be given as a comma-separated list;
+        # the first one is the primary.
+        urls = [u.strip().rstrip("/") for u in base_url.split(",") if u.strip()]
+        self.base_url = urls[0]
         
         # Determine timeout priority:
         # 1. Environment Variable INTERLEAVED_THINKING_TIMEOUT
@@ -64,9 +145,31 @@ class RemoteMCPServer:
         # Load API Key
         self.api_key = self._load_api_key()
         self.editor_protocol = None # Will be set by main.py loading config
+        self.scheduler = None # Optional RequestScheduler, set by main.py loading config
+        self.exclude_fields = [] # Response fields the backend should not send back
+        self.chunked_generator = None # Optional ChunkedGenerator for very large input files
+        self.artifact_store = None # Optional ArtifactStore caching exports per session revision
+        self.prefetcher = None # Optional AssetPrefetcher filling the artifact store after generations
+        self.input_minimizer = None # Optional InputMinimizer applied to request text before upload
+        self.shared_cache = None # Optional SharedCache shared with the Node skill client
+        self.revision_history = None # Optional RevisionHistory keeping each session's D2 code locally
+        self.outline_prompt_cache = None # (fetched_at, prompt), filled by get_outline_prompt or the startup prewarm
+        self.outline_prompt_cache_hits = 0
 
         self.client = httpx.Client(base_url=self.base_url, timeout=timeout_val) 
 
+        # Latency-aware routing with failover, only when more than one endpoint is configured
+        self.router = None
+        self._route = threading.local()
+        if len(urls) > 1:
+            clients = {self.base_url: self.client}
+            self.router = EndpointRouter(
+                urls,
+                lambda url: clients.get(url) or httpx.Client(base_url=url, timeout=timeout_val),
+                probe_interval=probe_interval,
+                affinity_path=os.path.join(cwmcp_home(), "shared", "session_endpoints.json"),
+            )
+
     def _load_api_key(self) -> Optional[str]:
         """Loads API Key from env or config file."""
         key = os.environ.get("CONTEXTWEAVE_MCP_API_KEY") or os.environ.get("MCP_API_KEY")
@@ -102,6 +205,7 @@ class RemoteMCPServer:
         if self.api_key:
             headers["X-API-Key"] = self.api_key
         
+        request_id = request_id or current_request_id()
         if request_id:
             headers["X-Request-ID"] = request_id
         elif "uuid" not in globals():
@@ -110,19 +214,163 @@ class RemoteMCPServer:
         
         return headers
 
+    def _post(self, path: str, **kwargs) -> httpx.Response:
+        """POSTs to the backend, going through the request scheduler when one is configured."""
+        if self.scheduler is None:
+            return self._send("post", path, **kwargs)
+        return self.scheduler.call(lambda: self._send("post", path, **kwargs))
+
+    def _post_stream(self, path: str, **kwargs) -> httpx.Response:
+        """Like `_post`, but the body is left unread; the caller must close the response."""
+        if self.scheduler is None:
+            return self._send("post", path, stream=True, **kwargs)
+        return self.scheduler.call(lambda: self._send("post", path, stream=True, **kwargs))
+
+    def _send(self, method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """
+        Sends a request to the best endpoint. Requests for a known session go to
+        the endpoint that owns it. A request that could not reach an endpoint
+        at all is retried on the next one; anything that reached a server is
+        never resent, so generations are not run twice.
+        """
+        if self.router is None:
+            return self._dispatch(self.client, method, path, stream, kwargs)
+        payload = kwargs.get("json")
+        session_id = payload.get("session_id") if isinstance(payload, dict) else None
+        last_error = None
+        for endpoint in self.router.candidates(session_id):
+            try:
+                resp = self._dispatch(endpoint.client, method, path, stream, kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                self.router.record(endpoint, None, ok=False)
+                last_error = e
+                continue
+            # Latency comes from the health probes only; a request's duration depends on its work
+            self.router.record(endpoint, None, ok=resp.status_code < 500)
+            self._route.endpoint = endpoint
+            # Only an endpoint that served the session successfully takes it over;
+            # a 404 from a node that does not know the session must not rebind it
+            if session_id and 200 <= resp.status_code < 300:
+                self.router.bind(session_id, endpoint)
+            return resp
+        raise last_error
+
+    @staticmethod
+    def _etag(resp) -> Optional[str]:
+        return (getattr(resp, "headers", None) or {}).get("ETag")
+
+    @staticmethod
+    def _dispatch(client: httpx.Client, method: str, path: str, stream: bool, kwargs) -> httpx.Response:
+        # Every request made during a tool call carries that call's ID, so profiles can be matched to backend logs
+        request_id = current_request_id()
+        if request_id:
+            headers = dict(kwargs.get("headers") or {})
+            headers.setdefault("X-Request-ID", request_id)
+            kwargs = dict(kwargs, headers=headers)
+        if stream:
+            return client.send(client.build_request(method.upper(), path, **kwargs), stream=True)
+        return getattr(client, method)(path, **kwargs)
+
+    def _bind_session(self, result: Dict[str, Any]) -> None:
+        """Pins a newly returned session to the endpoint that served it."""
+        endpoint = getattr(self._route, "endpoint", None)
+        if self.router is not None and endpoint is not None and result.get("session_id"):
+            self.router.bind(result["session_id"], endpoint)
+
+    def _project(self, payload: Dict[str, Any], exclude: tuple = ()) -> Dict[str, Any]:
+        """Asks the backend to omit response fields the client does not need."""
+        fields = sorted(set(self.exclude_fields) | set(exclude))
+        if fields:
+            payload["exclude_fields"] = fields
+        return payload
+
+    def _record_revision(self, result: Dict[str, Any], prefetch: bool = False,
+                         d2_code: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Marks a session as changed so artifacts cached for its previous revision
+        are no longer served, optionally starts prefetching the new assets, and
+        appends the new code to the local revision history.
+        """
+        self._bind_session(result)
+        if self.revision_history is not None:
+            try:
+                self.revision_history.schedule(result, d2_code)
+            except Exception as e:
+                print(f"Warning: Failed to record revision history: {e}", file=sys.stderr)
+        if self.artifact_store is not None and result.get("status") == "ok" and result.get("session_id"):
+            import hashlib
+            revision = str(result.get("run_id") or result.get("revision") or hashlib.sha256(
+                json.dumps(result, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16])
+            try:
+                self.artifact_store.set_revision(result["session_id"], revision)
+            except Exception as e:
+                print(f"Warning: Failed to record session revision: {e}", file=sys.stderr)
+                return result
+            if prefetch and self.prefetcher is not None:
+                self.prefetcher.schedule(result, revision)
+        return result
+
+    def _shared_key(self, session_id, input_sequence, mode, formats, source_kind, text) -> Optional[str]:
+        """Only new generations from a plain request are shared; edits depend on server-side state."""
+        if self.shared_cache is None or session_id or input_sequence or not text:
+            return None
+        return request_key(mode, "svg" in formats, "pptx" in formats, source_kind, text)
+
+    def _shared_lookup(self, cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Returns the cached result, or None; a cache that cannot be read (lock timeout, corrupt file) is a miss."""
+        if cache_key is None:
+            return None
+        try:
+            entry = self.shared_cache.get_result(cache_key)
+        except Exception as e:
+            print(f"Warning: Failed to read shared cache: {e}", file=sys.stderr)
+            return None
+        if entry is None:
+            return None
+        return dict(entry["result"], cached=True, cached_by=entry.get("client"))
+
+    def _shared_store(self, cache_key: Optional[str], result: Dict[str, Any],
+                      session_id: Optional[str], input_file: Optional[str]) -> None:
+        if self.shared_cache is None or result.get("status") != "ok" or not result.get("session_id"):
+            return
+        try:
+            if cache_key:
+                self.shared_cache.put_result(cache_key, result)
+            self.shared_cache.record_session(result["session_id"], input_file=input_file,
+                                             request_key=cache_key, edited=bool(session_id))
+        except Exception as e:
+            print(f"Warning: Failed to update shared cache: {e}", file=sys.stderr)
+
+    def _minimize(self, text: Optional[str]):
+        """Runs the configured input minimizer. Returns (text, stats); stats is None when nothing ran."""
+        if self.input_minimizer is None or not text:
+            return text, None
+        return self.input_minimizer.minimize(text)
+
+    def _get(self, path: str, **kwargs) -> httpx.Response:
+        if self.scheduler is None:
+            return self._send("get", path, **kwargs)
+        return self.scheduler.call(lambda: self._send("get", path, **kwargs))
+
     def run_contextweave_generation(self, 
                           input_file: Optional[str] = None, 
                           user_request: Optional[str] = None,
                           session_id: Optional[str] = None,
                           mode: str = "3", 
-                          input_sequence: Optional[list] = None) -> Dict[str, Any]:
+                          input_sequence: Optional[list] = None,
+                          export_formats: Optional[List[str]] = None) -> Dict[str, Any]:
         
+        try:
+            formats = parse_export_formats(export_formats)
+        except ValueError as e:
+            return {"status": "error", "error": {"code": "INVALID_FORMAT", "message": str(e)}}
+
         # Prepare payload
         payload = {
             "mode": mode,
             "input_sequence": input_sequence,
-            "export_svg": True,
-            "export_pptx": False,
+            "export_svg": "svg" in formats,
+            "export_pptx": "pptx" in formats,
             "session_id": session_id
         }
 
@@ -137,74 +385,184 @@ class RemoteMCPServer:
                 
                 with open(input_file, "r", encoding="utf-8") as f:
                     content = f.read()
-                
-                req_text = ""
-                d2_text = ""
-                
-                if "# D2" in content:
-                    parts = content.split("# D2")
-                    req_part = parts[0]
-                    d2_part = parts[1]
-                    if "```d2" in d2_part:
-                        try:
-                            d2_text = d2_part.split("```d2")[1].split("```")[0].strip()
-                        except IndexError:
-                             d2_text = d2_part.strip()
-                    else:
-                        d2_text = d2_part.strip()
-                else:
-                    req_part = content
-                
-                if "# Request" in req_part:
-                    try:
-                        req_text = req_part.split("# Request")[1].strip()
-                    except IndexError:
-                        req_text = req_part.strip()
-                else:
-                    req_text = req_part.strip()
-                
-                payload["user_request"] = req_text
-                payload["initial_d2_code"] = d2_text
-                payload["test_file"] = None
-                
+
+                req_text, d2_text = parse_input_content(content)
             except Exception as e:
                 return {"status": "error", "error": {"code": "READ_ERROR", "message": f"Failed to read input file: {e}"}}
+
+            cache_key = self._shared_key(session_id, input_sequence, mode, formats, "input_file", content)
+            cached = self._shared_lookup(cache_key)
+            if cached is not None:
+                return cached
+
+            req_text, input_stats = self._minimize(req_text)
+            payload["user_request"] = req_text
+            payload["initial_d2_code"] = d2_text
+            payload["test_file"] = None
+
+            # Very large new requests are generated chunk by chunk and merged
+            if (self.chunked_generator is not None and not session_id
+                    and self.chunked_generator.should_chunk(req_text)):
+                return self.chunked_generator.generate(
+                    req_text, base_d2=d2_text, source_name=input_file, mode=mode, export_formats=formats
+                )
         else:
+            cache_key = self._shared_key(session_id, input_sequence, mode, formats, "user_request", user_request)
+            cached = self._shared_lookup(cache_key)
+            if cached is not None:
+                return cached
+            user_request, input_stats = self._minimize(user_request)
             payload["user_request"] = user_request
             payload["test_file"] = None
 
         # Call API
+        result = self._post_run(payload)
+        if result.get("status") == "error":
+            return result
+        try:
+            result = self._record_revision(result, prefetch=True)
+            self._shared_store(cache_key, result, session_id, input_file)
+            if input_stats and isinstance(result, dict):
+                result["input_stats"] = input_stats
+            return result
+        except Exception as e:
+            return api_error(e)
+
+    def generate_chunk(self, user_request: str, mode: str = "3") -> Dict[str, Any]:
+        """
+        Generates one chunk of a chunked request. Only the raw /run call is made:
+        the throwaway chunk session is not cached, recorded, prefetched or
+        minimized again.
+        """
+        payload = {
+            "mode": mode,
+            "input_sequence": None,
+            "export_svg": False,
+            "export_pptx": False,
+            "session_id": None,
+            "user_request": user_request,
+            "test_file": None,
+        }
+        if self.editor_protocol:
+            payload["editor_protocol"] = self.editor_protocol
+        return self._post_run(payload)
+
+    def _post_run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Posts a prepared payload to /run and maps billing, auth and rate-limit replies to error codes."""
         try:
             # Generate Request ID for this specific call
             import uuid
-            req_id = str(uuid.uuid4())
+            req_id = current_request_id() or str(uuid.uuid4())
             headers = self._get_headers(req_id)
             
-            resp = self.client.post("/run", json=payload, headers=headers)
+            resp = self._post("/run", json=self._project(payload), headers=headers)
             
             if resp.status_code == 403:
                  return {"status": "error", "error": {"code": "AUTH_ERROR", "message": "Invalid API Key or Missing Key"}}
             if resp.status_code == 402:
                  return {"status": "error", "error": {"code": "PAYMENT_REQUIRED", "message": "Insufficient credits"}}
+            if resp.status_code == 429:
+                 return {"status": "error", "error": {"code": "RATE_LIMITED", "message": "Too many requests",
+                                                      "retry_after": parse_retry_after(resp.headers.get("Retry-After"))}}
 
             resp.raise_for_status()
             return resp.json()
         except Exception as e:
-            return {"status": "error", "error": {"code": "API_ERROR", "message": str(e)}}
+            return api_error(e)
 
     def export_session(self, session_id: str, format: str) -> Dict[str, Any]:
+        """
+        Exports a session to one format, or to several at once when `format` is a
+        comma-separated list (e.g. "svg,pptx"); those requests run in parallel.
+        """
         try:
-            resp = self.client.post("/export-session", json={"session_id": session_id, "format": format})
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            return {"status": "error", "error": {"code": "API_ERROR", "message": str(e)}}
+            formats = parse_export_formats(format)
+        except ValueError as e:
+            return {"status": "error", "error": {"code": "INVALID_FORMAT", "message": str(e)}}
+        if not formats:
+            return {"status": "error", "error": {"code": "INVALID_FORMAT", "message": "At least one export format is required."}}
+        if len(formats) == 1:
+            return self._export_session_format(session_id, formats[0])
+
+        import contextvars
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(formats)) as pool:
+            # Each export runs in a copy of the caller's context (request ID, priority)
+            futures = [pool.submit(contextvars.copy_context().run, self._export_session_format, session_id, f)
+                       for f in formats]
+            results = dict(zip(formats, (f.result() for f in futures)))
+        failed = [f for f, r in results.items() if r.get("status") == "error"]
+        combined = {"status": "error" if failed else "ok", "session_id": session_id, "exports": results}
+        if failed:
+            first_error = results[failed[0]].get("error") or {}
+            combined["error"] = {
+                "code": first_error.get("code", "API_ERROR"),
+                "message": f"Export failed for: {', '.join(failed)}",
+                "failed_formats": failed,
+            }
+        return combined
+
+    def _export_session_format(self, session_id: str, format: str) -> Dict[str, Any]:
+        kind = f"export:{format}"
+        cached = None
+        if self.artifact_store is not None:
+            if format == "svg" and self.prefetcher is not None:
+                self.prefetcher.wait_for(session_id)
+            cached = self.artifact_store.get(session_id, kind)
+        etag = cached["meta"].get("etag") if cached else None
+        result = None
+        if cached and not etag:
+            # The export of a revision never changes, so it is served without asking the backend
+            result = self._read_cached_json(cached)
+        if result is None:
+            request = {"json": {"session_id": session_id, "format": format}}
+            if etag:
+                # The backend sends ETags for this export, so the cached copy is revalidated
+                request["headers"] = {"If-None-Match": etag}
+            try:
+                resp = self._post("/export-session", **request)
+                if etag and resp.status_code == 304:
+                    result = self._read_cached_json(cached)
+                if result is None:
+                    resp.raise_for_status()
+                    result = resp.json()
+                    if self.artifact_store is not None and result.get("status") != "error":
+                        etag = self._etag(resp)
+                        try:
+                            self.artifact_store.put_json(session_id, kind, result, meta={"etag": etag} if etag else None)
+                        except Exception as e:
+                            print(f"Warning: Failed to cache export: {e}", file=sys.stderr)
+            except Exception as e:
+                return api_error(e)
+
+        # A prefetched SVG is served only if it is the one the backend currently exports
+        if format == "svg" and self.artifact_store is not None and result.get("status") != "error":
+            prefetched = self.artifact_store.get(session_id, "svg")
+            hit = prefetched is not None and prefetched["meta"].get("svg_url") == result.get("svg_url")
+            if self.prefetcher is not None:
+                self.prefetcher.record(hit=hit)
+            if hit:
+                result = dict(result, local_path=prefetched["path"], cached=True)
+        return result
+
+    def _read_cached_json(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            return dict(json.loads(self.artifact_store.read_bytes(entry).decode("utf-8")), cached=True)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Failed to read cached export: {e}", file=sys.stderr)
+            return None
 
     def get_outline_prompt(self, user_request: str = "") -> str:
+        cached = self.outline_prompt_cache
+        if cached is not None and time.monotonic() - cached[0] < OUTLINE_PROMPT_TTL:
+            self.outline_prompt_cache_hits += 1
+            return cached[1]
         try:
-            resp = self.client.get("/outline/prompt")
+            resp = self._get("/outline/prompt")
             resp.raise_for_status()
-            return resp.json() # Returns string
+            prompt = resp.json() # Returns string
+            self.outline_prompt_cache = (time.monotonic(), prompt)
+            return prompt
         except Exception as e:
             return f"Error fetching prompt: {e}"
 
@@ -246,11 +604,11 @@ class RemoteMCPServer:
             payload = {"outline_json": outline_json, "user_request": user_request}
             if self.editor_protocol:
                 payload["editor_protocol"] = self.editor_protocol
-            resp = self.client.post("/outline/generate", json=payload)
+            resp = self._post("/outline/generate", json=self._project(payload))
             resp.raise_for_status()
-            result = resp.json()
+            result = self._record_revision(resp.json(), prefetch=True)
         except Exception as e:
-            return {"status": "error", "error": {"code": "API_ERROR", "message": str(e)}}
+            return api_error(e)
 
         # 4. Append Result to Local File
         if result.get("status") == "ok":
@@ -269,7 +627,7 @@ class RemoteMCPServer:
 
         return result
 
-    def import_contextweave_code(self, path: str = "ContextWeave") -> Dict[str, Any]:
+    def import_contextweave_code(self, path: str = "ContextWeave", include_code: bool = False) -> Dict[str, Any]:
         # 1. Local File Discovery
         if not os.path.isabs(path):
             path = os.path.abspath(path)
@@ -299,25 +657,87 @@ class RemoteMCPServer:
             return {"status": "error", "error": {"code": "READ_ERROR", "message": str(e)}}
             
         # 2. Call API to Import
+        return self.import_d2_code(content, source_name=cw_file, include_code=include_code)
+
+    def import_d2_code(self, d2_code: str, source_name: str, include_code: bool = False) -> Dict[str, Any]:
+        """Creates a new session from D2 code via /session/import."""
         try:
-            payload = {"d2_code": content, "source_name": cw_file}
-            resp = self.client.post("/session/import", json=payload)
+            payload = {"d2_code": d2_code, "source_name": source_name}
+            # The caller already has the code, so it is not sent back unless asked for
+            exclude = () if include_code else ("d2_code",)
+            resp = self._post("/session/import", json=self._project(payload, exclude))
             resp.raise_for_status()
-            return resp.json()
+            return self._record_revision(resp.json(), d2_code=d2_code)
         except Exception as e:
-            return {"status": "error", "error": {"code": "API_ERROR", "message": str(e)}}
+            return api_error(e)
 
-    def export_contextweave_code(self, session_id: str, path: str = "ContextWeave") -> Dict[str, Any]:
-        # 1. Call API to get code
+    def get_session_code(self, session_id: str) -> Dict[str, Any]:
+        """Fetches a session's current D2 code via /session/export."""
         try:
-            resp = self.client.post("/session/export", json={"session_id": session_id})
+            resp = self._post("/session/export", json={"session_id": session_id})
             resp.raise_for_status()
-            data = resp.json()
-            d2_code = data.get("d2_code")
+            return resp.json()
         except Exception as e:
-            return {"status": "error", "error": {"code": "API_ERROR", "message": str(e)}}
-            
-        # 2. Write to Local File
+            return api_error(e)
+
+    def _stream_session_code(self, session_id: str, target_file: str,
+                             etag: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Streams a session's D2 code from /session/export into `target_file`.
+        The d2_code field is decoded as it arrives and written to a temporary
+        file that replaces the target only once the response is complete, so
+        memory use does not grow with the diagram and a failed download never
+        leaves a partial file.
+
+        Returns {"status": "ok", "etag": ...}, an error dict, or
+        {"status": "not_modified"} when the backend confirms that `etag` is
+        still current (the target is then left untouched).
+        """
+        tmp_file = f"{target_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        request = {"json": {"session_id": session_id}}
+        if etag:
+            request["headers"] = {"If-None-Match": etag}
+        try:
+            try:
+                resp = self._post_stream("/session/export", **request)
+            except Exception as e:
+                return api_error(e)
+            try:
+                if etag and resp.status_code == 304:
+                    return {"status": "not_modified"}
+                if resp.status_code >= 400:
+                    resp.read()
+                    resp.raise_for_status()
+                # newline="" keeps the code byte-for-byte as the backend returned it
+                with open(tmp_file, "w", encoding="utf-8", newline="") as f:
+                    decoder = StreamingFieldDecoder("d2_code", f.write)
+                    for chunk in resp.iter_bytes():
+                        decoder.feed(chunk)
+                    fields = decoder.close()
+            except OSError as e:
+                return {"status": "error", "error": {"code": "WRITE_ERROR", "message": str(e)}}
+            except Exception as e:
+                return api_error(e)
+            finally:
+                resp.close()
+            if fields.get("status") == "error":
+                return {"status": "error", "error": fields.get("error") or {"code": "API_ERROR", "message": "Export failed"}}
+            if not decoder.found:
+                return {"status": "error", "error": {"code": "MISSING_D2_CODE", "message": "The export response contained no D2 code"}}
+            try:
+                os.replace(tmp_file, target_file)
+            except OSError as e:
+                return {"status": "error", "error": {"code": "WRITE_ERROR", "message": str(e)}}
+            return {"status": "ok", "etag": self._etag(resp)}
+        finally:
+            if os.path.exists(tmp_file):
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
+
+    def export_contextweave_code(self, session_id: str, path: str = "ContextWeave") -> Dict[str, Any]:
+        # 1. Prepare the target directory
         if not os.path.isabs(path):
             path = os.path.abspath(path)
             
@@ -328,14 +748,45 @@ class RemoteMCPServer:
                 return {"status": "error", "error": {"code": "CREATE_DIR_ERROR", "message": str(e)}}
                 
         target_file = os.path.join(path, "diagram.cw")
-        
-        try:
-            with open(target_file, "w", encoding="utf-8") as f:
-                f.write(d2_code)
-        except Exception as e:
-            return {"status": "error", "error": {"code": "WRITE_ERROR", "message": str(e)}}
+
+        # 2. Copy the cached code of this revision, or stream it from the API
+        if self.prefetcher is not None:
+            self.prefetcher.wait_for(session_id)
+        cached = self.artifact_store.get(session_id, "cw") if self.artifact_store is not None else None
+        etag = cached["meta"].get("etag") if cached else None
+        served_from_cache = False
+        if cached and not etag:
+            # The code of a revision never changes, so it is served without asking the backend
+            try:
+                self.artifact_store.copy_to(cached, target_file)
+                served_from_cache = True
+            except OSError as e:
+                print(f"Warning: Failed to copy cached code: {e}", file=sys.stderr)
+        if not served_from_cache:
+            # The backend sends ETags for this export, so a cached copy is revalidated
+            streamed = self._stream_session_code(session_id, target_file, etag=etag)
+            if streamed["status"] == "error":
+                return streamed
+            if streamed["status"] == "not_modified":
+                try:
+                    self.artifact_store.copy_to(cached, target_file)
+                except Exception as e:
+                    return {"status": "error", "error": {"code": "WRITE_ERROR", "message": str(e)}}
+                served_from_cache = True
+            elif self.artifact_store is not None:
+                meta = {"etag": streamed["etag"]} if streamed.get("etag") else None
+                try:
+                    self.artifact_store.put_file(session_id, "cw", target_file, meta=meta)
+                except Exception as e:
+                    print(f"Warning: Failed to cache session code: {e}", file=sys.stderr)
+        # Only copies the prefetcher stored count as its hits
+        if self.prefetcher is not None and (cached is None or cached["meta"].get("prefetched")):
+            self.prefetcher.record(hit=served_from_cache)
             
-        return {
+        result = {
             "status": "ok",
             "file_path": target_file
         }
+        if served_from_cache:
+            result["cached"] = True
+        return result
@@ -0,0 +1,219 @@
+import os
+import time
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable
+
+from local_store import FileLock, atomic_write_json, read_json, cwmcp_home
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+_current_priority = contextvars.ContextVar("cwmcp_request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: str):
+    """Runs the enclosed backend calls under the given priority class."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+
+class TokenBucket:
+    """
+    A token bucket whose state lives in a JSON file, so every client process
+    on the host draws from the same budget. All reads and writes happen
+    under a FileLock.
+    """
+
+    def __init__(self, state_path: str, rate: float, capacity: float):
+        self.state_path = state_path
+        self.lock_path = state_path + ".lock"
+        self.rate = rate
+        self.capacity = capacity
+
+    def _load(self, now: float) -> Dict[str, float]:
+        state = read_json(self.state_path) or {}
+        tokens = float(state.get("tokens", self.capacity))
+        updated_at = float(state.get("updated_at", now))
+        tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+        return {"tokens": tokens, "updated_at": now, "blocked_until": float(state.get("blocked_until", 0))}
+
+    def try_acquire(self, reserve: float = 0.0) -> float:
+        """
+        Takes one token if that leaves at least `reserve` tokens behind.
+        Returns 0 on success, otherwise the number of seconds to wait.
+        """
+        with FileLock(self.lock_path):
+            now = time.time()
+            state = self._load(now)
+            if state["blocked_until"] > now:
+                atomic_write_json(self.state_path, state)
+                return state["blocked_until"] - now
+            if state["tokens"] - 1.0 >= reserve:
+                state["tokens"] -= 1.0
+                atomic_write_json(self.state_path, state)
+                return 0.0
+            atomic_write_json(self.state_path, state)
+            return (1.0 + reserve - state["tokens"]) / self.rate
+
+    def block_until(self, timestamp: float) -> None:
+        with FileLock(self.lock_path):
+            state = self._load(time.time())
+            state["blocked_until"] = max(state["blocked_until"], timestamp)
+            atomic_write_json(self.state_path, state)
+
+    def peek(self) -> Dict[str, float]:
+        return self._load(time.time())
+
+
+class RequestScheduler:
+    """
+    Sits in front of every backend call made by RemoteMCPServer.
+
+    - Draws from a host-wide TokenBucket shared by all client processes.
+    - Interactive calls go first: batch calls wait while an interactive call
+      is waiting in this process, and never take the last `batch_reserve`
+      tokens of the shared bucket.
+    - Honors Retry-After on 429/503 by blocking the shared bucket and
+      retrying the call up to `max_retries` times.
+    - Holds back batch calls after a 402, or when the backend reports via
+      X-Credits-Remaining that credits are below `low_credit_threshold`.
+    """
+
+    def __init__(self, base_url: str, rate: float = 1.0, burst: float = 5.0,
+                 batch_reserve: float = 1.0, max_retries: int = 3, max_retry_wait: float = 120.0,
+                 low_credit_threshold: Optional[float] = None, low_credit_delay: float = 30.0,
+                 credit_backoff: float = 300.0, state_dir: Optional[str] = None):
+        state_dir = state_dir or os.path.join(cwmcp_home(), "ratelimit")
+        bucket_name = hashlib.sha256(base_url.encode("utf-8")).hexdigest()[:16]
+        self.bucket = TokenBucket(os.path.join(state_dir, f"{bucket_name}.json"), rate, burst)
+        self.batch_reserve = min(batch_reserve, max(burst - 1.0, 0.0))
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self.low_credit_threshold = low_credit_threshold
+        self.low_credit_delay = low_credit_delay
+        self.credit_backoff = credit_backoff
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+        self._batch_hold_until = 0.0
+        self._stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "retried_429": 0, "credit_holds": 0}
+
+    def acquire(self, priority: Optional[str] = None) -> float:
+        """Blocks until the caller may send a request. Returns the seconds waited."""
+        interactive = (priority or current_priority()) == INTERACTIVE
+        started = time.monotonic()
+        if interactive:
+            with self._cond:
+                self._interactive_waiting += 1
+        try:
+            while True:
+                if not interactive:
+                    with self._cond:
+                        hold = self._batch_hold_until - time.time()
+                        if self._interactive_waiting or hold > 0:
+                            self._cond.wait(min(max(hold, 0.05), 1.0))
+                            continue
+                wait = self.bucket.try_acquire(0.0 if interactive else self.batch_reserve)
+                if wait <= 0:
+                    break
+                time.sleep(min(wait, 1.0))
+        finally:
+            if interactive:
+                with self._cond:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        self._stats["acquired"] += 1
+        if waited > 0.01:
+            self._stats["waited"] += 1
+            self._stats["wait_seconds"] += waited
+        return waited
+
+    def call(self, send: Callable[[], Any], priority: Optional[str] = None):
+        """Sends a request through the scheduler, retrying on 429/503 with Retry-After."""
+        attempt = 0
+        while True:
+            self.acquire(priority)
+            resp = send()
+            retry_after = self.note_response(resp)
+            if retry_after is None or attempt >= self.max_retries or retry_after > self.max_retry_wait:
+                return resp
+            # Release the connection of a streamed response before retrying
+            close = getattr(resp, "close", None)
+            if callable(close):
+                close()
+            attempt += 1
+            self._stats["retried_429"] += 1
+
+    def note_response(self, resp) -> Optional[float]:
+        """
+        Records rate-limit and credit signals from a response. Returns the
+        Retry-After delay when the request should be retried.
+        """
+        now = time.time()
+        status = getattr(resp, "status_code", 0)
+        headers = getattr(resp, "headers", None) or {}
+
+        if status == 402:
+            self._hold_batch(now + self.credit_backoff)
+            return None
+
+        remaining = headers.get("X-Credits-Remaining")
+        if remaining is not None and self.low_credit_threshold is not None:
+            try:
+                if float(remaining) < self.low_credit_threshold:
+                    self._hold_batch(now + self.low_credit_delay)
+            except (TypeError, ValueError):
+                pass
+
+        if status in (429, 503):
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if retry_after is None:
+                return None
+            self.bucket.block_until(now + retry_after)
+            return retry_after
+        return None
+
+    def _hold_batch(self, until: float) -> None:
+        with self._cond:
+            if until > self._batch_hold_until:
+                self._batch_hold_until = until
+                self._stats["credit_holds"] += 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        bucket = self.bucket.peek()
+        return {
+            "rate_per_second": self.bucket.rate,
+            "burst": self.bucket.capacity,
+            "tokens_available": round(bucket["tokens"], 2),
+            "blocked_for_seconds": round(max(0.0, bucket["blocked_until"] - time.time()), 1),
+            "batch_held_for_seconds": round(max(0.0, self._batch_hold_until - time.time()), 1),
+            **{k: round(v, 2) if isinstance(v, float) else v for k, v in self._stats.items()},
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
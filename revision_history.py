@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+import difflib
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from local_store import FileLock, atomic_write_json, atomic_write_text, read_json, cwmcp_home
+from request_scheduler import request_priority, BATCH
+
+
+class RevisionHistory:
+    """
+    A local log of each session's D2 code.
+
+    `<root>/sessions/<session_id>.json` lists the revisions of a session
+    (number, hash, source, time). The code itself is stored once per
+    distinct content under `<root>/blobs/<sha256>.cw`. A revision that
+    matches the previous one is not appended, and only the newest
+    `max_revisions` entries are kept per session.
+
+    `schedule` records a run/edit/import result. If the result does not carry
+    the code, it is fetched from `/session/export` on a background thread,
+    or taken from the artifact store when the prefetcher already fetched it.
+    """
+
+    def __init__(self, backend, root: Optional[str] = None, max_revisions: int = 50):
+        self.backend = backend
+        self.root = root or os.path.join(cwmcp_home(), "history")
+        self.sessions_dir = os.path.join(self.root, "sessions")
+        self.blobs_dir = os.path.join(self.root, "blobs")
+        self.max_revisions = max_revisions
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cwmcp-history")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    # ---- Recording ----
+
+    def schedule(self, result: Dict[str, Any], d2_code: Optional[str] = None) -> None:
+        session_id = result.get("session_id")
+        if result.get("status") != "ok" or not session_id:
+            return
+        d2_code = d2_code if d2_code is not None else result.get("d2_code")
+        if d2_code is not None:
+            self.record(session_id, d2_code)
+            return
+        future = self._executor.submit(self._fetch_and_record, session_id)
+        with self._lock:
+            self._pending[session_id] = future
+        future.add_done_callback(lambda f: self._done(session_id, f))
+
+    def wait_for(self, session_id: str, timeout: float = 30.0) -> None:
+        with self._lock:
+            future = self._pending.get(session_id)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def _fetch_and_record(self, session_id: str) -> None:
+        try:
+            d2_code = self._cached_code(session_id)
+            if d2_code is None:
+                with request_priority(BATCH):
+                    data = self.backend.get_session_code(session_id)
+                if data.get("status") == "error" or data.get("d2_code") is None:
+                    raise RuntimeError((data.get("error") or {}).get("message", "No D2 code returned"))
+                d2_code = data["d2_code"]
+            self.record(session_id, d2_code)
+        except Exception as e:
+            print(f"Warning: Failed to record revision of session {session_id}: {e}", file=sys.stderr)
+
+    def _cached_code(self, session_id: str) -> Optional[str]:
+        prefetcher = getattr(self.backend, "prefetcher", None)
+        store = getattr(self.backend, "artifact_store", None)
+        if prefetcher is None or store is None:
+            return None
+        prefetcher.wait_for(session_id)
+        entry = store.get(session_id, "cw")
+        return store.read_bytes(entry).decode("utf-8") if entry else None
+
+    def _done(self, session_id: str, future) -> None:
+        with self._lock:
+            if self._pending.get(session_id) is future:
+                del self._pending[session_id]
+
+    def record(self, session_id: str, d2_code: str, source: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Appends a revision unless it equals the latest one. Returns the new entry, or None."""
+        data = d2_code.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            atomic_write_text(blob_path, d2_code)
+        with FileLock(self._lock_path(session_id)):
+            log = self._load(session_id)
+            revisions = log["revisions"]
+            if revisions and revisions[-1]["sha256"] == digest:
+                return None
+            entry = {
+                "revision": revisions[-1]["revision"] + 1 if revisions else 1,
+                "sha256": digest,
+                "bytes": len(data),
+                "source": source or ("edit" if revisions else "create"),
+                "created_at": time.time(),
+            }
+            revisions.append(entry)
+            del revisions[:max(0, len(revisions) - self.max_revisions)]
+            atomic_write_json(self._log_path(session_id), log)
+        return entry
+
+    def fork(self, from_session: str, revision: int, new_session: str) -> None:
+        """
+        Starts the log of a session created by rolling back: it inherits the
+        revisions of `from_session` up to `revision`, so later rollbacks can
+        still reach them.
+        """
+        inherited = [dict(r) for r in self.list(from_session) if r["revision"] <= revision]
+        with FileLock(self._lock_path(new_session)):
+            log = self._load(new_session)
+            revisions = inherited
+            for entry in log["revisions"]:
+                if revisions and revisions[-1]["sha256"] == entry["sha256"]:
+                    continue
+                revisions.append(dict(entry, revision=revisions[-1]["revision"] + 1 if revisions else 1))
+            if revisions:
+                revisions[-1] = dict(revisions[-1], source="rollback",
+                                     rolled_back_from={"session_id": from_session, "revision": revision})
+            log["revisions"] = revisions[-self.max_revisions:]
+            atomic_write_json(self._log_path(new_session), log)
+
+    # ---- Reading ----
+
+    def list(self, session_id: str) -> List[Dict[str, Any]]:
+        return self._load(session_id)["revisions"]
+
+    def get(self, session_id: str, revision: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Returns the entry (with its `d2_code`) of a revision; negative numbers count from the latest."""
+        revisions = self.list(session_id)
+        if not revisions:
+            return None
+        if revision is None:
+            revision = -1
+        if revision < 0:
+            if -revision > len(revisions):
+                return None
+            entry = revisions[revision]
+        else:
+            entry = next((r for r in revisions if r["revision"] == revision), None)
+            if entry is None:
+                return None
+        try:
+            with open(self._blob_path(entry["sha256"]), "r", encoding="utf-8", newline="") as f:
+                return dict(entry, d2_code=f.read())
+        except OSError:
+            return None
+
+    def diff(self, session_id: str, from_revision: int, to_revision: Optional[int] = None,
+             context: int = 3) -> Optional[Dict[str, Any]]:
+        old = self.get(session_id, from_revision)
+        new = self.get(session_id, to_revision)
+        if old is None or new is None:
+            return None
+        lines = list(difflib.unified_diff(
+            old["d2_code"].splitlines(keepends=True), new["d2_code"].splitlines(keepends=True),
+            fromfile=f"revision {old['revision']}", tofile=f"revision {new['revision']}", n=context,
+        ))
+        return {
+            "from_revision": old["revision"],
+            "to_revision": new["revision"],
+            "added": sum(1 for l in lines if l.startswith("+") and not l.startswith("+++")),
+            "removed": sum(1 for l in lines if l.startswith("-") and not l.startswith("---")),
+            "diff": "".join(lines),
+        }
+
+    # ---- Internals ----
+
+    def _load(self, session_id: str) -> Dict[str, Any]:
+        log = read_json(self._log_path(session_id)) or {}
+        log.setdefault("session_id", session_id)
+        log.setdefault("revisions", [])
+        return log
+
+    def _log_path(self, session_id: str) -> str:
+        return os.path.join(self.sessions_dir, f"{self._safe(session_id)}.json")
+
+    def _lock_path(self, session_id: str) -> str:
+        return os.path.join(self.sessions_dir, f"{self._safe(session_id)}.lock")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, f"{digest}.cw")
+
+    @staticmethod
+    def _safe(session_id: str) -> str:
+        return "".join(c if c.isalnum() or c in "-_." else "_" for c in session_id)
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import hashlib
+import sys
+from typing import Optional, Dict, Any
+
+from local_store import FileLock, atomic_write_json, read_json, cwmcp_home
+
+SHARED_FORMAT = "cwmcp-shared"
+SHARED_VERSION = 1
+MAX_SESSIONS = 500
+
+
+def request_key(mode: str, export_svg: bool, export_pptx: bool, source_kind: str, text: str) -> str:
+    """
+    The cache key of a new generation, identical in the Python and Node
+    clients: the SHA-256 of the compact JSON array
+    ["run", mode, export_svg, export_pptx, source_kind, text], where text is
+    the raw input file content or user request with CRLF normalized to LF.
+    See SHARED_CACHE_FORMAT.md.
+    """
+    canonical = json.dumps(
+        ["run", str(mode), bool(export_svg), bool(export_pptx), source_kind, text.replace("\r\n", "\n")],
+        separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SharedCache:
+    """
+    The on-disk cache shared with the Node skill client (version 1 of the
+    format described in SHARED_CACHE_FORMAT.md):
+
+    - `sessions.json` is the session registry: metadata per session_id, and
+      the latest session per working directory and per input file.
+    - `results/<key>.json` holds the result of a new generation, keyed by
+      `request_key`. It is served only while younger than `ttl_seconds`,
+      and only if the session has not been edited since.
+
+    Updates of `sessions.json` happen under the `.lock` file. Each file is
+    written to a temp file and renamed into place. A directory written by a
+    newer major version is left alone.
+    """
+
+    def __init__(self, root: Optional[str] = None, ttl_seconds: float = 24 * 3600, client: str = "python"):
+        self.root = root or os.path.join(cwmcp_home(), "shared")
+        self.results_dir = os.path.join(self.root, "results")
+        self.sessions_path = os.path.join(self.root, "sessions.json")
+        self.lock_path = os.path.join(self.root, ".lock")
+        self.ttl_seconds = ttl_seconds
+        self.client = client
+        self.compatible = self._check_format()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _check_format(self) -> bool:
+        format_path = os.path.join(self.root, "format.json")
+        info = read_json(format_path)
+        if info is None:
+            with FileLock(self.lock_path):
+                if read_json(format_path) is None:
+                    atomic_write_json(format_path, {"format": SHARED_FORMAT, "version": SHARED_VERSION})
+            return True
+        if info.get("format") != SHARED_FORMAT or int(info.get("version", 0)) > SHARED_VERSION:
+            print(f"Warning: Shared cache at {self.root} uses an unsupported format {info}; not using it",
+                  file=sys.stderr)
+            return False
+        return True
+
+    # ---- Results ----
+
+    def get_result(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns {"result", "client", "created_at"} for a fresh entry, or None."""
+        entry = read_json(os.path.join(self.results_dir, f"{key}.json")) if self.compatible else None
+        if entry and entry.get("version") == SHARED_VERSION and time.time() - entry.get("created_at", 0) <= self.ttl_seconds:
+            session = self.get_session((entry.get("result") or {}).get("session_id", ""))
+            if not session or session.get("edited_at", 0) <= entry["created_at"]:
+                self._stats["hits"] += 1
+                return entry
+        self._stats["misses"] += 1
+        return None
+
+    def put_result(self, key: str, result: Dict[str, Any]) -> None:
+        if not self.compatible:
+            return
+        atomic_write_json(os.path.join(self.results_dir, f"{key}.json"), {
+            "version": SHARED_VERSION,
+            "key": key,
+            "client": self.client,
+            "created_at": time.time(),
+            "result": result,
+        })
+
+    # ---- Sessions ----
+
+    def record_session(self, session_id: str, working_dir: Optional[str] = None, input_file: Optional[str] = None,
+                       request_key: Optional[str] = None, edited: bool = False) -> None:
+        if not self.compatible:
+            return
+        now = time.time()
+        with FileLock(self.lock_path):
+            registry = self._load_sessions()
+            session = registry["sessions"].setdefault(session_id, {"session_id": session_id, "created_at": now})
+            session["updated_at"] = now
+            session["client"] = self.client
+            if edited:
+                session["edited_at"] = now
+            if request_key:
+                session["request_key"] = request_key
+            if working_dir:
+                session["working_dir"] = os.path.abspath(working_dir)
+                registry["latest"][f"dir:{session['working_dir']}"] = session_id
+            if input_file:
+                session["input_file"] = os.path.abspath(input_file)
+                registry["latest"][f"file:{session['input_file']}"] = session_id
+            self._prune(registry)
+            atomic_write_json(self.sessions_path, registry)
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        if not self.compatible or not session_id:
+            return None
+        return self._load_sessions()["sessions"].get(session_id)
+
+    def latest_session(self, working_dir: Optional[str] = None, input_file: Optional[str] = None) -> Optional[str]:
+        """The session most recently created or edited by either client for this directory or file."""
+        if not self.compatible:
+            return None
+        latest = self._load_sessions()["latest"]
+        if input_file and f"file:{os.path.abspath(input_file)}" in latest:
+            return latest[f"file:{os.path.abspath(input_file)}"]
+        if working_dir:
+            return latest.get(f"dir:{os.path.abspath(working_dir)}")
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "root": self.root,
+            "compatible": self.compatible,
+            "sessions": len(self._load_sessions()["sessions"]) if self.compatible else 0,
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else None,
+        }
+
+    # ---- Internals ----
+
+    def _load_sessions(self) -> Dict[str, Any]:
+        registry = read_json(self.sessions_path) or {}
+        registry["version"] = SHARED_VERSION
+        registry.setdefault("sessions", {})
+        registry.setdefault("latest", {})
+        return registry
+
+    @staticmethod
+    def _prune(registry: Dict[str, Any]) -> None:
+        sessions = registry["sessions"]
+        if len(sessions) <= MAX_SESSIONS:
+            return
+        ordered = sorted(sessions.values(), key=lambda s: s.get("updated_at", 0))
+        for session in ordered[:len(sessions) - MAX_SESSIONS]:
+            del sessions[session["session_id"]]
+        registry["latest"] = {k: v for k, v in registry["latest"].items() if v in sessions}
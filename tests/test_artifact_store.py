@@ -0,0 +1,73 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from artifact_store import ArtifactStore
+
+
+class TestArtifactStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = ArtifactStore(root=self.root, max_bytes=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def blob_count(self):
+        return sum(len(files) for _, _, files in os.walk(os.path.join(self.root, "blobs")))
+
+    def test_unknown_revision_is_not_cached(self):
+        self.assertIsNone(self.store.put("s1", "cw", b"a -> b"))
+        self.assertIsNone(self.store.get("s1", "cw"))
+
+    def test_artifact_is_served_until_revision_changes(self):
+        self.store.set_revision("s1", "r1")
+        self.store.put("s1", "cw", b"a -> b")
+
+        entry = self.store.get("s1", "cw")
+        self.assertEqual(self.store.read_bytes(entry), b"a -> b")
+
+        self.store.set_revision("s1", "r2")
+        self.assertIsNone(self.store.get("s1", "cw"))
+
+    def test_file_content_is_stored_like_bytes(self):
+        self.store.set_revision("s1", "r1")
+        source = os.path.join(self.root, "diagram.cw")
+        with open(source, "wb") as f:
+            f.write(b"a -> b\r\n")
+
+        entry = self.store.put_file("s1", "cw", source)
+
+        self.assertEqual(entry["size"], 8)
+        self.assertEqual(self.store.read_bytes(self.store.get("s1", "cw")), b"a -> b\r\n")
+        self.store.put("s2", "cw", b"a -> b\r\n", revision="r1")
+        self.assertEqual(self.blob_count(), 1)
+
+    def test_identical_blobs_are_stored_once(self):
+        self.store.set_revision("s1", "r1")
+        self.store.set_revision("s2", "r1")
+        self.store.put("s1", "cw", b"same")
+        self.store.put("s2", "cw", b"same")
+
+        self.assertEqual(self.blob_count(), 1)
+        self.assertEqual(self.store.stats()["entries"], 2)
+
+    def test_least_recently_used_is_evicted_over_cap(self):
+        for session in ("old", "new"):
+            self.store.set_revision(session, "r1")
+        self.store.put("old", "cw", b"x" * 600)
+        self.store.put("new", "cw", b"y" * 600)
+
+        self.assertIsNone(self.store.get("old", "cw"))
+        self.assertIsNotNone(self.store.get("new", "cw"))
+        self.assertEqual(self.blob_count(), 1)
+
+    def test_json_roundtrip(self):
+        self.store.set_revision("s1", "r1")
+        self.store.put_json("s1", "export:svg", {"status": "ok", "svg_url": "http://x"})
+        self.assertEqual(self.store.get_json("s1", "export:svg")["svg_url"], "http://x")
+
+
+if __name__ == "__main__":
+    unittest.main()
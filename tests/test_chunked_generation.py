@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+import shutil
+
+from chunked_generation import ChunkedGenerator, split_into_chunks, merge_d2
+
+
+DOCUMENT = """Intro paragraph describing the whole system.
+
+## Auth
+Users log in.
+
+### Tokens
+Tokens expire.
+
+## Billing
+Credits are charged per run.
+
+```md
+## Fenced
+```
+"""
+
+
+class TestSplitIntoChunks(unittest.TestCase):
+    def test_splits_at_shallowest_heading_level(self):
+        chunks = split_into_chunks(DOCUMENT, max_chunk_chars=70)
+
+        self.assertEqual([c["title"] for c in chunks], ["Overview", "Auth", "Billing"])
+        self.assertIn("### Tokens", chunks[1]["text"])
+        self.assertIn("## Fenced", chunks[2]["text"])
+
+    def test_small_sections_are_merged(self):
+        chunks = split_into_chunks(DOCUMENT, max_chunk_chars=10000)
+        self.assertEqual(len(chunks), 1)
+
+    def test_oversized_section_is_split_at_paragraphs(self):
+        text = "## Big\n" + "\n\n".join(["p" * 40] * 5)
+        chunks = split_into_chunks(text, max_chunk_chars=100)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(c["text"]) <= 100 for c in chunks))
+        self.assertEqual(chunks[0]["title"], "Big (1)")
+
+    def test_merge_wraps_chunks_in_containers(self):
+        merged = merge_d2([{"title": 'Auth "flow"', "d2_code": "a -> b"}], base_d2="x")
+        self.assertEqual(merged, 'x\n\nsection_1: "Auth \\"flow\\"" {\n  a -> b\n}\n')
+
+
+class TestChunkedGenerator(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.backend = MagicMock()
+        self.backend.base_url = "http://a"
+        self.backend.editor_protocol = None
+        self.backend.generate_chunk.side_effect = \
+            lambda user_request, **kwargs: {"status": "ok", "session_id": "sub", "d2_code": f"n{len(user_request)}"}
+        self.backend.import_d2_code.return_value = {"status": "ok", "session_id": "merged"}
+        self.backend.export_session.return_value = {"status": "ok", "svg_url": "http://x/merged.svg"}
+        self.generator = ChunkedGenerator(self.backend, threshold_chars=10, max_chunk_chars=70,
+                                          cache_dir=self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_generates_chunks_and_imports_merged_code(self):
+        result = self.generator.generate(DOCUMENT, source_name="spec.md")
+
+        self.assertEqual(result["session_id"], "merged")
+        self.assertEqual(result["svg_url"], "http://x/merged.svg")
+        self.assertEqual(len(result["chunks"]), 3)
+        self.assertEqual(self.backend.generate_chunk.call_count, 3)
+        merged_code = self.backend.import_d2_code.call_args.args[0]
+        self.assertEqual(merged_code.count("section_"), 3)
+
+    def test_unchanged_chunks_come_from_cache(self):
+        self.generator.generate(DOCUMENT)
+        self.backend.generate_chunk.reset_mock()
+
+        result = self.generator.generate(DOCUMENT.replace("per run", "per diagram"))
+
+        self.assertEqual(self.backend.generate_chunk.call_count, 1)
+        self.assertEqual(result["cache_hits"], 2)
+
+    def test_cache_is_per_backend_and_editor_protocol(self):
+        self.generator.generate(DOCUMENT)
+        self.backend.generate_chunk.reset_mock()
+
+        self.backend.editor_protocol = "vscode"
+        self.generator.generate(DOCUMENT)
+        self.backend.base_url = "http://b"
+        self.generator.generate(DOCUMENT)
+
+        self.assertEqual(self.backend.generate_chunk.call_count, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -87,6 +87,20 @@ class TestConfigFeature(unittest.TestCase):
         # Plan mode tools should be gone
         self.assertNotIn("get_outline_prompt", tools)
         self.assertNotIn("generate_contextweave_from_outline", tools)
+    def test_env_flags_override_config(self):
+        config_content = '{"compact_output": true, "enable_prefetch": true}'
+        env = {"CWMCP_COMPACT_OUTPUT": "off", "CWMCP_SHARED_CACHE": "Yes", "CWMCP_PREFETCH": ""}
+        with patch("os.path.exists", return_value=False):
+            import main
+        with patch("os.path.exists", return_value=True), \
+             patch("builtins.open", mock_open(read_data=config_content)), \
+             patch.dict(os.environ, env):
+            config = main.load_config()
+
+        self.assertFalse(config["compact_output"])
+        self.assertTrue(config["enable_shared_cache"])
+        self.assertTrue(config["enable_prefetch"])
+        self.assertFalse(config["enable_profiling"])
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import json
+import time
+import tempfile
+import shutil
+import sys
+
+# Other test modules replace remote_mcp_server with a stub; load the real one.
+sys.modules.pop("remote_mcp_server", None)
+from cw_build import ProjectBuilder, load_manifest, run
+
+
+class TestProjectBuilder(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.root, "cwmcp_build.json")
+        self.backend = MagicMock()
+        self.calls = 0
+
+        def generate(input_file, mode, export_formats):
+            self.calls += 1
+            return {"status": "ok", "session_id": f"s{self.calls}", "svg_url": "http://x/d.svg"}
+
+        def export_code(session_id, path):
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, "diagram.cw"), "w", encoding="utf-8") as f:
+                f.write(session_id)
+            return {"status": "ok", "file_path": os.path.join(path, "diagram.cw")}
+
+        self.backend.run_contextweave_generation.side_effect = generate
+        self.backend.export_contextweave_code.side_effect = export_code
+        self.backend._get.return_value.content = b"<svg/>"
+        self.factory = MagicMock(return_value=self.backend)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_source(self, name, request, preamble=""):
+        path = os.path.join(self.root, "docs", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{preamble}# Request\n{request}\n")
+
+    def write_manifest(self, diagrams, **options):
+        with open(self.manifest, "w", encoding="utf-8") as f:
+            json.dump(dict(options, diagrams=diagrams), f)
+
+    def build(self, **kwargs):
+        return ProjectBuilder(self.manifest, backend_factory=self.factory, log=lambda m: None, **kwargs).build()
+
+    def test_only_changed_sources_are_rebuilt(self):
+        self.write_source("a.md", "Auth flow")
+        self.write_source("b.md", "Billing flow")
+        self.write_manifest([{"source": "docs/*.md", "output": "out/{stem}"}])
+
+        first = self.build()
+        self.assertEqual(sorted(first["built"]), ["docs/a.md", "docs/b.md"])
+        with open(os.path.join(self.root, "out", "a", "diagram.svg"), "rb") as f:
+            self.assertEqual(f.read(), b"<svg/>")
+
+        self.write_source("a.md", "Auth flow", preamble="Notes that are not sent\n")
+        self.write_source("b.md", "Billing flow with refunds")
+        second = self.build()
+
+        self.assertEqual(second["built"], ["docs/b.md"])
+        self.assertEqual(second["up_to_date"], 1)
+        with open(os.path.join(self.root, "cwmcp_build.lock.json"), encoding="utf-8") as f:
+            lock = json.load(f)
+        self.assertEqual(lock["diagrams"]["docs/b.md"]["session_id"], "s3")
+        self.assertEqual(lock["diagrams"]["docs/a.md"]["output"], "out/a")
+
+    def test_noop_build_does_not_create_the_backend(self):
+        for i in range(100):
+            self.write_source(f"d{i}.md", f"Diagram {i}")
+        self.write_manifest([{"source": "docs/*.md", "output": "out/{stem}"}], export_formats="none")
+        self.build()
+        self.factory.reset_mock()
+
+        started = time.monotonic()
+        result = self.build()
+
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual((result["built"], result["up_to_date"]), ([], 100))
+        self.factory.assert_not_called()
+
+    def test_missing_output_and_failures_trigger_rebuilds(self):
+        self.write_source("a.md", "Auth flow")
+        self.write_manifest([{"source": "docs/a.md", "output": "out/a"}])
+        self.build()
+        os.remove(os.path.join(self.root, "out", "a", "diagram.svg"))
+        self.assertEqual(self.build()["built"], ["docs/a.md"])
+
+        self.write_source("a.md", "Auth flow v2")
+        self.backend.run_contextweave_generation.side_effect = None
+        self.backend.run_contextweave_generation.return_value = {
+            "status": "error", "error": {"code": "PAYMENT_REQUIRED", "message": "Insufficient credits"}}
+        failed = self.build()
+        self.assertEqual(failed["failed"][0]["error"]["code"], "PAYMENT_REQUIRED")
+        # Still stale: the lockfile keeps the previous hash
+        self.assertEqual(self.build()["failed"][0]["source"], "docs/a.md")
+
+    def test_manifest_validation_and_cli_dry_run(self):
+        self.write_manifest([{"source": "docs/a.md"}])
+        with self.assertRaises(ValueError):
+            load_manifest(self.manifest)
+        self.assertEqual(run([self.manifest]), 2)
+
+        self.write_source("a.md", "Auth flow")
+        self.write_manifest([{"source": "docs/a.md", "output": "out/a"}])
+        self.assertEqual(run([self.manifest, "--dry-run"]), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "cwmcp_build.lock.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
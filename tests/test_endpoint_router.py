@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import tempfile
+import shutil
+
+from endpoint_router import EndpointRouter
+
+
+def make_client(status_code=200):
+    client = MagicMock()
+    client.get.return_value.status_code = status_code
+    return client
+
+
+class TestEndpointRouter(unittest.TestCase):
+    def setUp(self):
+        self.clients = {"http://a": make_client(), "http://b": make_client()}
+        self.router = EndpointRouter(["http://a", "http://b"], self.clients.get)
+        self.a, self.b = self.router.endpoints
+
+    def test_fastest_healthy_endpoint_first(self):
+        self.router.record(self.a, 0.5, ok=True)
+        self.router.record(self.b, 0.1, ok=True)
+        self.assertEqual([e.url for e in self.router.candidates()], ["http://b", "http://a"])
+
+    def test_latency_is_smoothed(self):
+        self.router.record(self.a, 0.1, ok=True)
+        self.router.record(self.a, 1.1, ok=True)
+        self.assertAlmostEqual(self.a.ewma_ms, 400.0)
+
+    def test_repeated_failures_mark_endpoint_unhealthy(self):
+        self.router.record(self.b, 0.5, ok=True)
+        self.router.record(self.a, None, ok=False)
+        self.assertTrue(self.a.healthy)
+        self.router.record(self.a, None, ok=False)
+        self.assertFalse(self.a.healthy)
+        self.assertEqual(self.router.candidates()[0], self.b)
+
+    def test_session_affinity_overrides_latency(self):
+        self.router.record(self.a, 0.5, ok=True)
+        self.router.record(self.b, 0.1, ok=True)
+        self.router.bind("s1", self.a)
+        self.assertEqual(self.router.candidates("s1")[0], self.a)
+        self.assertEqual(self.router.candidates("other")[0], self.b)
+
+    def test_bindings_are_shared_through_the_affinity_file(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        path = os.path.join(root, "session_endpoints.json")
+        self.router.affinity_path = path
+        self.router.max_bindings = 2
+        for session in ("s1", "s2", "s3"):
+            self.router.bind(session, self.b)
+
+        other = EndpointRouter(["http://a", "http://b"], self.clients.get, affinity_path=path)
+        self.assertEqual(other.owner("s3").url, "http://b")
+        self.assertEqual(other.candidates("s2")[0].url, "http://b")
+        self.assertIsNone(other.owner("s1"))
+
+    def test_failed_probe_takes_endpoint_out_of_rotation(self):
+        self.clients["http://a"].get.side_effect = ConnectionError("down")
+        self.router.probe_all()
+        self.assertFalse(self.a.healthy)
+        self.assertTrue(self.b.healthy)
+        self.assertIsNotNone(self.b.ewma_ms)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import threading
+
+from generation_jobs import GenerationJobManager
+from request_scheduler import request_priority, current_priority, BATCH
+
+
+class TestGenerationJobManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = GenerationJobManager(max_workers=2)
+
+    def test_submit_returns_immediately_and_await_collects_result(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def run():
+            started.set()
+            release.wait(5)
+            return {"status": "ok", "session_id": "job-session"}
+
+        job = self.manager.submit(run, {"input_file": "a.md"})
+        self.assertIn(job["state"], ("pending", "running"))
+
+        # Not finished yet: wait times out and reports the current state
+        self.assertTrue(started.wait(5))
+        self.assertEqual(self.manager.wait(job["job_id"], 0.01)["state"], "running")
+
+        release.set()
+        finished = self.manager.wait(job["job_id"], 5)
+        self.assertEqual(finished["state"], "done")
+        self.assertEqual(finished["result"]["session_id"], "job-session")
+
+    def test_error_result_marks_job_failed(self):
+        job = self.manager.submit(lambda: {"status": "error", "error": {"code": "API_ERROR", "message": "down"}})
+
+        finished = self.manager.wait(job["job_id"], 5)
+
+        self.assertEqual(finished["state"], "failed")
+        self.assertEqual(self.manager.list()[0]["error"]["code"], "API_ERROR")
+
+    def test_exception_is_captured(self):
+        def run():
+            raise RuntimeError("boom")
+
+        job = self.manager.submit(run)
+
+        finished = self.manager.wait(job["job_id"], 5)
+        self.assertEqual(finished["result"]["error"]["code"], "JOB_ERROR")
+
+    def test_job_runs_in_the_callers_context(self):
+        with request_priority(BATCH):
+            job = self.manager.submit(lambda: {"status": "ok", "priority": current_priority()})
+
+        self.assertEqual(self.manager.wait(job["job_id"], 5)["result"]["priority"], BATCH)
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.manager.get("missing"))
+        self.assertIsNone(self.manager.wait("missing", 0.01))
+
+
+if __name__ == "__main__":
+    unittest.main()
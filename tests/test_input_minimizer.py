@@ -0,0 +1,86 @@
+import unittest
+
+from input_minimizer import InputMinimizer
+
+
+class TestInputMinimizer(unittest.TestCase):
+    def setUp(self):
+        self.minimizer = InputMinimizer(max_code_block_lines=8)
+
+    def test_embedded_images_are_replaced(self):
+        text, stats = self.minimizer.minimize("Intro\n\n![arch](data:image/png;base64," + "A" * 5000 + ")")
+        self.assertEqual(text, "Intro\n\n[image: arch]")
+        self.assertEqual(stats["data_uris_removed"], 1)
+        self.assertGreater(stats["bytes_saved"], 4900)
+
+    def test_long_code_blocks_keep_head_and_tail(self):
+        code = "\n".join(f"line {i}" for i in range(100))
+        text, stats = self.minimizer.minimize(f"```python\n{code}\n```")
+        self.assertIn("line 0", text)
+        self.assertIn("line 99", text)
+        self.assertIn("(92 lines omitted)", text)
+        self.assertEqual(stats["code_blocks_shortened"], 1)
+
+    def test_diagram_fences_are_kept(self):
+        d2 = "\n".join(f"n{i} -> n{i + 1}" for i in range(50))
+        text, stats = self.minimizer.minimize(f"```d2\n{d2}\n```")
+        self.assertEqual(text, f"```d2\n{d2}\n```")
+        self.assertEqual(stats["bytes_saved"], 0)
+
+    def test_log_runs_are_collapsed(self):
+        logs = "\n".join(f"2024-01-01 10:00:{i:02d} INFO step {i}" for i in range(40))
+        text, stats = self.minimizer.minimize(f"The service:\n{logs}")
+        self.assertIn("step 0", text)
+        self.assertIn("step 39", text)
+        self.assertEqual(stats["log_lines_removed"], 34)
+
+    def test_short_log_run_setting_never_omits_a_negative_count(self):
+        minimizer = InputMinimizer(log_run_lines=2)
+        logs = "\n".join(f"2024-01-01 10:00:{i:02d} INFO step {i}" for i in range(5))
+        text, stats = minimizer.minimize(logs)
+        self.assertEqual(text, logs)
+        self.assertNotIn("log_lines_removed", stats)
+
+        logs = "\n".join(f"2024-01-01 10:00:{i:02d} INFO step {i}" for i in range(10))
+        text, stats = minimizer.minimize(logs)
+        self.assertIn("(4 log lines omitted)", text)
+        self.assertEqual(stats["log_lines_removed"], 4)
+
+    def test_diagram_fences_are_sent_unchanged(self):
+        icon = "data:image/png;base64," + "A" * 100
+        d2 = f"```d2\na -> b\n\n\n\nc: {{icon: {icon}}}\n```"
+        text, stats = self.minimizer.minimize(f"Intro\n{d2}\nAfter\n\n{d2}")
+        self.assertEqual(text, f"Intro\n{d2}\nAfter\n\n{d2}")
+        self.assertEqual(stats["bytes_saved"], 0)
+
+    def test_repeated_paragraphs_are_sent_once(self):
+        paragraph = "The gateway forwards every request to the order service."
+        text, stats = self.minimizer.minimize(f"{paragraph}\n\nOther\n\n{paragraph}")
+        self.assertEqual(text, f"{paragraph}\n\nOther")
+        self.assertEqual(stats["duplicates_removed"], 1)
+
+    def test_budget_cuts_at_block_boundary(self):
+        minimizer = InputMinimizer(budget_bytes=120)
+        text, stats = minimizer.minimize("\n\n".join(f"Paragraph {i} " + "x" * 30 for i in range(10)))
+        self.assertLessEqual(stats["final_bytes"], 120)
+        self.assertTrue(stats["truncated"])
+        self.assertTrue(text.startswith("Paragraph 0 "))
+        self.assertTrue(text.endswith("[... input truncated to fit the size budget]"))
+
+    def test_budget_smaller_than_marker_cuts_without_marker(self):
+        minimizer = InputMinimizer(budget_bytes=10)
+        text, stats = minimizer.minimize("Paragraph " + "x" * 100)
+        self.assertEqual(text, "Paragraph ")
+        self.assertEqual(stats["final_bytes"], 10)
+        self.assertGreater(stats["bytes_saved"], 0)
+
+    def test_totals(self):
+        self.minimizer.minimize("a\n\n\n\nb")
+        self.minimizer.minimize("c")
+        stats = self.minimizer.stats()
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["bytes_saved"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import json
+
+from json_stream import StreamingFieldDecoder
+
+
+def decode(raw: bytes, chunk_size: int, field: str = "d2_code"):
+    pieces = []
+    decoder = StreamingFieldDecoder(field, pieces.append)
+    for i in range(0, len(raw), chunk_size):
+        decoder.feed(raw[i:i + chunk_size])
+    fields = decoder.close()
+    return "".join(pieces), fields, decoder
+
+
+class TestStreamingFieldDecoder(unittest.TestCase):
+    def test_any_chunking_yields_the_same_text(self):
+        code = 'a -> b: "quoted" \\ back\nslash\té 中 \U0001F600   /\x01' * 20
+        raw = json.dumps({"status": "ok", "d2_code": code, "session_id": "s1"}).encode("utf-8")
+        for chunk_size in (1, 2, 3, 5, 6, 7, 64, len(raw)):
+            text, fields, decoder = decode(raw, chunk_size)
+            self.assertEqual(text, code, chunk_size)
+            self.assertTrue(decoder.found)
+            self.assertEqual(fields, {"status": "ok", "session_id": "s1"})
+
+    def test_non_ascii_output_is_decoded(self):
+        code = "café \U0001F600"
+        raw = json.dumps({"d2_code": code}, ensure_ascii=False).encode("utf-8")
+        self.assertEqual(decode(raw, 1)[0], code)
+
+    def test_escaped_backslash_before_u_is_not_held_back(self):
+        code = "\\ud83d" + "x"
+        raw = json.dumps({"d2_code": code}).encode("utf-8")
+        for chunk_size in range(1, len(raw) + 1):
+            self.assertEqual(decode(raw, chunk_size)[0], code)
+
+    def test_other_field_values_are_parsed(self):
+        raw = b'{"a": [1, {"b": "x}"}], "n": -1.5e3, "t": true, "z": null, "d2_code": ""}'
+        text, fields, decoder = decode(raw, 4)
+        self.assertEqual(text, "")
+        self.assertEqual(fields, {"a": [1, {"b": "x}"}], "n": -1500.0, "t": True, "z": None})
+
+    def test_large_other_fields_are_skipped(self):
+        raw = json.dumps({"log": "x" * 1000, "d2_code": "a"}).encode("utf-8")
+        pieces = []
+        decoder = StreamingFieldDecoder("d2_code", pieces.append, max_other_chars=100)
+        decoder.feed(raw)
+        self.assertEqual(decoder.close(), {})
+        self.assertEqual(pieces, ["a"])
+
+    def test_missing_field_is_reported(self):
+        text, fields, decoder = decode(b'{"status": "error", "error": {"code": "X"}}', 3)
+        self.assertFalse(decoder.found)
+        self.assertEqual(fields["error"], {"code": "X"})
+
+    def test_truncated_and_malformed_input_raise(self):
+        for raw in (b'{"d2_code": "abc', b'{"d2_code": "abc"', b'{"d2_code": "a\\', b'[1]',
+                    b'{"d2_code": "a\\x"}', b'{"d2_code": "a"} x'):
+            with self.assertRaises(ValueError, msg=raw):
+                decode(raw, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import json
+import tempfile
+import shutil
+import socket
+import time
+
+from offline_queue import OfflineQueue
+
+
+class TestOfflineQueue(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.queue_dir = os.path.join(self.test_dir, "queue")
+        self.working_dir = os.path.join(self.test_dir, "work")
+        self.backend = MagicMock()
+        self.queue = OfflineQueue(self.backend, queue_dir=self.queue_dir, min_interval=0, credit_backoff=120)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_enqueue_persists_job_to_disk(self):
+        job = self.queue.enqueue("generate", {"user_request": "draw"}, working_dir=self.working_dir)
+
+        job_file = os.path.join(self.queue_dir, "jobs", f"{job['job_id']}.json")
+        self.assertTrue(os.path.exists(job_file))
+        with open(job_file, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["state"], "pending")
+        self.assertEqual(self.queue.status()["depth"], 1)
+
+    def test_drain_runs_job_and_saves_session_id(self):
+        self.backend.run_contextweave_generation.return_value = {"status": "ok", "session_id": "queued-session"}
+        job = self.queue.enqueue("generate", {"user_request": "draw"}, working_dir=self.working_dir)
+
+        self.assertTrue(self.queue.drain_once())
+
+        self.backend.run_contextweave_generation.assert_called_with(user_request="draw")
+        self.assertEqual(self.queue.get_job(job["job_id"])["state"], "done")
+        with open(os.path.join(self.working_dir, ".last_session_id"), "r") as f:
+            self.assertEqual(f.read().strip(), "queued-session")
+        self.assertEqual(self.queue.status()["depth"], 0)
+
+    def test_payment_required_pauses_queue(self):
+        self.backend.export_session.return_value = {
+            "status": "error", "error": {"code": "PAYMENT_REQUIRED", "message": "Insufficient credits"}
+        }
+        job = self.queue.enqueue("export_session", {"session_id": "s1", "format": "svg"})
+
+        self.assertTrue(self.queue.drain_once())
+
+        record = self.queue.get_job(job["job_id"])
+        self.assertEqual(record["state"], "pending")
+        self.assertEqual(record["attempts"], 1)
+        status = self.queue.status()
+        self.assertGreater(status["paused_for_seconds"], 0)
+        self.assertGreater(status["eta_seconds"], 100)
+        # Paused: nothing else runs until the backoff expires
+        self.assertFalse(self.queue.drain_once())
+
+    def test_non_retryable_error_fails_job(self):
+        self.backend.export_contextweave_code.return_value = {
+            "status": "error", "error": {"code": "WRITE_ERROR", "message": "disk full"}
+        }
+        job = self.queue.enqueue("export_code", {"session_id": "s1", "path": self.working_dir})
+
+        self.queue.drain_once()
+
+        self.assertEqual(self.queue.get_job(job["job_id"])["state"], "failed")
+
+    def test_only_transient_api_errors_are_retried(self):
+        self.backend.export_session.return_value = {
+            "status": "error", "error": {"code": "API_ERROR", "message": "404 Not Found"}
+        }
+        permanent = self.queue.enqueue("export_session", {"session_id": "s1", "format": "svg"})
+        self.queue.drain_once()
+        self.assertEqual(self.queue.get_job(permanent["job_id"])["state"], "failed")
+
+        self.backend.export_session.return_value = {
+            "status": "error", "error": {"code": "API_ERROR", "message": "503", "retryable": True}
+        }
+        transient = self.queue.enqueue("export_session", {"session_id": "s1", "format": "svg"})
+        self.queue.drain_once()
+        self.assertEqual(self.queue.get_job(transient["job_id"])["state"], "pending")
+
+    def test_temp_files_are_not_jobs(self):
+        self.backend.run_contextweave_generation.return_value = {"status": "ok", "session_id": "s1"}
+        job = self.queue.enqueue("generate", {"user_request": "draw"})
+        with open(os.path.join(self.queue_dir, "jobs", f".tmp-abc{job['job_id']}.json"), "w") as f:
+            json.dump(dict(job, state="running"), f)
+
+        status = self.queue.status()
+
+        self.assertEqual(status["depth"], 1)
+        self.assertEqual(status["counts"]["running"], 0)
+        self.assertTrue(self.queue.drain_once())
+        self.assertFalse(self.queue.drain_once())
+        self.assertEqual(self.backend.run_contextweave_generation.call_count, 1)
+
+    def test_get_job_rejects_paths(self):
+        self.assertIsNone(self.queue.get_job("../state"))
+        self.assertIsNone(self.queue.get_job("missing"))
+
+    def write_running(self, job, **fields):
+        job.update(state="running", **fields)
+        with open(os.path.join(self.queue_dir, "jobs", f"{job['job_id']}.json"), "w") as f:
+            json.dump(job, f)
+
+    def test_running_jobs_are_recovered_after_crash(self):
+        job = self.queue.enqueue("generate", {"user_request": "draw"})
+        self.write_running(job, owner={"host": "elsewhere", "pid": 1}, lease_until=time.time() - 1)
+
+        reopened = OfflineQueue(self.backend, queue_dir=self.queue_dir, min_interval=0)
+
+        self.assertEqual(reopened.get_job(job["job_id"])["state"], "pending")
+
+    def test_jobs_of_live_processes_are_not_recovered(self):
+        job = self.queue.enqueue("generate", {"user_request": "draw"})
+        self.write_running(job, owner={"host": socket.gethostname(), "pid": os.getpid()},
+                           lease_until=time.time() + 60)
+
+        reopened = OfflineQueue(self.backend, queue_dir=self.queue_dir, min_interval=0)
+
+        self.assertEqual(reopened.get_job(job["job_id"])["state"], "running")
+        self.assertFalse(reopened.drain_once())
+
+
+if __name__ == "__main__":
+    unittest.main()
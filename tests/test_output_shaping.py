@@ -0,0 +1,69 @@
+import unittest
+import os
+import json
+import tempfile
+import shutil
+
+from output_shaping import dump_result, spill_large_fields
+
+
+class TestOutputShaping(unittest.TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def test_default_output_is_pretty_printed(self):
+        self.assertEqual(dump_result({"status": "ok"}), json.dumps({"status": "ok"}, indent=2))
+
+    def test_compact_output_has_no_whitespace(self):
+        output = dump_result({"status": "ok", "session_id": "s1"}, compact=True)
+        self.assertEqual(output, '{"status":"ok","session_id":"s1"}')
+
+    def test_large_fields_are_spilled_to_files(self):
+        d2_code = "a -> b\n" * 1000
+        result = {"status": "ok", "d2_code": d2_code, "nested": {"log": "x" * 10}}
+
+        shaped = json.loads(dump_result(result, compact=True, spill_threshold_bytes=100, spill_dir=self.spill_dir))
+
+        self.assertEqual(shaped["nested"], {"log": "x" * 10})
+        ref = shaped["d2_code"]
+        self.assertEqual(ref["bytes"], len(d2_code))
+        self.assertTrue(ref["spilled_to"].endswith(".cw"))
+        with open(ref["spilled_to"], "r", encoding="utf-8", newline="") as f:
+            self.assertEqual(f.read(), d2_code)
+
+    def test_identical_values_share_one_file(self):
+        value = "y" * 500
+        first = spill_large_fields({"a": value}, 100, self.spill_dir)
+        second = spill_large_fields({"a": value}, 100, self.spill_dir)
+
+        self.assertEqual(first["a"]["spilled_to"], second["a"]["spilled_to"])
+        self.assertEqual(len(os.listdir(self.spill_dir)), 1)
+
+    def test_errors_are_never_spilled(self):
+        message = "Traceback: " + "x" * 500
+        error = {"status": "error", "error": {"code": "API_ERROR", "message": message}, "detail": message}
+        nested = {"status": "ok", "exports": {"svg": error}, "error": {"message": message}}
+
+        self.assertEqual(spill_large_fields(error, 100, self.spill_dir), error)
+        self.assertEqual(spill_large_fields(nested, 100, self.spill_dir), nested)
+        self.assertEqual(os.listdir(self.spill_dir), [])
+
+    def test_backend_keys_cannot_escape_the_spill_dir(self):
+        shaped = spill_large_fields({"../../evil/x": "z" * 500}, 100, self.spill_dir)
+
+        path = shaped["../../evil/x"]["spilled_to"]
+        self.assertEqual(os.path.dirname(path), self.spill_dir)
+        self.assertTrue(os.path.basename(path).startswith("______evil_x-"))
+
+    def test_only_newest_files_are_kept(self):
+        for i in range(5):
+            spill_large_fields({"a": str(i) * 500}, 100, self.spill_dir, max_files=3)
+
+        self.assertEqual(len(os.listdir(self.spill_dir)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+import shutil
+
+from artifact_store import ArtifactStore
+from prefetch import AssetPrefetcher
+
+
+class TestAssetPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = ArtifactStore(root=self.root)
+        self.store.set_revision("s1", "r1")
+        self.backend = MagicMock()
+        svg_resp = MagicMock()
+        svg_resp.content = b"<svg/>"
+        self.backend._get.return_value = svg_resp
+        code_resp = MagicMock()
+        code_resp.headers = {"ETag": '"v1"'}
+        code_resp.json.return_value = {"d2_code": "a -> b"}
+        self.backend._post.return_value = code_resp
+        self.prefetcher = AssetPrefetcher(self.backend, self.store)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_prefetches_svg_and_code_into_store(self):
+        self.prefetcher.schedule({"status": "ok", "session_id": "s1", "svg_url": "http://x/s1.svg"}, "r1")
+        self.prefetcher.wait_for("s1")
+
+        self.backend._get.assert_called_with("http://x/s1.svg")
+        svg = self.store.get("s1", "svg")
+        self.assertEqual(self.store.read_bytes(svg), b"<svg/>")
+        self.assertEqual(svg["meta"]["svg_url"], "http://x/s1.svg")
+        code = self.store.get("s1", "cw")
+        self.assertEqual(self.store.read_bytes(code), b"a -> b")
+        self.assertEqual(code["meta"], {"prefetched": True, "etag": '"v1"'})
+        self.assertEqual(self.prefetcher.stats()["completed"], 1)
+
+    def test_results_without_session_are_ignored(self):
+        self.prefetcher.schedule({"status": "error", "error": {}}, "r1")
+        self.assertEqual(self.prefetcher.stats()["scheduled"], 0)
+
+    def test_stale_prefetch_is_not_served_for_newer_revision(self):
+        self.prefetcher.schedule({"status": "ok", "session_id": "s1"}, "r1")
+        self.prefetcher.wait_for("s1")
+        self.store.set_revision("s1", "r2")
+
+        self.assertIsNone(self.store.get("s1", "cw"))
+
+    def test_hit_rate(self):
+        self.prefetcher.record(hit=True)
+        self.prefetcher.record(hit=True)
+        self.prefetcher.record(hit=False)
+        self.assertEqual(self.prefetcher.stats()["hit_rate"], 0.667)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import MagicMock
+
+from prewarm import Prewarmer
+from request_scheduler import current_priority, BATCH
+
+
+def make_response(status_code=200, data=None):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.json.return_value = data
+    return resp
+
+
+class TestPrewarmer(unittest.TestCase):
+    def setUp(self):
+        self.backend = MagicMock()
+        self.backend.router = None
+        self.backend.api_key = "key"
+        self.backend.outline_prompt_cache_hits = 0
+        self.backend._get.return_value = make_response(data="PROMPT")
+        self.backend._post.return_value = make_response(status_code=404)
+
+    def run_prewarm(self, **kwargs):
+        prewarmer = Prewarmer(self.backend, **kwargs)
+        prewarmer.start()
+        prewarmer.join(5)
+        return prewarmer
+
+    def get_paths(self):
+        return [c.args[0] for c in self.backend._get.call_args_list]
+
+    def test_warms_connection_checks_key_and_caches_outline_prompt(self):
+        stats = self.run_prewarm().stats()
+
+        self.assertEqual(stats["state"], "done")
+        self.backend._send.assert_not_called()
+        self.assertEqual(self.get_paths(), ["/health", "/health", "/outline/prompt"])
+        self.assertIn("connection_savings_ms", stats)
+        self.assertNotIn("probe_error", stats)
+        self.assertEqual(self.backend._post.call_args.args, ("/session/export",))
+        self.assertEqual(stats["api_key"], "valid")
+        self.assertEqual(self.backend.outline_prompt_cache[1], "PROMPT")
+
+    def test_outline_prompt_is_skipped_without_plan_mode(self):
+        stats = self.run_prewarm(fetch_outline_prompt=False).stats()
+
+        self.assertEqual(stats["api_key"], "valid")
+        self.assertNotIn("/outline/prompt", self.get_paths())
+        self.assertNotIsInstance(self.backend.outline_prompt_cache, tuple)
+
+    def test_rejected_key_is_reported(self):
+        self.backend._post.return_value = make_response(status_code=403)
+        stats = self.run_prewarm().stats()
+
+        self.assertEqual(stats["api_key"], "invalid")
+
+    def test_missing_key_skips_check(self):
+        self.backend.api_key = None
+        stats = self.run_prewarm().stats()
+
+        self.assertEqual(stats["api_key"], "missing")
+        self.backend._post.assert_not_called()
+
+    def test_probes_run_at_batch_priority(self):
+        priorities = []
+
+        def get(path, **kwargs):
+            priorities.append(current_priority())
+            return make_response(data="PROMPT")
+
+        self.backend._get.side_effect = get
+        self.run_prewarm()
+
+        self.assertEqual(priorities, [BATCH, BATCH, BATCH])
+
+    def test_missing_probe_path_still_checks_key(self):
+        self.backend._get.side_effect = lambda path, **kwargs: (
+            make_response(status_code=404) if path == "/health" else make_response(data="PROMPT"))
+        stats = self.run_prewarm().stats()
+
+        self.assertEqual(stats["state"], "done")
+        self.assertIn("404", stats["probe_error"])
+        self.assertEqual(stats["api_key"], "valid")
+
+    def test_unreachable_backend_marks_failure(self):
+        self.backend._get.side_effect = ConnectionError("down")
+        self.backend._post.side_effect = ConnectionError("down")
+        stats = self.run_prewarm().stats()
+
+        self.assertEqual(stats["state"], "failed")
+        self.assertIn("down", stats["probe_error"])
+        self.assertIn("down", stats["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import pstats
+import tempfile
+import shutil
+
+from profiling import ToolProfiler, current_request_id
+
+
+class TestToolProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def test_wrapper_keeps_metadata_and_sets_request_id(self):
+        profiler = ToolProfiler(profile_dir=self.profile_dir)
+        seen = []
+
+        def my_tool(value: int = 1) -> str:
+            """Docs."""
+            seen.append(current_request_id())
+            return str(value)
+
+        wrapped = profiler.wrap(my_tool)
+        self.assertEqual(wrapped.__name__, "my_tool")
+        self.assertEqual(wrapped.__doc__, "Docs.")
+        self.assertEqual(wrapped(value=2), "2")
+        self.assertIsNotNone(seen[0])
+        self.assertIsNone(current_request_id())
+        self.assertEqual(profiler.slowest()[0]["request_id"], seen[0])
+
+    def test_profiled_call_writes_cprofile_and_memory_files(self):
+        profiler = ToolProfiler(profile_dir=self.profile_dir)
+        profiler.wrap(lambda: [bytearray(1024) for _ in range(100)])()
+
+        call = profiler.slowest()[0]
+        self.assertTrue(call["profiled"])
+        self.assertTrue(os.path.basename(call["profile_path"]).startswith("_lambda_-"))
+        self.assertGreater(pstats.Stats(call["profile_path"]).total_calls, 0)
+        with open(call["memory_path"], "r", encoding="utf-8") as f:
+            self.assertIn("peak traced memory", f.read())
+
+    def test_only_every_nth_call_is_profiled(self):
+        profiler = ToolProfiler(profile_dir=self.profile_dir, sample_every=3)
+        wrapped = profiler.wrap(lambda: None)
+        for _ in range(6):
+            wrapped()
+        self.assertEqual(sum(1 for c in profiler.slowest(limit=10) if c["profiled"]), 2)
+        self.assertEqual(len([f for f in os.listdir(self.profile_dir) if f.endswith(".prof")]), 2)
+
+    def test_errors_are_recorded_and_reraised(self):
+        profiler = ToolProfiler(profile_dir=self.profile_dir, sample_every=100)
+
+        def failing():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            profiler.wrap(failing)()
+        self.assertEqual(profiler.slowest()[0]["error"], "ValueError: boom")
+
+
+if __name__ == "__main__":
+    unittest.main()
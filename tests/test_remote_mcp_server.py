@@ -0,0 +1,442 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import sys
+import tempfile
+import shutil
+import json
+import contextvars
+
+# Other test modules replace remote_mcp_server with a stub; load the real one.
+sys.modules.pop("remote_mcp_server", None)
+import httpx
+from remote_mcp_server import RemoteMCPServer, api_error
+from artifact_store import ArtifactStore
+from input_minimizer import InputMinimizer
+from shared_cache import SharedCache
+import profiling
+
+
+def make_response(status_code=200, data=None):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.headers = {}
+    resp.json.return_value = data if data is not None else {"status": "ok"}
+    return resp
+
+
+def make_stream_response(body, status_code=200, chunk_size=7, headers=None):
+    resp = make_response(status_code)
+    resp.headers = headers or {}
+    data = json.dumps(body).encode("utf-8") if not isinstance(body, bytes) else body
+    resp.iter_bytes.side_effect = lambda: (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+    if status_code >= 400:
+        resp.raise_for_status.side_effect = RuntimeError(f"HTTP {status_code}")
+    return resp
+
+
+class RemoteServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        patcher = patch("remote_mcp_server.httpx.Client")
+        self.addCleanup(patcher.stop)
+        self.mock_client = MagicMock()
+        patcher.start().return_value = self.mock_client
+        self.mock_client.post.return_value = make_response()
+        self.server = RemoteMCPServer()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def last_payload(self):
+        return self.mock_client.post.call_args.kwargs["json"]
+
+
+class TestRemoteMCPServerPayloads(RemoteServerTestCase):
+    def test_import_asks_backend_to_omit_d2_code(self):
+        with open(os.path.join(self.test_dir, "diagram.cw"), "w", encoding="utf-8") as f:
+            f.write("a -> b")
+
+        self.server.import_contextweave_code(path=self.test_dir)
+
+        self.assertEqual(self.mock_client.post.call_args.args[0], "/session/import")
+        self.assertEqual(self.last_payload()["exclude_fields"], ["d2_code"])
+
+    def test_run_sends_configured_exclude_fields(self):
+        self.server.run_contextweave_generation(user_request="hello")
+        self.assertNotIn("exclude_fields", self.last_payload())
+
+        self.server.exclude_fields = ["d2_code", "debug"]
+        self.server.run_contextweave_generation(user_request="hello")
+        self.assertEqual(self.last_payload()["exclude_fields"], ["d2_code", "debug"])
+
+    def test_minimized_request_is_sent_with_input_stats(self):
+        self.server.input_minimizer = InputMinimizer()
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "session_id": "s1"})
+
+        result = self.server.run_contextweave_generation(user_request="A\n\n![x](data:image/png;base64," + "Q" * 200 + ")")
+
+        self.assertEqual(self.last_payload()["user_request"], "A\n\n[image: x]")
+        self.assertGreater(result["input_stats"]["bytes_saved"], 200)
+
+    def test_identical_new_generation_is_served_from_shared_cache(self):
+        self.server.shared_cache = SharedCache(root=os.path.join(self.test_dir, "shared"))
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "session_id": "s1"})
+
+        first = self.server.run_contextweave_generation(user_request="hello")
+        second = self.server.run_contextweave_generation(user_request="hello")
+
+        self.assertNotIn("cached", first)
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["session_id"], "s1")
+        self.assertEqual(self.mock_client.post.call_count, 1)
+
+    def test_unreadable_shared_cache_falls_through_to_backend(self):
+        self.server.shared_cache = SharedCache(root=os.path.join(self.test_dir, "shared"))
+        self.server.shared_cache.get_result = MagicMock(side_effect=TimeoutError("Timed out waiting for lock"))
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "session_id": "s1"})
+        input_file = os.path.join(self.test_dir, "request.md")
+        with open(input_file, "w", encoding="utf-8") as f:
+            f.write("hello")
+
+        result = self.server.run_contextweave_generation(input_file=input_file)
+
+        self.assertEqual((result["status"], result["session_id"]), ("ok", "s1"))
+        self.assertEqual(self.mock_client.post.call_args.args[0], "/run")
+
+    def test_chunk_generation_has_no_side_effects(self):
+        self.server.shared_cache = SharedCache(root=os.path.join(self.test_dir, "shared"))
+        self.server.artifact_store = ArtifactStore(root=os.path.join(self.test_dir, "artifacts"))
+        self.server.input_minimizer = InputMinimizer()
+        self.server.editor_protocol = "vscode"
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "session_id": "chunk"})
+        text = "A\n\n\n\nB"
+
+        result = self.server.generate_chunk(text)
+
+        self.assertEqual(result["session_id"], "chunk")
+        self.assertEqual(self.mock_client.post.call_args.args[0], "/run")
+        self.assertEqual((self.last_payload()["user_request"], self.last_payload()["editor_protocol"]), (text, "vscode"))
+        self.assertIsNone(self.server.artifact_store.get_revision("chunk"))
+        self.assertIsNone(self.server.shared_cache.get_session("chunk"))
+
+    def test_outline_prompt_is_fetched_once(self):
+        self.mock_client.get.return_value = make_response(data="PROMPT")
+
+        self.assertEqual(self.server.get_outline_prompt(), "PROMPT")
+        self.assertEqual(self.server.get_outline_prompt(), "PROMPT")
+
+        self.assertEqual(self.mock_client.get.call_count, 1)
+        self.assertEqual(self.server.outline_prompt_cache_hits, 1)
+
+
+class TestRemoteMCPServerExportFormats(RemoteServerTestCase):
+    def test_default_run_renders_svg_only(self):
+        self.server.run_contextweave_generation(user_request="hello")
+        payload = self.last_payload()
+        self.assertTrue(payload["export_svg"])
+        self.assertFalse(payload["export_pptx"])
+
+    def test_none_skips_rendering(self):
+        self.server.run_contextweave_generation(user_request="draft", export_formats="none")
+        payload = self.last_payload()
+        self.assertFalse(payload["export_svg"])
+        self.assertFalse(payload["export_pptx"])
+
+    def test_invalid_format_is_rejected_without_request(self):
+        result = self.server.run_contextweave_generation(user_request="hello", export_formats="gif")
+        self.assertEqual(result["error"]["code"], "INVALID_FORMAT")
+        self.mock_client.post.assert_not_called()
+
+    def test_multi_format_export_requests_each_format(self):
+        self.mock_client.post.side_effect = lambda path, json: make_response(data={"status": "ok", "format": json["format"]})
+
+        result = self.server.export_session(session_id="s1", format="svg,pptx")
+
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(result["exports"]["svg"]["format"], "svg")
+        self.assertEqual(result["exports"]["pptx"]["format"], "pptx")
+        self.assertEqual(self.mock_client.post.call_count, 2)
+
+
+class TestApiError(unittest.TestCase):
+    def status_error(self, status_code):
+        request = httpx.Request("POST", "http://x/run")
+        return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+    def test_only_transient_failures_are_retryable(self):
+        self.assertTrue(api_error(httpx.ConnectError("refused"))["error"]["retryable"])
+        self.assertTrue(api_error(httpx.ReadTimeout("slow"))["error"]["retryable"])
+        self.assertTrue(api_error(self.status_error(502))["error"]["retryable"])
+        self.assertNotIn("retryable", api_error(self.status_error(404))["error"])
+        self.assertNotIn("retryable", api_error(ValueError("Expecting value"))["error"])
+
+
+class TestRemoteMCPServerRequestId(RemoteServerTestCase):
+    def run_in_tool_call(self, func, *args):
+        def call():
+            profiling._request_id.set("rid-1")
+            return func(*args)
+        return contextvars.copy_context().run(call)
+
+    def test_every_request_of_a_tool_call_carries_its_id(self):
+        self.mock_client.post.side_effect = lambda path, json, headers: make_response(data={"status": "ok"})
+        self.mock_client.send.return_value = make_stream_response({"d2_code": "a"})
+
+        self.run_in_tool_call(self.server.export_session, "s1", "svg,pptx")
+        self.run_in_tool_call(self.server.export_contextweave_code, "s1", os.path.join(self.test_dir, "out"))
+
+        for call in self.mock_client.post.call_args_list:
+            self.assertEqual(call.kwargs["headers"]["X-Request-ID"], "rid-1")
+        self.assertEqual(self.mock_client.post.call_count, 2)
+        self.assertEqual(self.mock_client.build_request.call_args.kwargs["headers"]["X-Request-ID"], "rid-1")
+
+    def test_requests_outside_tool_calls_are_unchanged(self):
+        self.server.export_session("s1", "svg")
+        self.assertNotIn("headers", self.mock_client.post.call_args.kwargs)
+
+
+class TestRemoteMCPServerArtifactCache(RemoteServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.artifact_store = ArtifactStore(root=os.path.join(self.test_dir, "artifacts"))
+        self.out_dir = os.path.join(self.test_dir, "out")
+
+    def run_session(self):
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "session_id": "s1", "run_id": "r1"})
+        self.server.run_contextweave_generation(user_request="hello")
+
+    def test_code_export_is_served_from_disk_while_backend_confirms_etag(self):
+        self.run_session()
+        self.mock_client.send.return_value = make_stream_response({"d2_code": "a -> b"}, headers={"ETag": '"v1"'})
+        first = self.server.export_contextweave_code("s1", path=self.out_dir)
+        self.mock_client.send.return_value = make_response(304)
+
+        second = self.server.export_contextweave_code("s1", path=self.out_dir)
+
+        self.assertNotIn("cached", first)
+        self.assertTrue(second["cached"])
+        self.assertEqual(self.mock_client.send.call_args.args[0], self.mock_client.build_request.return_value)
+        self.assertEqual(self.mock_client.build_request.call_args.kwargs["headers"], {"If-None-Match": '"v1"'})
+        with open(second["file_path"], "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a -> b")
+
+    def test_code_changed_by_another_client_is_not_served_from_cache(self):
+        self.run_session()
+        self.mock_client.send.return_value = make_stream_response({"d2_code": "a -> b"}, headers={"ETag": '"v1"'})
+        self.server.export_contextweave_code("s1", path=self.out_dir)
+        self.mock_client.send.return_value = make_stream_response({"d2_code": "a -> c"}, headers={"ETag": '"v2"'})
+
+        second = self.server.export_contextweave_code("s1", path=self.out_dir)
+
+        self.assertNotIn("cached", second)
+        with open(second["file_path"], "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a -> c")
+
+    def test_export_without_etag_is_served_from_disk(self):
+        self.run_session()
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "svg_url": "http://x/1.svg"})
+        self.server.export_session("s1", "svg")
+        self.mock_client.post.reset_mock()
+
+        second = self.server.export_session("s1", "svg")
+
+        self.assertEqual((second["svg_url"], second["cached"]), ("http://x/1.svg", True))
+        self.mock_client.post.assert_not_called()
+
+    def test_code_without_etag_is_served_from_disk(self):
+        self.run_session()
+        self.mock_client.send.return_value = make_stream_response({"d2_code": "a -> b"})
+        self.server.export_contextweave_code("s1", path=self.out_dir)
+        self.mock_client.send.reset_mock()
+
+        second = self.server.export_contextweave_code("s1", path=self.out_dir)
+
+        self.assertTrue(second["cached"])
+        self.mock_client.send.assert_not_called()
+        with open(second["file_path"], "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a -> b")
+
+    def test_store_failure_does_not_fail_the_export(self):
+        self.run_session()
+        self.server.artifact_store.put_file = MagicMock(side_effect=TimeoutError("lock"))
+        self.mock_client.send.return_value = make_stream_response({"d2_code": "a -> b"})
+
+        result = self.server.export_contextweave_code("s1", path=self.out_dir)
+
+        self.assertEqual(result["status"], "ok")
+        self.assertTrue(os.path.exists(result["file_path"]))
+
+    def test_only_prefetched_code_counts_as_prefetch_hit(self):
+        self.server.prefetcher = MagicMock()
+        self.run_session()
+        self.mock_client.send.return_value = make_stream_response({"d2_code": "a -> b"})
+        self.server.export_contextweave_code("s1", path=self.out_dir)
+        self.server.export_contextweave_code("s1", path=self.out_dir)
+        self.assertEqual([c.kwargs for c in self.server.prefetcher.record.call_args_list], [{"hit": False}])
+
+        self.server.artifact_store.put("s1", "cw", b"a -> b", meta={"prefetched": True})
+        self.server.export_contextweave_code("s1", path=self.out_dir)
+        self.server.prefetcher.record.assert_called_with(hit=True)
+
+    def test_export_is_served_from_cache_on_304(self):
+        self.run_session()
+        first = make_response(data={"status": "ok", "svg_url": "http://x/1.svg"})
+        first.headers = {"ETag": '"e1"'}
+        self.mock_client.post.return_value = first
+        self.server.export_session("s1", "svg")
+        self.mock_client.post.return_value = make_response(304)
+
+        second = self.server.export_session("s1", "svg")
+
+        self.assertEqual((second["svg_url"], second["cached"]), ("http://x/1.svg", True))
+        self.assertEqual(self.mock_client.post.call_args.kwargs["headers"], {"If-None-Match": '"e1"'})
+
+    def test_edit_invalidates_cached_export(self):
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "session_id": "s1", "run_id": "r1"})
+        self.server.run_contextweave_generation(user_request="hello")
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "svg_url": "http://x/1.svg"})
+        self.server.export_session("s1", "svg")
+
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "session_id": "s1", "run_id": "r2"})
+        self.server.run_contextweave_generation(user_request="edit", session_id="s1")
+        self.mock_client.post.return_value = make_response(data={"status": "ok", "svg_url": "http://x/2.svg"})
+
+        self.assertEqual(self.server.export_session("s1", "svg")["svg_url"], "http://x/2.svg")
+
+
+class TestRemoteMCPServerStreamingExport(RemoteServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.out_dir = os.path.join(self.test_dir, "out")
+        self.target = os.path.join(self.out_dir, "diagram.cw")
+
+    def test_code_is_streamed_into_the_file(self):
+        code = "a -> b: \"caf\u00e9 \U0001F600\"\r\n" * 500
+        self.mock_client.send.return_value = make_stream_response({"status": "ok", "d2_code": code})
+
+        result = self.server.export_contextweave_code("s1", path=self.out_dir)
+
+        self.assertEqual(result, {"status": "ok", "file_path": self.target})
+        request = self.mock_client.build_request.call_args
+        self.assertEqual(request.args[:2], ("POST", "/session/export"))
+        self.assertEqual(request.kwargs["json"], {"session_id": "s1"})
+        self.assertTrue(self.mock_client.send.call_args.kwargs["stream"])
+        self.mock_client.send.return_value.close.assert_called_once()
+        with open(self.target, "rb") as f:
+            self.assertEqual(f.read(), code.encode("utf-8"))
+        self.assertEqual(os.listdir(self.out_dir), ["diagram.cw"])
+
+    def test_truncated_response_keeps_the_previous_file(self):
+        os.makedirs(self.out_dir)
+        with open(self.target, "w", encoding="utf-8") as f:
+            f.write("old")
+        self.mock_client.send.return_value = make_stream_response(b'{"d2_code": "a -> b\\n c')
+
+        result = self.server.export_contextweave_code("s1", path=self.out_dir)
+
+        self.assertEqual(result["error"]["code"], "API_ERROR")
+        with open(self.target, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "old")
+        self.assertEqual(os.listdir(self.out_dir), ["diagram.cw"])
+
+    def test_error_body_and_missing_code_are_reported(self):
+        self.mock_client.send.return_value = make_stream_response(
+            {"status": "error", "error": {"code": "SESSION_NOT_FOUND", "message": "gone"}})
+        self.assertEqual(self.server.export_contextweave_code("s1", path=self.out_dir)["error"]["code"],
+                         "SESSION_NOT_FOUND")
+
+        self.mock_client.send.return_value = make_stream_response({"status": "ok"})
+        self.assertEqual(self.server.export_contextweave_code("s1", path=self.out_dir)["error"]["code"],
+                         "MISSING_D2_CODE")
+        self.assertFalse(os.path.exists(self.target))
+
+    def test_http_error_is_reported(self):
+        self.mock_client.send.return_value = make_stream_response({"detail": "nope"}, status_code=500)
+
+        result = self.server.export_contextweave_code("s1", path=self.out_dir)
+
+        self.assertEqual(result["error"]["code"], "API_ERROR")
+        self.mock_client.send.return_value.close.assert_called_once()
+
+
+class TestRemoteMCPServerRouting(RemoteServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clients = {}
+
+        def make_client(base_url, timeout):
+            client = MagicMock()
+            client.get.return_value = make_response()
+            client.post.return_value = make_response(data={"status": "ok", "session_id": f"s-{base_url[-1]}"})
+            self.clients[base_url] = client
+            return client
+
+        patcher = patch("remote_mcp_server.httpx.Client", side_effect=make_client)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self.server = RemoteMCPServer(base_url="http://a, http://b/")
+        self.affinity_path = os.path.join(self.test_dir, "session_endpoints.json")
+        self.server.router.affinity_path = self.affinity_path
+
+    def test_single_endpoint_has_no_router(self):
+        self.assertIsNone(RemoteMCPServer(base_url="http://a").router)
+        self.assertEqual(self.server.base_url, "http://a")
+
+    def test_requests_do_not_feed_latency(self):
+        self.clients["http://a"].post.side_effect = httpx.ConnectError("refused")
+
+        self.server.run_contextweave_generation(user_request="hello")
+
+        a, b = self.server.router.endpoints
+        self.assertEqual((a.failures, b.failures), (1, 0))
+        self.assertIsNone(b.ewma_ms)
+        self.assertEqual(b.requests, 1)
+
+    def test_unreachable_endpoint_fails_over(self):
+        self.clients["http://a"].post.side_effect = httpx.ConnectError("refused")
+
+        result = self.server.run_contextweave_generation(user_request="hello")
+
+        self.assertEqual(result["session_id"], "s-b")
+        self.clients["http://b"].post.assert_called_once()
+
+    def test_session_stays_on_endpoint_that_created_it(self):
+        result = self.server.run_contextweave_generation(user_request="hello")
+        owner = self.clients["http://" + result["session_id"][-1]]
+
+        self.server.run_contextweave_generation(user_request="edit", session_id=result["session_id"])
+
+        self.assertEqual(owner.post.call_count, 2)
+
+    def test_session_is_not_rebound_to_endpoint_that_does_not_know_it(self):
+        a, b = self.server.router.endpoints
+        self.server.router.bind("s1", a)
+        self.clients["http://a"].post.side_effect = httpx.ConnectError("refused")
+        self.clients["http://b"].post.return_value = make_response(status_code=404)
+
+        self.server.run_contextweave_generation(user_request="edit", session_id="s1")
+
+        self.assertIs(self.server.router.owner("s1"), a)
+
+    def test_binding_survives_a_restart(self):
+        result = self.server.run_contextweave_generation(user_request="hello")
+        owner_url = "http://" + result["session_id"][-1]
+
+        restarted = RemoteMCPServer(base_url="http://a, http://b/")
+        restarted.router.affinity_path = self.affinity_path
+
+        self.assertEqual(restarted.router.owner(result["session_id"]).url, owner_url)
+        self.assertIsNone(restarted.router._thread)
+
+    def test_server_errors_are_not_resent(self):
+        for client in self.clients.values():
+            client.post.return_value = make_response(status_code=500)
+
+        self.server.run_contextweave_generation(user_request="hello")
+
+        self.assertEqual(sum(c.post.call_count for c in self.clients.values()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
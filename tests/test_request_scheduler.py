@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import time
+import tempfile
+import shutil
+
+from request_scheduler import RequestScheduler, TokenBucket, request_priority, current_priority, BATCH, INTERACTIVE
+
+
+def make_response(status_code, headers=None):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.headers = headers or {}
+    return resp
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.test_dir, "bucket.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_buckets_on_same_file_share_tokens(self):
+        first = TokenBucket(self.state_path, rate=0.001, capacity=2)
+        second = TokenBucket(self.state_path, rate=0.001, capacity=2)
+
+        self.assertEqual(first.try_acquire(), 0.0)
+        self.assertEqual(second.try_acquire(), 0.0)
+        self.assertGreater(first.try_acquire(), 0.0)
+
+    def test_reserve_keeps_tokens_back(self):
+        bucket = TokenBucket(self.state_path, rate=0.001, capacity=2)
+
+        self.assertEqual(bucket.try_acquire(reserve=1.0), 0.0)
+        self.assertGreater(bucket.try_acquire(reserve=1.0), 0.0)
+        self.assertEqual(bucket.try_acquire(reserve=0.0), 0.0)
+
+    def test_block_until_defers_acquire(self):
+        bucket = TokenBucket(self.state_path, rate=10, capacity=5)
+        bucket.block_until(time.time() + 30)
+
+        self.assertGreater(bucket.try_acquire(), 25)
+
+
+class TestRequestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.scheduler = RequestScheduler("http://backend", rate=100, burst=10, state_dir=self.test_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_call_retries_after_retry_after(self):
+        send = MagicMock(side_effect=[make_response(429, {"Retry-After": "0"}), make_response(200)])
+
+        resp = self.scheduler.call(send)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(self.scheduler.stats()["retried_429"], 1)
+
+    def test_call_returns_429_when_retry_after_too_long(self):
+        send = MagicMock(return_value=make_response(429, {"Retry-After": "3600"}))
+
+        resp = self.scheduler.call(send)
+
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(send.call_count, 1)
+
+    def test_payment_required_holds_batch_calls(self):
+        self.scheduler.note_response(make_response(402))
+
+        self.assertGreater(self.scheduler.stats()["batch_held_for_seconds"], 0)
+        # Interactive calls still go through immediately
+        self.assertLess(self.scheduler.acquire(INTERACTIVE), 0.5)
+
+    def test_low_credits_hold_batch_calls(self):
+        scheduler = RequestScheduler("http://backend", rate=100, burst=10, state_dir=self.test_dir,
+                                     low_credit_threshold=5)
+        scheduler.note_response(make_response(200, {"X-Credits-Remaining": "2"}))
+
+        self.assertGreater(scheduler.stats()["batch_held_for_seconds"], 0)
+
+    def test_request_priority_context(self):
+        self.assertEqual(current_priority(), INTERACTIVE)
+        with request_priority(BATCH):
+            self.assertEqual(current_priority(), BATCH)
+        self.assertEqual(current_priority(), INTERACTIVE)
+
+
+if __name__ == "__main__":
+    unittest.main()
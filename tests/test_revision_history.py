@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import tempfile
+import shutil
+
+from revision_history import RevisionHistory
+
+
+class TestRevisionHistory(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.backend = MagicMock()
+        self.backend.prefetcher = None
+        self.history = RevisionHistory(self.backend, root=self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_identical_consecutive_revisions_are_recorded_once(self):
+        self.history.record("s1", "a -> b")
+        self.history.record("s1", "a -> b")
+        self.history.record("s1", "a -> c")
+        self.history.record("s1", "a -> b")
+
+        revisions = self.history.list("s1")
+        self.assertEqual([r["revision"] for r in revisions], [1, 2, 3])
+        self.assertEqual([r["source"] for r in revisions], ["create", "edit", "edit"])
+        self.assertEqual(len(os.listdir(os.path.join(self.root, "blobs"))), 2)
+
+    def test_missing_code_is_fetched_in_background(self):
+        self.backend.get_session_code.return_value = {"d2_code": "x -> y"}
+
+        self.history.schedule({"status": "ok", "session_id": "s1"})
+        self.history.wait_for("s1")
+
+        self.assertEqual(self.history.get("s1")["d2_code"], "x -> y")
+        self.backend.get_session_code.assert_called_once_with("s1")
+
+    def test_code_in_result_is_recorded_without_fetch(self):
+        self.history.schedule({"status": "ok", "session_id": "s1", "d2_code": "a -> b"})
+        self.assertEqual(self.history.get("s1", 1)["d2_code"], "a -> b")
+        self.backend.get_session_code.assert_not_called()
+
+    def test_negative_revisions_count_from_latest(self):
+        self.history.record("s1", "one")
+        self.history.record("s1", "two")
+        self.assertEqual(self.history.get("s1", -2)["d2_code"], "one")
+        self.assertIsNone(self.history.get("s1", -3))
+
+    def test_diff(self):
+        self.history.record("s1", "a -> b\nb -> c\n")
+        self.history.record("s1", "a -> b\nb -> d\n")
+
+        diff = self.history.diff("s1", 1)
+
+        self.assertEqual((diff["added"], diff["removed"]), (1, 1))
+        self.assertIn("-b -> c", diff["diff"])
+        self.assertIn("+b -> d", diff["diff"])
+
+    def test_rollback_fork_inherits_history(self):
+        self.history.record("s1", "one")
+        self.history.record("s1", "two")
+        self.history.record("s2", "one")
+
+        self.history.fork("s1", 1, "s2")
+
+        revisions = self.history.list("s2")
+        self.assertEqual(len(revisions), 1)
+        self.assertEqual(revisions[0]["source"], "rollback")
+        self.assertEqual(revisions[0]["rolled_back_from"], {"session_id": "s1", "revision": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import os
+import time
+import tempfile
+import shutil
+
+from local_store import atomic_write_json
+from shared_cache import SharedCache, request_key
+
+
+class TestSharedCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = SharedCache(root=self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_request_key_matches_node_client(self):
+        # Same value as requestKey() in cw-skill/scripts/shared_cache.cjs
+        self.assertEqual(
+            request_key("3", True, False, "user_request", 'Draw "A" → B\r\nline\ttab'),
+            "76ec2219a3a423cb710c2b84af51de78479fd6334f521f7965370f488fb33367",
+        )
+
+    def test_result_round_trip(self):
+        self.cache.put_result("k1", {"status": "ok", "session_id": "s1"})
+        entry = SharedCache(root=self.root, client="node").get_result("k1")
+        self.assertEqual(entry["result"]["session_id"], "s1")
+        self.assertEqual(entry["client"], "python")
+
+    def test_expired_result_is_not_served(self):
+        self.cache.put_result("k1", {"status": "ok", "session_id": "s1"})
+        self.cache.ttl_seconds = 0
+        time.sleep(0.01)
+        self.assertIsNone(self.cache.get_result("k1"))
+
+    def test_edited_session_result_is_not_served(self):
+        self.cache.put_result("k1", {"status": "ok", "session_id": "s1"})
+        time.sleep(0.01)
+        self.cache.record_session("s1", edited=True)
+        self.assertIsNone(self.cache.get_result("k1"))
+
+    def test_latest_session_per_working_dir(self):
+        self.cache.record_session("s1", working_dir=self.root)
+        self.cache.record_session("s2", working_dir=self.root)
+        self.assertEqual(self.cache.latest_session(working_dir=self.root), "s2")
+        self.assertIsNone(self.cache.latest_session(working_dir=os.path.join(self.root, "other")))
+
+    def test_newer_format_is_left_alone(self):
+        atomic_write_json(os.path.join(self.root, "format.json"), {"format": "cwmcp-shared", "version": 2})
+        cache = SharedCache(root=self.root)
+        cache.record_session("s1", working_dir=self.root)
+        self.assertFalse(cache.compatible)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "sessions.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()